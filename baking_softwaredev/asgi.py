@@ -0,0 +1,23 @@
+"""
+ASGI config for baking_softwaredev project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Besides the Django application it serves the live updates of the shopping lists (see recipes/live.py), which
+need an ASGI server, e.g. ``uvicorn baking_softwaredev.asgi:application``. The read-only pages are async views
+handled concurrently in the thread pool of each worker (see recipes/asgi.py).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "baking_softwaredev.settings")
+
+from recipes.asgi import get_asgi_application  # noqa: E402
+
+django_application = get_asgi_application()
+
+from recipes.live import LiveShoppingListApp  # noqa: E402 (needs the apps to be loaded)
+
+application = LiveShoppingListApp(django_application)
@@ -51,12 +51,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "recipes.asgi.StaticFilesMiddleware",
+    "recipes.routers.PrimaryStickinessMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "recipes.generations.CacheGenerationMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "recipes.pagecache.AnonymousPageCacheMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -88,9 +91,51 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # keep the connections (and their page caches) of the workers open between requests
+        "CONN_MAX_AGE": 600,
+        "OPTIONS": {"timeout": 20},
     }
 }
 
+# every new SQLite connection is switched to WAL with the pragmas in recipes/sqlite.py (override them with
+# SQLITE_PRAGMAS); run "python manage.py sqlitemaintenance" regularly (e.g. nightly with cron) to checkpoint
+# the WAL and update the query planner statistics
+
+# the reads of each request go to one of the aliases in REPLICA_DATABASES which are in DATABASES (see
+# recipes/routers.py), except for the requests of a browser in the seconds after it changed something
+DATABASE_ROUTERS = ["recipes.routers.ReplicaRouter"]
+REPLICA_DATABASES = ["replica"]
+PRIMARY_STICKY_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The keys of the cached fragments and pages contain content versions read from the database, so the local memory
+# cache, which is private to each process, never serves outdated data to any worker. With several worker processes
+# a shared cache saves rendering the same page in each of them, e.g.
+#   "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+#   "LOCATION": os.path.join(BASE_DIR, "cache"),
+# or "django.core.cache.backends.memcached.PyMemcacheCache" with "LOCATION": "127.0.0.1:11211".
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "recipes",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+
+# seconds anonymous visitors are served the public pages from the cache
+PAGE_CACHE_TIMEOUT = 10 * 60
+
+# minimum seconds between two checks of a worker process whether other processes changed cached data
+CACHE_GENERATION_POLL_INTERVAL = 0.5
+
+# backend passing the live updates of the shopping lists to the connected clients (see recipes/live.py):
+# "memory" only reaches the clients of the same process, with several ASGI workers use "database"
+LIVE_EVENTS_BACKEND = "memory"
+LIVE_EVENTS_POLL_INTERVAL = 1
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
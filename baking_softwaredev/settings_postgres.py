@@ -0,0 +1,59 @@
+"""
+Production profile for PostgreSQL, e.g. DJANGO_SETTINGS_MODULE=baking_softwaredev.settings_postgres.
+
+The connection is configured with the environment variables POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD,
+POSTGRES_HOST and POSTGRES_PORT, optional read replicas with POSTGRES_REPLICA_HOSTS as a comma-separated list
+of host or host:port.
+Django 3.2 has no connection pool of its own, so the workers keep persistent connections (CONN_MAX_AGE) to a
+pgbouncer in front of the server (port 6432 by default).
+
+Server-side cursors (used by .iterator(), e.g. by the normalizeunits command) need pgbouncer in session pooling
+mode or a transaction around the iteration; set PGBOUNCER_POOL_MODE=statement or transaction to disable them.
+The export reads in short transactions per chunk without server-side cursors.
+Requires psycopg2 (see requirements-postgres.txt). After the first migrate run "python manage.py installwatson"
+and "python manage.py buildwatson" to create and fill the tsvector column of the full-text search.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("POSTGRES_DB", "recipes"),
+        "USER": os.environ.get("POSTGRES_USER", "recipes"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": os.environ.get("POSTGRES_PORT", "6432"),
+        "CONN_MAX_AGE": int(os.environ.get("POSTGRES_CONN_MAX_AGE", 600)),
+        "DISABLE_SERVER_SIDE_CURSORS": os.environ.get("PGBOUNCER_POOL_MODE") in ("statement", "transaction"),
+        "OPTIONS": {
+            "connect_timeout": 5,
+            "application_name": "recipes",
+        },
+    }
+}
+
+# streaming replicas (e.g. containers with a hot standby) for the reads, see recipes/routers.py
+REPLICA_DATABASES = []
+for number, address in enumerate(filter(None, os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(",")), 1):
+    host, _, port = address.strip().partition(":")
+    REPLICA_DATABASES.append(f"replica{number}")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+INSTALLED_APPS = INSTALLED_APPS + ["django.contrib.postgres"]
+
+# typo-tolerant search with pg_trgm in the database instead of the per-process trigram indexes
+FUZZY_SEARCH_BACKEND = "database"
+
+# the workers share the live updates of the shopping lists through the database
+LIVE_EVENTS_BACKEND = "database"
+
+# the full-text search of watson uses a tsvector column with this configuration on PostgreSQL
+WATSON_POSTGRES_SEARCH_CONFIG = "pg_catalog.german"
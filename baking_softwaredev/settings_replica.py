@@ -0,0 +1,22 @@
+"""
+Local profile with a read replica in a second SQLite file,
+e.g. DJANGO_SETTINGS_MODULE=baking_softwaredev.settings_replica.
+
+SQLite does not replicate itself: "python manage.py syncreplica --interval 5" copies the primary to the replica
+every 5 seconds, so other browsers see a change only after the next copy while the browser which made it sees it
+immediately (see recipes/routers.py). Run "python manage.py syncreplica" once after migrate. The tests use the
+test database of the primary for the replica as well.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+DATABASES = {
+    **DATABASES,
+    "replica": {
+        **DATABASES["default"],
+        "NAME": os.path.join(BASE_DIR, "db.replica.sqlite3"),
+        "TEST": {"MIRROR": "default"},
+    },
+}
@@ -0,0 +1,122 @@
+"""
+Throughput of the read-only pages at high concurrency, served by sync gunicorn workers (baking_softwaredev.wsgi,
+as before) and by uvicorn workers (baking_softwaredev.asgi).
+
+Both stacks are started with the same number of worker processes on the database of the settings, which should
+contain some public recipes (e.g. imported with the importrecipes command). The load generator keeps the given
+number of connections busy with requests for the overview, a recipe, a search and the gallery JSON, and reports
+the completed requests per second, the errors and the latencies. Every request has a query parameter of its own,
+so it misses the page cache and runs the view.
+
+    pip install uvicorn
+    python benchmarks/asgi_throughput.py --workers 2 --concurrency 200 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+STACKS = {
+    "wsgi": ["baking_softwaredev.wsgi:application"],
+    "asgi": ["-k", "uvicorn.workers.UvicornWorker", "baking_softwaredev.asgi:application"],
+}
+
+
+def start_server(stack, port, workers):
+    environment = dict(os.environ, DJANGO_SETTINGS_MODULE="baking_softwaredev.settings")
+    command = [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", f"127.0.0.1:{port}"]
+    return subprocess.Popen(
+        command + STACKS[stack], cwd=ROOT, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def get(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def wait_until_ready(port, timeout=30):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            await get(port, "/")
+            return
+        except (OSError, IndexError):
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def load(port, paths, concurrency, seconds):
+    latencies, errors = [], 0
+    end = time.monotonic() + seconds
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < end:
+            start = time.monotonic()
+            path = random.choice(paths)
+            separator = "&" if "?" in path else "?"
+            try:
+                status = await get(port, f"{path}{separator}request={random.getrandbits(64)}")
+            except (OSError, IndexError):
+                status = None
+            if status == 200:
+                latencies.append(time.monotonic() - start)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(stack, port, args):
+    server = start_server(stack, port, args.workers)
+    try:
+        asyncio.run(wait_until_ready(port))
+        latencies, errors = asyncio.run(load(port, args.paths, args.concurrency, args.seconds))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    print(
+        f"{stack}  requests/s {len(latencies) / args.seconds:7.0f}  errors {errors:5}  "
+        f"p50/p99 {statistics.median(latencies or [0]) * 1000:7.1f}/{percentile(latencies, 0.99) * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stacks", nargs="+", choices=sorted(STACKS), default=["wsgi", "asgi"])
+    parser.add_argument(
+        "--paths", nargs="+", default=["/", "/recipe/1", "/advancedsearch/?q=kuchen", "/gallery/json"]
+    )
+    args = parser.parse_args()
+    for stack in args.stacks:
+        run(stack, args.port, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Lock contention of several processes sharing one SQLite database, with the default settings of Django
+(rollback journal, 5 s timeout) and with the pragmas of recipes/sqlite.py (WAL, busy_timeout, ...).
+
+Every worker process runs a mix of short write transactions (like adding an item to a shopping list) and reads
+(like rendering a recipe page) for the given time. Reported are the completed operations, the "database is
+locked" errors and the latencies of both kinds of operations.
+
+The write transactions read before they write, like the atomic blocks of the views. Such a transaction cannot
+wait for the write lock once another process wrote after its read, so both modes still report some errors; the
+third run starts the write transactions with BEGIN IMMEDIATE, which Django 3.2 cannot do for all transactions.
+
+    python benchmarks/sqlite_contention.py --workers 8 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from recipes.sqlite import DEFAULT_PRAGMAS, apply_pragmas  # noqa: E402
+
+DJANGO_DEFAULT_TIMEOUT = 5
+NUM_ROWS = 20000
+
+
+def setup(path):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE ingredient (id INTEGER PRIMARY KEY, recipe INTEGER, food INTEGER, amount REAL)")
+    connection.execute("CREATE INDEX ingredient_recipe ON ingredient (recipe)")
+    connection.executemany(
+        "INSERT INTO ingredient (recipe, food, amount) VALUES (?, ?, ?)",
+        ((i % 1000, i % 300, random.random() * 500) for i in range(NUM_ROWS)),
+    )
+    connection.commit()
+    connection.close()
+
+
+def worker(path, tuned, immediate, seconds, write_ratio, results):
+    connection = sqlite3.connect(path, timeout=DJANGO_DEFAULT_TIMEOUT, isolation_level=None)
+    if tuned:
+        apply_pragmas(connection.cursor(), DEFAULT_PRAGMAS)
+    reads, writes, errors = [], [], 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.monotonic()
+        try:
+            if random.random() < write_ratio:
+                connection.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+                recipe = random.randrange(1000)
+                connection.execute("SELECT COUNT(*) FROM ingredient WHERE recipe = ?", (recipe,)).fetchone()
+                connection.execute(
+                    "INSERT INTO ingredient (recipe, food, amount) VALUES (?, ?, ?)",
+                    (recipe, random.randrange(300), random.random() * 500),
+                )
+                connection.execute("UPDATE ingredient SET amount = amount + 1 WHERE recipe = ?", (recipe,))
+                connection.execute("COMMIT")
+                writes.append(time.monotonic() - start)
+            else:
+                connection.execute(
+                    "SELECT food, SUM(amount) FROM ingredient WHERE recipe < ? GROUP BY food",
+                    (random.randrange(50, 200),),
+                ).fetchall()
+                reads.append(time.monotonic() - start)
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            errors += 1
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+    connection.close()
+    results.put((reads, writes, errors))
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(tuned, immediate, workers, seconds, write_ratio):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.sqlite3")
+        setup(path)
+        if tuned:
+            # the journal mode is stored in the file, the other pragmas are set per connection
+            connection = sqlite3.connect(path)
+            apply_pragmas(connection.cursor(), DEFAULT_PRAGMAS)
+            connection.close()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(path, tuned, immediate, seconds, write_ratio, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    reads = [latency for r, _, _ in collected for latency in r]
+    writes = [latency for _, w, _ in collected for latency in w]
+    errors = sum(e for _, _, e in collected)
+    name = ("tuned (WAL)" if tuned else "default") + (", immediate" if immediate else "")
+    print(
+        f"{name:23} reads/s {len(reads) / seconds:8.0f}  writes/s {len(writes) / seconds:7.0f}  "
+        f"locked errors {errors:5}  "
+        f"read p50/p99 {statistics.median(reads or [0]) * 1000:6.1f}/{percentile(reads, 0.99) * 1000:7.1f} ms  "
+        f"write p50/p99 {statistics.median(writes or [0]) * 1000:6.1f}/{percentile(writes, 0.99) * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+    for tuned, immediate in ((False, False), (True, False), (True, True)):
+        run(tuned, immediate, args.workers, args.seconds, args.write_ratio)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,75 @@
-from django.contrib import admin
-from .models import Food, Ingredient, Category, Recipe, RecipeImage, ShoppingList, ShoppingListRecipe
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path
+
+from .forms import RecipeImportForm
+from .importer import RecipeArchive, RecipeImporter, RecipeImportError
+from .models import (
+    Category,
+    Food,
+    Ingredient,
+    MealPlan,
+    MealPlanEntry,
+    Recipe,
+    RecipeImage,
+    ShoppingList,
+    ShoppingListRecipe,
+)
+
+
+@admin.register(Recipe)
+class RecipeAdmin(admin.ModelAdmin):
+    change_list_template = "admin/recipes/recipe/change_list.html"
+
+    def get_urls(self):
+        urls = [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="recipes_recipe_import",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect("admin:recipes_recipe_changelist")
+
+        form = RecipeImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            archive = form.cleaned_data["archive"]
+            try:
+                importer = RecipeImporter(
+                    RecipeArchive(archive, name=archive.name),
+                    author=form.cleaned_data["author"],
+                )
+                importer.run()
+            except (OSError, ValueError, RecipeImportError) as e:
+                messages.error(request, f"Import fehlgeschlagen: {e}")
+            else:
+                for error in importer.errors:
+                    messages.warning(request, error)
+                messages.success(
+                    request,
+                    f"{importer.num_recipes} Rezepte mit {importer.num_ingredients} Zutaten und "
+                    f"{importer.num_images} Bildern in {importer.elapsed:.1f}s importiert.",
+                )
+                return redirect("admin:recipes_recipe_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "form": form,
+            "title": "Rezepte importieren",
+        }
+        return render(request, "admin/recipes/recipe/import.html", context)
+
 
 admin.site.register(Food)
 admin.site.register(Ingredient)
 admin.site.register(Category)
-admin.site.register(Recipe)
 admin.site.register(RecipeImage)
 admin.site.register(ShoppingList)
 admin.site.register(ShoppingListRecipe)
-
+admin.site.register(MealPlan)
+admin.site.register(MealPlanEntry)
@@ -8,3 +8,4 @@ class RecipesConfig(AppConfig):
     def ready(self):
         Recipe = self.get_model("Recipe")
         watson.register(Recipe)
+        import recipes.signals
@@ -0,0 +1,149 @@
+"""
+Serving the read-only pages concurrently with an ASGI server (see baking_softwaredev/asgi.py).
+
+Django 3.2 runs sync views and sync middleware of ASGI requests one after the other in a single thread per
+process, so a slow search or media request would block all other requests of the worker. The read-only views are
+therefore coroutine functions (async_read_view) which run their queries and the rendering in the thread pool of
+the event loop, and all middleware is async-capable. Django 3.2 has no async ORM yet, so the queries of a view
+still block the thread they run in, but no longer the event loop or the other requests.
+
+Media files are served by StaticFilesMiddleware as well, as MediaCling (baking_softwaredev/wsgi.py) only wraps
+the WSGI application.
+
+The ASGI handler of Django 3.2 iterates streaming responses in the event loop, where the generators of the
+export cannot query the database. StreamingASGIHandler takes each chunk in the sync thread instead.
+"""
+import asyncio
+import functools
+from urllib.parse import urlparse
+
+import django
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
+from django.db import close_old_connections
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+_END = object()
+
+
+async def iterate_in_sync_thread(iterable):
+    """
+    Async iterator over the given sync iterable. Each step runs in the sync thread of the process, so generators
+    using the database (and their transactions) always run in the same thread.
+    """
+    iterator = iter(iterable)
+    while True:
+        item = await sync_to_async(next, thread_sensitive=True)(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGIHandler sending the body of streaming responses with iterate_in_sync_thread.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # the headers as in ASGIHandler.send_response of Django 3.2
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b"Set-Cookie", cookie.output(header="").encode("ascii").strip()))
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        async for part in iterate_in_sync_thread(response):
+            for chunk, _ in self.chunk_bytes(part):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    """
+    django.core.asgi.get_asgi_application with the StreamingASGIHandler.
+    """
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
+
+
+def _run_in_thread_pool(view, request, *args, **kwargs):
+    # the threads of the pool are not known to the request_started and request_finished signals of Django,
+    # which close the outdated and broken connections of the thread handling the request otherwise
+    close_old_connections()
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Decorator turning a sync view which only reads into a coroutine function.
+    ASGI requests are handled in the thread pool, concurrently to the other requests of the process. Other
+    requests (WSGI, the test client) are handled in the thread of the request as before, so they share its
+    database connection and transaction.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest):
+            return await sync_to_async(_run_in_thread_pool, thread_sensitive=False)(
+                view, request, *args, **kwargs
+            )
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return wrapper
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware which also serves the uploaded media files and handles ASGI requests without blocking
+    the event loop: the files are looked up and opened in the thread pool.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        # uploads are added while the server runs, so the media files are looked up on every request
+        self.media_prefix = urlparse(settings.MEDIA_URL).path
+        self.media = WhiteNoise(None, autorefresh=True)
+        self.media.add_files(settings.MEDIA_ROOT, prefix=self.media_prefix)
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh or request.path_info.startswith(self.media_prefix):
+            response = await sync_to_async(self.process_request, thread_sensitive=False)(request)
+        elif request.path_info in self.files:
+            response = await sync_to_async(self.serve, thread_sensitive=False)(
+                self.files[request.path_info], request
+            )
+        else:
+            response = None
+        return response or await self.get_response(request)
+
+    def process_request(self, request):
+        response = super().process_request(request)
+        if response is None:
+            media_file = self.media.find_file(request.path_info)
+            if media_file is not None:
+                response = self.serve(media_file, request)
+        return response
@@ -0,0 +1,40 @@
+"""
+(pk, name) choices of all categories and foods for the select fields of the search and recipe forms.
+
+The choices are kept once per process, so rendering a form neither queries nor instantiates the models.
+Creating, renaming or deleting a category or food drops them; other processes drop their copies when they
+notice the changed generation of the data (see generations.py).
+"""
+_choices = {}
+
+
+def get_choices(name):
+    """
+    Returns the list of (pk, name) tuples of the categories ("category") or foods ("food").
+    """
+    from .models import Category, Food
+
+    choices = _choices.get(name)
+    if choices is None:
+        if name == "category":
+            queryset = Category.objects.values_list("pk", "title")
+        else:
+            queryset = Food.objects.values_list("pk", "name")
+        choices = list(queryset.order_by("pk"))
+        _choices[name] = choices
+    return choices
+
+
+def get_category_choices():
+    return get_choices("category")
+
+
+def get_food_choices():
+    return get_choices("food")
+
+
+def invalidate(name):
+    """
+    Drop the choices with the given name ("category" or "food"), they will be reloaded on their next use.
+    """
+    _choices.pop(name, None)
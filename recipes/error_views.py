@@ -2,8 +2,8 @@ from django.shortcuts import render
 
 
 def page_not_found(request, exception):
-    return render(request, "recipes/404.html",)
+    return render(request, "recipes/404.html", status=404)
 
 
 def permission_denied(request, exception):
-    return render(request, "recipes/403.html")
+    return render(request, "recipes/403.html", status=403)
@@ -0,0 +1,174 @@
+"""
+Export of recipes as NDJSON stream or as ZIP archive of the NDJSON file and all recipe images, in the format read
+by the importer.
+
+Both formats are generated as iterators of byte chunks: the recipes are read in chunks ordered by their pk (each
+chunk continues after the last pk of the previous one), the ingredients, categories and images of each chunk are
+fetched with one query each, and image files are copied from the storage in chunks. The ZIP archive is written to
+a non-seekable buffer (using data descriptors), so an export of any size runs in constant memory and can be sent
+with a StreamingHttpResponse.
+Each chunk is read in a short transaction of its own, so the recipes of a chunk are consistent with their
+ingredients, but no transaction (and no connection of a pgbouncer in transaction pooling mode) is held while the
+client downloads. Recipes changed during a long download are exported in the state of the chunk that reads them.
+"""
+import json
+import zipfile
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import Ingredient, Recipe, RecipeImage
+
+CHUNK_SIZE = 500
+FILE_CHUNK_SIZE = 64 * 1024
+RECIPES_FILE_NAME = "recipes.ndjson"
+
+
+def format_decimal(value):
+    if value is None:
+        return None
+    return format(value.normalize(), "f")
+
+
+def get_recipe_records(recipes, include_secret_notes_of=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields the export records of the given recipes.
+    include_secret_notes_of: Function deciding for a recipe whether its secret notes are exported.
+    """
+    recipes = recipes.select_related("author").order_by("pk")
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            chunk = list((recipes if last_pk is None else recipes.filter(pk__gt=last_pk))[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            records = get_chunk_records(chunk, include_secret_notes_of)
+        yield from records
+
+
+def get_chunk_records(chunk, include_secret_notes_of):
+    """
+    Returns the export records of the given recipes, reading their ingredients, categories and images.
+    """
+    pks = [recipe.pk for recipe in chunk]
+    ingredients = {pk: [] for pk in pks}
+    for recipe_pk, amount, unit, food, notes in (
+        Ingredient.objects.filter(recipe__in=pks)
+        .order_by("pk")
+        .values_list("recipe", "amount", "unit", "food__name", "notes")
+    ):
+        ingredients[recipe_pk].append(
+            {"amount": format_decimal(amount), "unit": unit, "food": food, "notes": notes}
+        )
+    categories = {pk: [] for pk in pks}
+    for recipe_pk, title in Recipe.categories.through.objects.filter(
+        recipe__in=pks
+    ).values_list("recipe", "category__title"):
+        categories[recipe_pk].append(title)
+    images = {pk: [] for pk in pks}
+    for recipe_pk, image, is_primary in (
+        RecipeImage.objects.filter(recipe__in=pks)
+        .order_by("pk")
+        .values_list("recipe", "image", "is_primary")
+    ):
+        images[recipe_pk].append({"path": image, "is_primary": is_primary})
+
+    records = []
+    for recipe in chunk:
+        secret_notes = ""
+        if include_secret_notes_of is None or include_secret_notes_of(recipe):
+            secret_notes = recipe.secret_notes
+        records.append(
+            {
+                "title": recipe.title,
+                "introduction": recipe.introduction,
+                "directions": recipe.directions,
+                "notes": recipe.notes,
+                "secret_notes": secret_notes,
+                "prep_time": recipe.prep_time,
+                "servings": format_decimal(recipe.servings),
+                "public": recipe.public,
+                "author": recipe.author.username if recipe.author else None,
+                "categories": sorted(categories[recipe.pk]),
+                "ingredients": ingredients[recipe.pk],
+                "images": images[recipe.pk],
+            }
+        )
+    return records
+
+
+def export_ndjson(records):
+    for record in records:
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class StreamBuffer:
+    """
+    Non-seekable file object collecting the bytes written by the ZipFile until they are taken with pop().
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def get_image_names(recipes, chunk_size=CHUNK_SIZE):
+    """
+    Yields the names of the images of the given recipes in order, read in chunks like the recipes.
+    """
+    image_names = (
+        RecipeImage.objects.filter(recipe__in=recipes.values("pk"))
+        .order_by("image")
+        .values_list("image", flat=True)
+        .distinct()
+    )
+    last_name = None
+    while True:
+        names = image_names if last_name is None else image_names.filter(image__gt=last_name)
+        chunk = list(names[:chunk_size])
+        if not chunk:
+            return
+        last_name = chunk[-1]
+        yield from chunk
+
+
+def export_zip(recipes, include_secret_notes_of=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields a ZIP archive containing recipes.ndjson and the images of the given recipes,
+    stored under their names in the storage.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(RECIPES_FILE_NAME, "w", force_zip64=True) as entry:
+            for line in export_ndjson(
+                get_recipe_records(recipes, include_secret_notes_of, chunk_size)
+            ):
+                entry.write(line)
+                yield buffer.pop()
+
+        for name in get_image_names(recipes, chunk_size):
+            try:
+                image = default_storage.open(name, "rb")
+            except OSError:
+                continue
+            with image:
+                info = zipfile.ZipInfo(name)
+                # images are already compressed
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, "w", force_zip64=True) as entry:
+                    for chunk in iter(lambda: image.read(FILE_CHUNK_SIZE), b""):
+                        entry.write(chunk)
+                        yield buffer.pop()
+    yield buffer.pop()
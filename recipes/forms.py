@@ -1,17 +1,29 @@
+from datetime import date, timedelta
+
 from django import forms
+from django.contrib.auth.models import User
 from django.forms import BaseInlineFormSet, inlineformset_factory, modelformset_factory
 from django.urls import reverse_lazy
 from django_addanother.widgets import AddAnotherWidgetWrapper
 
+from .choices import get_category_choices, get_food_choices
 from .models import (
     Category,
-    Food,
     RecipeImage,
     Ingredient,
     Recipe,
     Idea,
+    MealPlanEntry,
+    filter_recipe_list,
     get_modifiable_recipe_list,
+    get_or_create_foods,
 )
+from .signals import ingredients_changed
+
+# longest range of days shown by the meal plan
+MAX_MEAL_PLAN_DAYS = 31
+# step of the links to the previous and the next range of the meal plan
+MEAL_PLAN_STEP = timedelta(days=7)
 
 
 class RecipeForm(forms.ModelForm):
@@ -41,9 +53,18 @@ class RecipeForm(forms.ModelForm):
             ),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # render the category options from the cached choices instead of loading all categories
+        self.fields["categories"].choices = get_category_choices()
+
 
 class IngredientForm(forms.ModelForm):
-    food_name = forms.CharField(label="Lebensmittel", required=True)
+    food_name = forms.CharField(
+        label="Lebensmittel",
+        required=True,
+        widget=forms.TextInput(attrs={"class": "typeahead-food", "autocomplete": "off"}),
+    )
 
     class Meta:
         model = Ingredient
@@ -61,21 +82,132 @@ class IngredientForm(forms.ModelForm):
         """
         When creating a new ingredient: Check if a food with the given name is already stored in the database.
         If so, use this food object to prevent database littering.
+        Names only differing in case, whitespace or umlaut spelling ("Möhre", "moehre ") refer to the same food.
         """
         ingredient = super().save(commit=False)
-        food_obj, created = Food.objects.get_or_create(
-            name=self.cleaned_data["food_name"]
-        )
-        ingredient.food = food_obj
+        food_name = self.cleaned_data["food_name"].strip()
+        ingredient.food_id = get_or_create_foods([food_name])[food_name]
         if commit:
             ingredient.save()
         return ingredient
 
 
+class ExistingIngredientField(forms.ModelChoiceField):
+    """
+    Field for the id of an ingredient of the formset. The id is looked up in the ingredients already loaded by the
+    formset instead of querying the database once per form.
+    """
+
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            ingredient = self.formset._existing_object(int(value))
+        except (TypeError, ValueError):
+            ingredient = None
+        if ingredient is None:
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return ingredient
+
+
+class BaseIngredientFormSet(BaseInlineFormSet):
+    def get_queryset(self):
+        # the forms display the names of the foods
+        return super().get_queryset().select_related("food")
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        pk_name = self._pk_field.name
+        field = form.fields[pk_name]
+        form.fields[pk_name] = ExistingIngredientField(
+            self,
+            field.queryset,
+            initial=field.initial,
+            required=False,
+            widget=field.widget,
+        )
+
+    def save(self, commit=True):
+        """
+        Save all ingredients of the recipe with a few bulk queries instead of one query per form:
+        the foods of all forms are resolved (and missing foods created) at once, then the new, changed and deleted
+        ingredients are each written with one query.
+        Receivers of the ingredients_changed signal are notified, as the bulk queries do not send any model signals.
+        """
+        self.new_objects = []
+        self.changed_objects = []
+        self.deleted_objects = []
+
+        changed_forms = []
+        for form in self.initial_forms:
+            if form.instance.pk is None:
+                continue
+            if self.can_delete and self._should_delete_form(form):
+                self.deleted_objects.append(form.instance)
+            elif form.has_changed():
+                changed_forms.append(form)
+                self.changed_objects.append((form.instance, form.changed_data))
+        new_forms = [
+            form
+            for form in self.extra_forms
+            if form.has_changed()
+            and not (self.can_delete and self._should_delete_form(form))
+        ]
+
+        food_pks = get_or_create_foods(
+            form.cleaned_data["food_name"].strip() for form in changed_forms + new_forms
+        )
+        for form in changed_forms + new_forms:
+            form.instance.recipe = self.instance
+            form.instance.food_id = food_pks[form.cleaned_data["food_name"].strip()]
+            form.instance.set_canonical_amount()
+        self.new_objects = [form.instance for form in new_forms]
+
+        # the ingredients have no many-to-many fields, but callers of save(commit=False) expect save_m2m
+        saved_forms = changed_forms + new_forms
+        for form in saved_forms:
+            forms.ModelForm.save(form, commit=False)
+
+        def save_m2m():
+            for form in saved_forms:
+                form.save_m2m()
+
+        if not commit:
+            self.save_m2m = save_m2m
+            return [instance for instance, _ in self.changed_objects] + self.new_objects
+
+        if self.deleted_objects:
+            Ingredient.objects.filter(
+                pk__in=[ing.pk for ing in self.deleted_objects]
+            ).delete()
+        if self.changed_objects:
+            Ingredient.objects.bulk_update(
+                [instance for instance, _ in self.changed_objects],
+                ["amount", "unit", "food", "notes", "canonical_amount", "canonical_unit"],
+            )
+        if self.new_objects:
+            Ingredient.objects.bulk_create(self.new_objects)
+        save_m2m()
+        if self.deleted_objects or self.changed_objects or self.new_objects:
+            ingredients_changed.send(sender=Recipe, recipe=self.instance)
+        return [instance for instance, _ in self.changed_objects] + self.new_objects
+
+    save.alters_data = True
+
+
 IngredientFormSet = inlineformset_factory(
     Recipe,
     Ingredient,
     form=IngredientForm,
+    formset=BaseIngredientFormSet,
     extra=10,
     widgets={
         "notes": forms.Textarea(attrs={"cols": 20, "rows": 1}),
@@ -144,9 +276,27 @@ ImageFormSet = inlineformset_factory(
 )
 
 
-class CategoryFilterForm(forms.Form):
-    c = forms.ModelMultipleChoiceField(
-        queryset=Category.objects.all(),
+class FacetCountsMixin:
+    """
+    Shows the number of matching recipes next to each option of the filter field 'facet_field'.
+    """
+
+    facet_field = None
+
+    def set_facet_counts(self, counts):
+        """
+        counts: dict mapping the pks of the options to the number of recipes in the current search results.
+        """
+        field = self.fields[self.facet_field]
+        field.choices = [(pk, f"{name} ({counts.get(pk, 0)})") for pk, name in field.choices]
+
+
+class CategoryFilterForm(FacetCountsMixin, forms.Form):
+    facet_field = "c"
+
+    c = forms.TypedMultipleChoiceField(
+        choices=get_category_choices,
+        coerce=int,
         widget=forms.SelectMultiple(
             attrs={
                 "class": "selectpicker",
@@ -161,9 +311,12 @@ class CategoryFilterForm(forms.Form):
     )
 
 
-class FoodFilterForm(forms.Form):
-    f = forms.ModelMultipleChoiceField(
-        queryset=Food.objects.all(),
+class FoodFilterForm(FacetCountsMixin, forms.Form):
+    facet_field = "f"
+
+    f = forms.TypedMultipleChoiceField(
+        choices=get_food_choices,
+        coerce=int,
         widget=forms.SelectMultiple(
             attrs={
                 "class": "selectpicker",
@@ -184,8 +337,9 @@ class FoodFilterForm(forms.Form):
 
 
 class ExcludeFoodForm(forms.Form):
-    ex = forms.ModelMultipleChoiceField(
-        queryset=Food.objects.all(),
+    ex = forms.TypedMultipleChoiceField(
+        choices=get_food_choices,
+        coerce=int,
         widget=forms.SelectMultiple(
             attrs={
                 "class": "selectpicker",
@@ -200,6 +354,24 @@ class ExcludeFoodForm(forms.Form):
     )
 
 
+class PantryForm(forms.Form):
+    f = forms.TypedMultipleChoiceField(
+        choices=get_food_choices,
+        coerce=int,
+        widget=forms.SelectMultiple(
+            attrs={
+                "class": "selectpicker",
+                "data-live-search": "true",
+                "data-size": "5",
+                "title": "Zutaten wählen",
+                "data-actions-box": "true",
+            }
+        ),
+        required=False,
+        label="Was hast du da?",
+    )
+
+
 class CategoryForm(forms.ModelForm):
     class Meta:
         model = Category
@@ -233,3 +405,50 @@ class IdeaForm(forms.ModelForm):
     class Meta:
         model = Idea
         exclude = ["user"]
+
+
+class MealPlanEntryForm(forms.ModelForm):
+    class Meta:
+        model = MealPlanEntry
+        fields = ["date", "recipe", "servings"]
+        widgets = {
+            "date": forms.DateInput(attrs={"type": "date"}),
+            "recipe": forms.Select(attrs={"class": "selectpicker", "data-live-search": "true"}),
+        }
+
+    def __init__(self, user, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["recipe"].queryset = filter_recipe_list(
+            user, Recipe.objects.order_by("title"), filter_empty=False
+        )
+
+
+class MealPlanRangeForm(forms.Form):
+    start = forms.DateField(label="Von", widget=forms.DateInput(attrs={"type": "date"}))
+    end = forms.DateField(label="Bis", widget=forms.DateInput(attrs={"type": "date"}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end:
+            if end < start:
+                raise forms.ValidationError("Das Ende des Zeitraums liegt vor seinem Anfang.")
+            if (end - start).days >= MAX_MEAL_PLAN_DAYS:
+                raise forms.ValidationError(f"Der Zeitraum darf höchstens {MAX_MEAL_PLAN_DAYS} Tage umfassen.")
+            # the links to the previous and next week are computed from the range
+            if start - date.min < MEAL_PLAN_STEP or date.max - end < MEAL_PLAN_STEP:
+                raise forms.ValidationError("Der Zeitraum liegt außerhalb des Kalenders.")
+        return cleaned_data
+
+
+class RecipeImportForm(forms.Form):
+    archive = forms.FileField(
+        label="Archiv",
+        help_text="ZIP-Archiv oder einzelne JSON-, NDJSON-, CSV- oder Markdown-Datei",
+    )
+    author = forms.ModelChoiceField(
+        queryset=User.objects.all(),
+        required=False,
+        label="Autor",
+        help_text="Leer lassen, um die Autoren aus dem Archiv zu übernehmen",
+    )
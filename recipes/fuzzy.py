@@ -0,0 +1,207 @@
+"""
+Typo-tolerant matching of food names and recipe titles.
+
+Names are folded (lower case, umlauts and ß spelled out, accents removed) and split into character trigrams.
+The trigram postings of all names are precomputed once per process, so a lookup only has to count the shared
+trigrams of the candidates sharing at least one trigram with the query. On PostgreSQL the lookups can be done by
+pg_trgm in the database instead (see DatabaseTrigramIndex).
+"""
+import collections
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db.models import CharField, F, FloatField, Func, Lookup, Value
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+# minimum share of the query trigrams a name needs to contain to be considered a match
+DEFAULT_THRESHOLD = 0.5
+
+
+def normalize(text):
+    """
+    Fold the given text for matching: "Weizenmehl Typ 405 " and "weizenmehl typ 405" are considered equal,
+    "Möhre" is folded to "moehre" and "Grieß" to "griess".
+    """
+    text = text.lower().translate(UMLAUTS)
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def trigrams(text):
+    """
+    Returns the set of trigrams of the normalized text. Every word is padded with two leading and one trailing
+    space (like pg_trgm does), so short words and word beginnings get a higher weight.
+    """
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Inverted index mapping trigrams to the primary keys of all names containing them.
+    """
+
+    def __init__(self, entries):
+        """
+        entries: Iterable of (pk, name) tuples.
+        """
+        self.names = {}
+        self.sizes = {}
+        self.exact = {}
+        self.postings = collections.defaultdict(list)
+        for pk, name in entries:
+            grams = trigrams(name)
+            self.names[pk] = name
+            self.sizes[pk] = len(grams)
+            self.exact.setdefault(normalize(name), pk)
+            for gram in grams:
+                self.postings[gram].append(pk)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_exact(self, name):
+        """
+        Returns the pk of the entry whose normalized name is equal to the normalized given name or None.
+        """
+        return self.exact.get(normalize(name))
+
+    def get_names(self, pks):
+        """
+        Returns a dict mapping the given pks to the names of their entries.
+        """
+        return {pk: self.names[pk] for pk in pks}
+
+    def search(self, query, limit=10, threshold=DEFAULT_THRESHOLD):
+        """
+        Returns a list of (pk, score) tuples of the best matching entries, best match first.
+
+        An entry matches if it contains at least the fraction 'threshold' of the query trigrams,
+        so "Mehl" finds "Weizenmehl" and "Schokoladenkuchn" finds "Schokoladenkuchen".
+        The matches are ranked by their trigram similarity to the query, so closer names come first.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        matches = []
+        for pk, count in shared.items():
+            if count / len(grams) < threshold:
+                continue
+            similarity = count / (len(grams) + self.sizes[pk] - count)
+            matches.append((similarity, pk))
+
+        matches.sort(key=lambda m: (-m[0], self.names[m[1]]))
+        return [(pk, similarity) for similarity, pk in matches[:limit]]
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(Lookup):
+    """
+    Lookup field__trigram_word_similar=query (as in Django 4.0) matching the values containing a word similar to
+    the query, with the operator %> of pg_trgm.
+    """
+
+    lookup_name = "trigram_word_similar"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} %%> {rhs}", lhs_params + rhs_params
+
+
+class WordSimilarity(Func):
+    """
+    Word similarity of pg_trgm of the query (the first expression) to the text (the second expression).
+    """
+
+    function = "word_similarity"
+    output_field = FloatField()
+
+
+class DatabaseTrigramIndex:
+    """
+    Index with the interface of TrigramIndex answered by PostgreSQL with pg_trgm and the trigram GIN indexes
+    created by the migrations, used with the setting FUZZY_SEARCH_BACKEND = "database". Nothing is kept in the
+    memory of the process, so it does not have to be invalidated.
+    The candidates are found with the lookup trigram_word_similar, which uses the GIN index and the threshold
+    pg_trgm.word_similarity_threshold (0.6 by default), and ranked by their word similarity to the query.
+    Exact matches are looked up in normalized_field, a column storing the normalized names. Without it all names
+    are compared.
+    """
+
+    def __init__(self, queryset, field, normalized_field=None):
+        self.queryset = queryset
+        self.field = field
+        self.normalized_field = normalized_field
+
+    def __len__(self):
+        return self.queryset.count()
+
+    def _matches(self, query, threshold):
+        return (
+            self.queryset.filter(**{f"{self.field}__trigram_word_similar": query})
+            .annotate(score=WordSimilarity(Value(query), F(self.field)))
+            .filter(score__gte=threshold)
+            .order_by("-score", self.field)
+        )
+
+    def get_exact(self, name):
+        key = normalize(name)
+        entries = self.queryset.order_by("pk")
+        if self.normalized_field is not None:
+            return entries.filter(**{self.normalized_field: key}).values_list("pk", flat=True).first()
+        for pk, candidate in entries.values_list("pk", self.field).iterator():
+            if normalize(candidate) == key:
+                return pk
+        return None
+
+    def get_names(self, pks):
+        return dict(self.queryset.filter(pk__in=pks).values_list("pk", self.field))
+
+    def search(self, query, limit=10, threshold=DEFAULT_THRESHOLD):
+        if not normalize(query):
+            return []
+        return list(self._matches(query, threshold).values_list("pk", "score")[:limit])
+
+
+_indexes = {}
+
+
+def _get_index(name, queryset, field, normalized_field=None):
+    if getattr(settings, "FUZZY_SEARCH_BACKEND", "memory") == "database":
+        return DatabaseTrigramIndex(queryset, field, normalized_field)
+    index = _indexes.get(name)
+    if index is None:
+        index = TrigramIndex(queryset.values_list("pk", field))
+        _indexes[name] = index
+    return index
+
+
+def get_food_index():
+    from .models import Food
+
+    return _get_index("food", Food.objects.all(), "name", "normalized_name")
+
+
+def get_recipe_index():
+    from .models import Recipe
+
+    return _get_index("recipe", Recipe.objects.all(), "title")
+
+
+def invalidate(name):
+    """
+    Drop the index with the given name ("food" or "recipe"), it will be rebuilt on the next lookup.
+    """
+    _indexes.pop(name, None)
@@ -0,0 +1,90 @@
+"""
+Coherency of the per-process caches (trigram indexes, pantry matrix, form choices) across worker processes.
+
+Every kind of data has a generation counter in the CacheGeneration table, which is incremented when the data
+changes. Each process polls the counters at most once per request and not more often than every
+CACHE_GENERATION_POLL_INTERVAL seconds, and drops the local caches registered for the counters that changed.
+The counters of a transaction are incremented once after it is committed, and not at all if it is rolled back.
+"""
+import collections
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.utils.deprecation import MiddlewareMixin
+
+from .oncommit import collect_on_commit
+
+GENERATION_NAMES = ("recipe", "ingredient", "category", "food", "recipe_image")
+DEFAULT_POLL_INTERVAL = 0.5
+
+_listeners = collections.defaultdict(list)
+_seen = {}
+_last_poll = None
+
+
+def on_change(names, callback):
+    """
+    Call callback() when one of the generations with the given names was incremented by any process.
+    """
+    for name in names:
+        _listeners[name].append(callback)
+
+
+def _bump_generations(names):
+    from .models import CacheGeneration
+
+    updated = CacheGeneration.objects.filter(name__in=names).update(
+        generation=F("generation") + 1
+    )
+    if updated < len(names):
+        CacheGeneration.objects.bulk_create(
+            [CacheGeneration(name=name, generation=1) for name in names],
+            ignore_conflicts=True,
+        )
+
+
+def bump(*names):
+    """
+    Increment the generations with the given names once the current transaction is committed.
+    """
+    collect_on_commit(_bump_generations, names)
+
+
+def poll(force=False):
+    """
+    Read the generations and drop the local caches of those changed since the last poll.
+    Returns the names of the changed generations.
+    """
+    global _last_poll
+    from .models import CacheGeneration
+
+    interval = getattr(settings, "CACHE_GENERATION_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)
+    now = time.monotonic()
+    if _last_poll is not None and not force and now - _last_poll < interval:
+        return []
+    # the local caches are built after the first poll, so the generations found by it are up to date
+    first_poll = _last_poll is None
+    _last_poll = now
+
+    changed = []
+    for name, generation in CacheGeneration.objects.values_list("name", "generation"):
+        if not first_poll and _seen.get(name, 0) != generation:
+            changed.append(name)
+        _seen[name] = generation
+
+    callbacks = []
+    for name in changed:
+        callbacks.extend(c for c in _listeners[name] if c not in callbacks)
+    for callback in callbacks:
+        callback()
+    return changed
+
+
+class CacheGenerationMiddleware(MiddlewareMixin):
+    """
+    Drop the outdated local caches before the request is handled.
+    """
+
+    def process_request(self, request):
+        poll()
@@ -0,0 +1,479 @@
+"""
+Bulk import of recipes from JSON, NDJSON, CSV and Markdown files, either as single file or bundled in a ZIP archive
+together with the images of the recipes.
+
+Every recipe is described by a dict of the form
+    {
+        "title": "Käsekuchen",
+        "introduction": "...", "directions": "...", "notes": "...", "secret_notes": "...", "prep_time": "1 h",
+        "servings": "12", "public": true, "author": "username",
+        "categories": ["Kuchen"],
+        "ingredients": [{"amount": "500", "unit": "g", "food": "Quark", "notes": ""}],
+        "images": [{"path": "images/kaesekuchen.jpg", "is_primary": true}]
+    }
+which is exactly the format written by the exporter.
+CSV files contain one recipe per row with these columns; categories and images are separated by ";" and the
+ingredients are given one per line as "amount|unit|food|notes".
+Markdown files contain one recipe each, see read_markdown.
+
+The recipes are read as a stream and imported in batches: the foods and categories of a batch are resolved at once
+and recipes, ingredients and images are written with bulk queries (the recipes one by one on databases which do not
+return the pks of bulk inserts, like SQLite). Only .json files are loaded as a whole,
+so NDJSON is the preferred format for large libraries.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import posixpath
+import re
+import time
+import zipfile
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from fractions import Fraction
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from watson import search as watson
+
+from . import generations
+from .choices import invalidate as invalidate_choices
+from .models import Category, Food, Ingredient, Recipe, RecipeImage, get_or_create_foods
+from .signals import recipes_imported
+
+BATCH_SIZE = 200
+CHUNK_SIZE = 64 * 1024
+RECIPE_FILE_EXTENSIONS = (".json", ".ndjson", ".jsonl", ".csv", ".md")
+TEXT_FIELDS = ("introduction", "directions", "notes", "secret_notes", "prep_time")
+
+INGREDIENT_LINE = re.compile(
+    r"^(?P<amount>\d+(?:[.,]\d+)?(?:/\d+)?)?\s*(?P<rest>.*?)\s*(?:\((?P<notes>[^)]*)\))?$"
+)
+MARKDOWN_IMAGE = re.compile(r"!\[[^\]]*\]\(([^)\s]+)\)")
+
+
+AMOUNT_FIELD = Ingredient._meta.get_field("amount")
+SERVINGS_FIELD = Recipe._meta.get_field("servings")
+FOOD_NAME_LENGTH = Food._meta.get_field("name").max_length
+CATEGORY_TITLE_LENGTH = Category._meta.get_field("title").max_length
+
+
+class RecipeImportError(Exception):
+    pass
+
+
+def parse_amount(amount, field=AMOUNT_FIELD):
+    """
+    Parse amounts like "100", "0,5" or "1/2" and round them to the decimal places of the given DecimalField.
+    Amounts with more digits before the decimal point than the field can store are rejected.
+    """
+    if amount in (None, ""):
+        return Decimal(0)
+    try:
+        if isinstance(amount, str) and "/" in amount:
+            frac = Fraction(amount)
+            value = Decimal(frac.numerator) / Decimal(frac.denominator)
+        else:
+            value = Decimal(str(amount).replace(",", "."))
+    except (InvalidOperation, ValueError, ZeroDivisionError):
+        raise RecipeImportError(f"Ungültige Menge: {amount}")
+    if not value.is_finite() or value < 0:
+        raise RecipeImportError(f"Ungültige Menge: {amount}")
+    if value >= 10 ** (field.max_digits - field.decimal_places):
+        raise RecipeImportError(f"Menge zu groß: {amount}")
+    return value.quantize(Decimal(1).scaleb(-field.decimal_places), rounding=ROUND_HALF_UP)
+
+
+def parse_ingredient_line(line):
+    """
+    Parse a written ingredient like "100 g Mehl (Type 405)" or "2 Eier".
+    If the line contains an amount and at least two more words, the first word is taken as unit.
+    """
+    match = INGREDIENT_LINE.match(line.strip())
+    words = match.group("rest").split()
+    if match.group("amount") and len(words) > 1:
+        unit, food = words[0], " ".join(words[1:])
+    else:
+        unit, food = "", " ".join(words)
+    return {
+        "amount": match.group("amount"),
+        "unit": unit,
+        "food": food,
+        "notes": match.group("notes") or "",
+    }
+
+
+def read_json(stream):
+    data = json.load(stream)
+    if isinstance(data, dict):
+        data = [data]
+    yield from data
+
+
+def read_ndjson(stream):
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise RecipeImportError(f"Zeile {number}: {e}")
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        ingredients = []
+        for line in (row.get("ingredients") or "").splitlines():
+            if line.strip():
+                amount, unit, food, notes = (line.split("|") + ["", "", ""])[:4]
+                ingredients.append(
+                    {"amount": amount, "unit": unit, "food": food, "notes": notes}
+                )
+        images = [path for path in (row.get("images") or "").split(";") if path.strip()]
+        yield {
+            **row,
+            "public": (row.get("public") or "").strip().lower() in ("1", "true", "ja"),
+            "categories": (row.get("categories") or "").split(";"),
+            "ingredients": ingredients,
+            "images": [
+                {"path": path.strip(), "is_primary": i == 0}
+                for i, path in enumerate(images)
+            ],
+        }
+
+
+def read_markdown(text):
+    """
+    Read a recipe written as Markdown:
+
+        # Käsekuchen
+        servings: 12
+        prep_time: 1 h
+        categories: Kuchen, Quark
+        public: ja
+
+        Introduction ...
+
+        ## Zutaten
+        - 500 g Quark
+        - 3 Eier
+
+        ## Zubereitung
+        ...
+
+        ## Notizen
+        ...
+
+    Images are referenced as ![Käsekuchen](images/kaesekuchen.jpg), the first image is the primary image.
+    """
+    record = {"categories": [], "ingredients": []}
+    section = "introduction"
+    sections = {"introduction": [], "directions": [], "notes": []}
+    in_header = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("# ") and "title" not in record:
+            record["title"] = stripped[2:].strip()
+            in_header = True
+            continue
+        if in_header:
+            key, sep, value = stripped.partition(":")
+            if sep and key.strip() in ("servings", "prep_time", "categories", "public"):
+                record[key.strip()] = value.strip()
+                continue
+            in_header = False
+        if stripped.startswith("## "):
+            heading = stripped[3:].strip().lower()
+            if heading in ("zutaten", "ingredients"):
+                section = "ingredients"
+            elif heading in ("zubereitung", "directions"):
+                section = "directions"
+            elif heading in ("notizen", "anmerkungen", "notes"):
+                section = "notes"
+            continue
+        if section == "ingredients":
+            if stripped.startswith(("- ", "* ")):
+                record["ingredients"].append(parse_ingredient_line(stripped[2:]))
+        elif not MARKDOWN_IMAGE.fullmatch(stripped):
+            sections[section].append(line)
+
+    for key, lines in sections.items():
+        record[key] = "\n".join(lines).strip()
+    if isinstance(record.get("categories"), str):
+        record["categories"] = record["categories"].split(",")
+    record["public"] = str(record.get("public", "")).lower() in ("1", "true", "ja")
+    record["images"] = [
+        {"path": path, "is_primary": i == 0}
+        for i, path in enumerate(MARKDOWN_IMAGE.findall(text))
+    ]
+    return record
+
+
+def read_recipe_file(name, stream):
+    """
+    Yields the recipes of the given binary stream, the format is chosen by the extension of the file name.
+    """
+    extension = os.path.splitext(name)[1].lower()
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if extension == ".json":
+        yield from read_json(text)
+    elif extension in (".ndjson", ".jsonl"):
+        yield from read_ndjson(text)
+    elif extension == ".csv":
+        yield from read_csv(text)
+    elif extension == ".md":
+        yield read_markdown(text.read())
+
+
+class RecipeArchive:
+    """
+    A ZIP archive of recipe files and images or a single recipe file.
+    Image paths are relative to the root of the archive or the directory of the single file.
+    """
+
+    def __init__(self, file, name=None):
+        """
+        file: Path or binary file object. For file objects that are no ZIP archives, the name is needed
+              to detect the format.
+        """
+        self.file = file
+        self.name = name or getattr(file, "name", None) or str(file)
+        self.zip = zipfile.ZipFile(file) if zipfile.is_zipfile(file) else None
+        if hasattr(file, "seek"):
+            file.seek(0)
+
+    def records(self):
+        if self.zip is None:
+            if hasattr(self.file, "read"):
+                yield from read_recipe_file(self.name, self.file)
+            else:
+                with open(self.file, "rb") as stream:
+                    yield from read_recipe_file(self.name, stream)
+            return
+
+        for info in self.zip.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(RECIPE_FILE_EXTENSIONS):
+                continue
+            with self.zip.open(info) as stream:
+                yield from read_recipe_file(info.filename, stream)
+
+    def open_image(self, path):
+        path = posixpath.normpath(path)
+        # the images have to be inside the archive or the directory of the recipe file
+        if posixpath.isabs(path) or os.path.isabs(path) or path.split("/")[0] == "..":
+            raise RecipeImportError(f"Ungültiger Bildpfad {path}")
+        if self.zip is not None:
+            return self.zip.open(path)
+        if hasattr(self.file, "read"):
+            raise RecipeImportError(f"Bild {path} nicht gefunden")
+        return open(os.path.join(os.path.dirname(os.path.abspath(self.file)), path), "rb")
+
+
+class RecipeImporter:
+    def __init__(self, archive, author=None, batch_size=BATCH_SIZE, log=None):
+        """
+        archive: RecipeArchive to import.
+        author: User the imported recipes belong to. If None, the user named in the recipe is used, if existing.
+        log: Function called with progress messages.
+        """
+        self.archive = archive
+        self.author = author
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.num_recipes = 0
+        self.num_ingredients = 0
+        self.num_images = 0
+        self.errors = []
+        # sha256 of the image content -> name of the stored image, to store every image only once
+        self.image_names = {}
+        # names of the images stored by the current batch, deleted again if it fails
+        self.new_image_names = []
+        self.recipe_pks = []
+
+    def run(self):
+        start = time.perf_counter()
+        records = self.archive.records()
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+            elapsed = time.perf_counter() - start
+            self.log(
+                f"Imported {self.num_recipes} recipes ({self.num_recipes / elapsed:.1f} recipes/s)"
+            )
+
+        recipes_imported.send(sender=Recipe, recipe_pks=self.recipe_pks)
+        self.elapsed = time.perf_counter() - start
+        return self.num_recipes
+
+    def clean_record(self, record):
+        if not isinstance(record, dict) or not str(record.get("title") or "").strip():
+            raise RecipeImportError("Rezept ohne Titel")
+        servings = record.get("servings")
+        return {
+            **{field: str(record.get(field) or "") for field in TEXT_FIELDS},
+            "title": str(record["title"]).strip()[:255],
+            "servings": parse_amount(servings, SERVINGS_FIELD) if servings not in (None, "") else None,
+            "public": bool(record.get("public")),
+            "author": record.get("author"),
+            "categories": [
+                str(c).strip()[:CATEGORY_TITLE_LENGTH] for c in record.get("categories") or [] if str(c).strip()
+            ],
+            "ingredients": [
+                {
+                    "amount": parse_amount(ing.get("amount")),
+                    "unit": str(ing.get("unit") or "").strip()[:20],
+                    "food": str(ing["food"]).strip()[:FOOD_NAME_LENGTH],
+                    "notes": str(ing.get("notes") or ""),
+                }
+                for ing in record.get("ingredients") or []
+                if str(ing.get("food") or "").strip()
+            ],
+            "images": [
+                image if isinstance(image, dict) else {"path": image}
+                for image in record.get("images") or []
+            ],
+        }
+
+    def import_batch(self, batch):
+        records = []
+        for record in batch:
+            try:
+                records.append(self.clean_record(record))
+            except RecipeImportError as e:
+                self.errors.append(str(e))
+        if not records:
+            return
+
+        self.new_image_names = []
+        try:
+            self.write_batch(records)
+        except BaseException:
+            # the files stored for the rolled back images are not referenced by any recipe
+            for name in self.new_image_names:
+                default_storage.delete(name)
+            self.image_names = {
+                digest: name for digest, name in self.image_names.items() if name not in self.new_image_names
+            }
+            raise
+
+    def write_batch(self, records):
+        with transaction.atomic():
+            food_pks = get_or_create_foods(
+                {ing["food"] for record in records for ing in record["ingredients"]}
+            )
+            category_pks = self.get_or_create_categories(
+                {title for record in records for title in record["categories"]}
+            )
+            authors = self.get_authors(records)
+
+            recipes = [
+                Recipe(
+                    title=record["title"],
+                    servings=record["servings"],
+                    public=record["public"],
+                    author=authors.get(record["author"], self.author),
+                    **{field: record[field] for field in TEXT_FIELDS},
+                )
+                for record in records
+            ]
+            self.bulk_create_recipes(recipes)
+
+            Recipe.categories.through.objects.bulk_create(
+                [
+                    Recipe.categories.through(
+                        recipe_id=recipe.pk, category_id=category_pks[title]
+                    )
+                    for recipe, record in zip(recipes, records)
+                    for title in set(record["categories"])
+                ]
+            )
+            ingredients = [
+                Ingredient(recipe_id=recipe.pk, food_id=food_pks[ing.pop("food")], **ing)
+                for recipe, record in zip(recipes, records)
+                for ing in record["ingredients"]
+            ]
+            for ingredient in ingredients:
+                ingredient.set_canonical_amount()
+            Ingredient.objects.bulk_create(ingredients)
+            images = []
+            for recipe, record in zip(recipes, records):
+                for image in record["images"]:
+                    name = self.store_image(image["path"])
+                    if name is not None:
+                        images.append(
+                            RecipeImage(
+                                recipe_id=recipe.pk,
+                                image=name,
+                                is_primary=bool(image.get("is_primary")),
+                            )
+                        )
+            RecipeImage.objects.bulk_create(images)
+
+            # bulk_create does not send post_save, so the search index is updated here
+            for recipe in recipes:
+                watson.default_search_engine.update_obj_index(recipe)
+
+        self.recipe_pks.extend(recipe.pk for recipe in recipes)
+        self.num_recipes += len(recipes)
+        self.num_ingredients += len(ingredients)
+        self.num_images += len(images)
+
+    def bulk_create_recipes(self, recipes):
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            return
+        # the database does not return the pks of bulk inserted rows (e.g. SQLite with Django 3.2), so the recipes
+        # are inserted one by one to get the pks assigned by the database; the search index is updated by
+        # import_batch as for the bulk insert
+        with watson.skip_index_update():
+            for recipe in recipes:
+                recipe.save(force_insert=True)
+
+    def get_or_create_categories(self, titles):
+        Category.objects.bulk_create(
+            [Category(title=title) for title in titles], ignore_conflicts=True
+        )
+        invalidate_choices("category")
+        generations.bump("category")
+        return dict(Category.objects.filter(title__in=titles).values_list("title", "pk"))
+
+    def get_authors(self, records):
+        if self.author is not None:
+            return {}
+        usernames = {record["author"] for record in records if record["author"]}
+        return {user.username: user for user in User.objects.filter(username__in=usernames)}
+
+    def store_image(self, path):
+        """
+        Store the image at the given path of the archive and return its name in the storage, or None if the image
+        cannot be read. Images are named by the hash of their content, so every image is stored only once, even
+        if it is contained several times under different paths.
+        """
+        try:
+            digest = hashlib.sha256()
+            with self.archive.open_image(path) as stream:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            digest = digest.hexdigest()
+            if digest in self.image_names:
+                return self.image_names[digest]
+
+            name = f"recipe_pics/{digest}{os.path.splitext(path)[1].lower()}"
+            if not default_storage.exists(name):
+                with self.archive.open_image(path) as stream:
+                    name = default_storage.save(name, File(stream, name=name))
+                self.new_image_names.append(name)
+        except RecipeImportError as e:
+            self.errors.append(str(e))
+            return None
+        except (KeyError, OSError):
+            self.errors.append(f"Bild {path} nicht gefunden")
+            return None
+        self.image_names[digest] = name
+        return name
@@ -0,0 +1,259 @@
+"""
+Live updates of the shopping lists with server-sent events.
+
+Every open shopping list page subscribes to the events of its list at /shoppinglist/events, which is served by
+LiveShoppingListApp, a plain ASGI application in front of Django (see baking_softwaredev/asgi.py). The views
+publish small deltas (added and removed items, changed totals, check-offs) after their transaction is committed.
+
+The events are passed to the subscribers by the backend of the LIVE_EVENTS_BACKEND setting:
+- "memory" (default): the broker lives in the memory of the process, so all clients of a list have to be connected
+  to the same process, i.e. a deployment with one ASGI worker.
+- "database": the events are written to the LiveEvent table, and every process with subscribers polls it every
+  LIVE_EVENTS_POLL_INTERVAL seconds and passes the new events to its subscribers. Needed with several workers.
+  Events are kept for EVENT_RETENTION seconds.
+"""
+import asyncio
+import collections
+import json
+import threading
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+EVENTS_PATH = "/shoppinglist/events"
+KEEPALIVE_INTERVAL = 15
+QUEUE_SIZE = 100
+DEFAULT_POLL_INTERVAL = 1
+EVENT_RETENTION = 60
+
+_subscribers = collections.defaultdict(set)
+_lock = threading.Lock()
+_poller = None
+_poller_started = None
+
+
+def uses_database():
+    return getattr(settings, "LIVE_EVENTS_BACKEND", "memory") == "database"
+
+
+class Subscription:
+    def __init__(self, shopping_list_pk):
+        self.shopping_list_pk = shopping_list_pk
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def put(self, message):
+        # clients too slow to take their events are dropped and reconnect
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.queue = None
+
+
+def subscribe(shopping_list_pk):
+    """
+    Returns a Subscription receiving the events of the given list. Has to be called in the event loop.
+    """
+    global _poller, _poller_started
+    subscription = Subscription(shopping_list_pk)
+    with _lock:
+        _subscribers[shopping_list_pk].add(subscription)
+    if uses_database() and (_poller is None or _poller.done() or _poller.get_loop() is not subscription.loop):
+        _poller_started = asyncio.Event()
+        _poller = subscription.loop.create_task(poll_events(_poller_started))
+    return subscription
+
+
+async def wait_for_poller():
+    """
+    With the database backend, waits until the poller of the process has read the position of the last event,
+    so the events written from now on reach the new subscribers.
+    """
+    if uses_database():
+        await _poller_started.wait()
+
+
+def unsubscribe(subscription):
+    with _lock:
+        subscribers = _subscribers[subscription.shopping_list_pk]
+        subscribers.discard(subscription)
+        if not subscribers:
+            del _subscribers[subscription.shopping_list_pk]
+
+
+def has_subscribers(shopping_list_pk):
+    """
+    Whether clients of the list are connected to this process, to skip computing events nobody receives.
+    With the database backend the clients may be connected to any process, so this is always true.
+    """
+    if uses_database():
+        return True
+    with _lock:
+        return bool(_subscribers.get(shopping_list_pk))
+
+
+def publish(shopping_list_pk, event, data):
+    """
+    Sends the event with the JSON-serializable data to all subscribers of the given list. Can be called from any
+    thread; use publish_on_commit in views.
+    """
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    if uses_database():
+        from .models import LiveEvent
+
+        LiveEvent.objects.filter(created__lt=timezone.now() - timedelta(seconds=EVENT_RETENTION)).delete()
+        LiveEvent.objects.create(shopping_list_pk=shopping_list_pk, message=message)
+    else:
+        deliver(shopping_list_pk, message.encode())
+
+
+def deliver(shopping_list_pk, message):
+    """
+    Passes the message to the subscribers of the given list connected to this process.
+    """
+    with _lock:
+        subscribers = list(_subscribers.get(shopping_list_pk, ()))
+    for subscription in subscribers:
+        if subscription.queue is not None:
+            subscription.loop.call_soon_threadsafe(subscription.put, message)
+
+
+def publish_on_commit(shopping_list_pk, event, data):
+    transaction.on_commit(lambda: publish(shopping_list_pk, event, data))
+
+
+def get_events(last_pk, shopping_list_pks):
+    """
+    Returns the pk of the last event written and the messages of the events of the given lists written after the
+    event with last_pk, as (shopping list pk, message).
+    """
+    from .models import LiveEvent
+
+    close_old_connections()
+    try:
+        latest_pk = LiveEvent.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        if last_pk is None or latest_pk <= last_pk:
+            return latest_pk, []
+        events = LiveEvent.objects.filter(
+            pk__gt=last_pk, pk__lte=latest_pk, shopping_list_pk__in=shopping_list_pks
+        ).order_by("pk")
+        return latest_pk, list(events.values_list("shopping_list_pk", "message"))
+    finally:
+        close_old_connections()
+
+
+async def poll_events(started):
+    """
+    Passes the events written to the database to the subscribers of this process, as long as there are any.
+    """
+    interval = getattr(settings, "LIVE_EVENTS_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)
+    try:
+        last_pk, _ = await sync_to_async(get_events)(None, ())
+    finally:
+        started.set()
+    while True:
+        await asyncio.sleep(interval)
+        with _lock:
+            shopping_list_pks = list(_subscribers)
+        if not shopping_list_pks:
+            return
+        last_pk, events = await sync_to_async(get_events)(last_pk, shopping_list_pks)
+        for shopping_list_pk, message in events:
+            deliver(shopping_list_pk, message.encode())
+
+
+def get_shopping_list_pk(cookie_header):
+    """
+    Returns the pk of the shopping list of the user logged in with the session cookie, None for anonymous users.
+    """
+    close_old_connections()
+    try:
+        return _get_shopping_list_pk(cookie_header)
+    finally:
+        close_old_connections()
+
+
+def _get_shopping_list_pk(cookie_header):
+    from django.contrib.auth import get_user
+    from django.utils.module_loading import import_string
+
+    from .models import ShoppingList
+
+    cookies = SimpleCookie()
+    cookies.load(cookie_header)
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    engine = import_string(settings.SESSION_ENGINE + ".SessionStore")
+    # get_user only needs the session of the request
+    user = get_user(SimpleNamespace(session=engine(morsel.value)))
+    if not user.is_authenticated:
+        return None
+    return ShoppingList.objects.filter(user=user).values_list("pk", flat=True).first()
+
+
+class LiveShoppingListApp:
+    """
+    ASGI application serving the event stream of the shopping list of the logged in user at EVENTS_PATH and
+    passing all other requests to the Django application.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != EVENTS_PATH:
+            return await self.application(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        shopping_list_pk = await sync_to_async(get_shopping_list_pk)(headers.get(b"cookie", b"").decode("latin-1"))
+        if shopping_list_pk is None:
+            await send({"type": "http.response.start", "status": 403, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        subscription = subscribe(shopping_list_pk)
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await wait_for_poller()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"content-type", b"text/event-stream"),
+                        (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no"),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+            while subscription.queue is not None:
+                message = asyncio.ensure_future(subscription.queue.get())
+                await asyncio.wait(
+                    {message, disconnected}, timeout=KEEPALIVE_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected.done():
+                    message.cancel()
+                    break
+                if message.done():
+                    body = message.result()
+                else:
+                    message.cancel()
+                    body = b": keepalive\n\n"
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            unsubscribe(subscription)
+            disconnected.cancel()
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import NUM_SIMILAR_RECIPES, update_similar_recipes
+
+
+class Command(BaseCommand):
+    help = "Recompute the similar recipes of all recipes from their ingredients and categories."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-k",
+            type=int,
+            default=NUM_SIMILAR_RECIPES,
+            help="Number of similar recipes stored per recipe.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        num_recipes = update_similar_recipes(k=options["k"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Computed the similar recipes of {num_recipes} recipes in {time.perf_counter() - start:.2f}s."
+            )
+        )
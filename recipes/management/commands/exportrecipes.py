@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.exporter import CHUNK_SIZE, export_ndjson, export_zip, get_recipe_records
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Export recipes with their ingredients, categories and images as ZIP archive or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File the export is written to.")
+        parser.add_argument(
+            "--user", help="Only export the recipes of the user with this username."
+        )
+        parser.add_argument(
+            "--format",
+            choices=["zip", "ndjson"],
+            default="zip",
+            help="ZIP archive including the images or NDJSON file of the recipes only.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Number of recipes read at once.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        recipes = Recipe.objects.all()
+        if options["user"]:
+            recipes = recipes.filter(author__username=options["user"])
+
+        if options["format"] == "ndjson":
+            chunks = export_ndjson(
+                get_recipe_records(recipes, chunk_size=options["chunk_size"])
+            )
+        else:
+            chunks = export_zip(recipes, chunk_size=options["chunk_size"])
+
+        size = 0
+        with open(options["path"], "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Exported {recipes.count()} recipes ({size / 2**20:.1f} MiB) "
+                f"in {time.perf_counter() - start:.2f}s."
+            )
+        )
@@ -0,0 +1,51 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.importer import BATCH_SIZE, RecipeArchive, RecipeImporter, RecipeImportError
+
+
+class Command(BaseCommand):
+    help = "Import recipes from a ZIP archive or a single JSON, NDJSON, CSV or Markdown file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Archive or recipe file to import.")
+        parser.add_argument(
+            "--user",
+            help="Username of the author of all imported recipes. "
+            "Defaults to the author given in the recipes, if the user exists.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Number of recipes written at once.",
+        )
+
+    def handle(self, *args, **options):
+        author = None
+        if options["user"]:
+            try:
+                author = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+
+        try:
+            importer = RecipeImporter(
+                RecipeArchive(options["path"]),
+                author=author,
+                batch_size=options["batch_size"],
+                log=self.stdout.write,
+            )
+            importer.run()
+        except (OSError, ValueError, RecipeImportError) as e:
+            raise CommandError(f"Import failed: {e}")
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {importer.num_recipes} recipes with {importer.num_ingredients} ingredients "
+                f"and {importer.num_images} images in {importer.elapsed:.2f}s "
+                f"({importer.num_recipes / importer.elapsed:.1f} recipes/s)."
+            )
+        )
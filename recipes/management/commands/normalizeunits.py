@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Ingredient
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the canonical amounts and units of all ingredients, "
+        "e.g. after adding units to the registry in recipes/units.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Number of ingredients read and written at once.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        changed = []
+        num_changed = 0
+        for ingredient in Ingredient.objects.order_by("pk").iterator(chunk_size=batch_size):
+            old = (ingredient.canonical_amount, ingredient.canonical_unit)
+            ingredient.set_canonical_amount()
+            if (ingredient.canonical_amount, ingredient.canonical_unit) != old:
+                changed.append(ingredient)
+            if len(changed) >= batch_size:
+                Ingredient.objects.bulk_update(changed, ["canonical_amount", "canonical_unit"])
+                num_changed += len(changed)
+                changed = []
+        if changed:
+            Ingredient.objects.bulk_update(changed, ["canonical_amount", "canonical_unit"])
+            num_changed += len(changed)
+        self.stdout.write(f"Updated {num_changed} ingredients.")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintenance of the SQLite database, to be run regularly (e.g. nightly with cron): "
+        "checkpoints and truncates the WAL file and updates the statistics of the query planner."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="Also rebuild the database file to reclaim free pages. Blocks all writers while running.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The default database is not an SQLite database.")
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("PRAGMA optimize")
+            if options["vacuum"]:
+                cursor.execute("VACUUM")
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            busy, log_frames, checkpointed = cursor.fetchone()
+            cursor.execute("PRAGMA page_count")
+            page_count = cursor.fetchone()[0]
+            cursor.execute("PRAGMA freelist_count")
+            free_pages = cursor.fetchone()[0]
+
+        if busy:
+            self.stdout.write("The WAL could not be checkpointed completely, as other connections are reading.")
+        self.stdout.write(f"Database has {page_count} pages, {free_pages} of them free.")
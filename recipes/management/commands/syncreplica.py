@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from recipes.routers import get_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database to the replicas, the replication of the local setup with a replica "
+        "(see baking_softwaredev/settings_replica.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Copy again every given number of seconds until interrupted.",
+        )
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError("There is no replica database.")
+        if any(connections[alias].vendor != "sqlite" for alias in [DEFAULT_DB_ALIAS, *replicas]):
+            raise CommandError("Only SQLite databases can be copied, use the replication of the server otherwise.")
+
+        while True:
+            for replica in replicas:
+                self.copy(connections[DEFAULT_DB_ALIAS], connections[replica].settings_dict["NAME"])
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
+
+    def copy(self, source, path):
+        source.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            source.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(f"Copied the database to {path}.")
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_closure(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    RelatedRecipeClosure = apps.get_model("recipes", "RelatedRecipeClosure")
+    edges = {}
+    for from_pk, to_pk in Recipe.related_recipes.through.objects.values_list("from_recipe", "to_recipe"):
+        edges.setdefault(from_pk, set()).add(to_pk)
+
+    rows = []
+    for pk in edges:
+        reachable = set()
+        stack = [pk]
+        while stack:
+            for related in edges.get(stack.pop(), ()):
+                if related != pk and related not in reachable:
+                    reachable.add(related)
+                    stack.append(related)
+        rows.extend(RelatedRecipeClosure(ancestor_id=pk, descendant_id=related) for related in reachable)
+    RelatedRecipeClosure.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0043_alter_idea_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedRecipeClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_descendants', to='recipes.recipe')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_ancestors', to='recipes.recipe')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='relatedrecipeclosure',
+            index=models.Index(fields=['descendant', 'ancestor'], name='recipes_rel_descend_f13bad_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedrecipeclosure',
+            unique_together={('ancestor', 'descendant')},
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:22
+
+import re
+import unicodedata
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# frozen copy of the unit registry of recipes/units.py at the time of this migration, later changes of the
+# registry are applied with the normalizeunits command
+UNITS = {
+    "g": {"g": 1, "gr": 1, "gramm": 1, "gram": 1, "kg": 1000, "kilo": 1000, "kilogramm": 1000, "mg": "0.001"},
+    "ml": {
+        "ml": 1,
+        "milliliter": 1,
+        "cl": 10,
+        "zentiliter": 10,
+        "dl": 100,
+        "deziliter": 100,
+        "l": 1000,
+        "liter": 1000,
+    },
+    "EL": {"el": 1, "essloeffel": 1, "essl": 1, "tbsp": 1},
+    "TL": {"tl": 1, "teeloeffel": 1, "teel": 1, "tsp": 1},
+    "Msp.": {"msp": 1, "messerspitze": 1, "messerspitzen": 1},
+    "Prise": {"prise": 1, "prisen": 1, "pr": 1},
+    "Pck.": {"pck": 1, "pckg": 1, "pkt": 1, "paeckchen": 1, "packung": 1, "packungen": 1},
+    "Stück": {"stueck": 1, "stk": 1, "st": 1},
+    "Becher": {"becher": 1},
+    "Dose": {"dose": 1, "dosen": 1},
+    "Bund": {"bund": 1},
+    "Tasse": {"tasse": 1, "tassen": 1},
+    "Blatt": {"blatt": 1, "blaetter": 1},
+}
+
+ALIASES = {
+    alias: (canonical, Decimal(str(factor)))
+    for canonical, aliases in UNITS.items()
+    for alias, factor in aliases.items()
+}
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def normalize(text):
+    # frozen copy of recipes.fuzzy.normalize
+    text = text.lower().translate(UMLAUTS)
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def set_canonical_amounts(apps, schema_editor):
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    changed = []
+    for ingredient in Ingredient.objects.only("amount", "unit").order_by("pk").iterator(chunk_size=BATCH_SIZE):
+        canonical_unit, factor = ALIASES.get(normalize(ingredient.unit), (ingredient.unit.strip(), Decimal(1)))
+        ingredient.canonical_amount = Decimal(ingredient.amount) * factor
+        ingredient.canonical_unit = canonical_unit
+        changed.append(ingredient)
+        if len(changed) >= BATCH_SIZE:
+            Ingredient.objects.bulk_update(changed, ["canonical_amount", "canonical_unit"], batch_size=BATCH_SIZE)
+            changed = []
+    Ingredient.objects.bulk_update(changed, ["canonical_amount", "canonical_unit"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0046_cachegeneration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='canonical_amount',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='canonical_unit',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.RunPython(set_canonical_amounts, migrations.RunPython.noop),
+    ]
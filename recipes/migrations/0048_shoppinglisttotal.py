@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0047_ingredient_canonical_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='totals_stale',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='ShoppingListTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('amount', models.DecimalField(decimal_places=3, max_digits=15)),
+                ('num_ingredients', models.IntegerField(default=0)),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.food')),
+                ('shopping_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='recipes.shoppinglist')),
+            ],
+            options={
+                'unique_together': {('shopping_list', 'food', 'unit')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0048_shoppinglisttotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglisttotal',
+            name='checked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    ("recipes_food_name_trgm", "recipes_food", "name"),
+    ("recipes_recipe_title_trgm", "recipes_recipe", "title"),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # only used by the database backend of the fuzzy search on PostgreSQL (see recipes/fuzzy.py)
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0050_mealplan'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
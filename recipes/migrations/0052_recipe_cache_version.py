@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:59
+
+from django.db import migrations, models
+
+
+def create_content_version(apps, schema_editor):
+    CacheGeneration = apps.get_model("recipes", "CacheGeneration")
+    CacheGeneration.objects.get_or_create(name="content", defaults={"generation": 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0051_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(create_content_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:09
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0052_recipe_cache_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mealplanentry',
+            name='servings',
+            field=models.DecimalField(decimal_places=3, max_digits=6, validators=[django.core.validators.MinValueValidator(Decimal('0.001'))], verbose_name='Portionen'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:25
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def normalize(text):
+    # frozen copy of recipes.fuzzy.normalize
+    text = text.lower().translate(UMLAUTS)
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def set_normalized_names(apps, schema_editor):
+    Food = apps.get_model("recipes", "Food")
+    changed = []
+    for food in Food.objects.only("name").order_by("pk").iterator(chunk_size=BATCH_SIZE):
+        food.normalized_name = normalize(food.name)
+        changed.append(food)
+        if len(changed) >= BATCH_SIZE:
+            Food.objects.bulk_update(changed, ["normalized_name"], batch_size=BATCH_SIZE)
+            changed = []
+    Food.objects.bulk_update(changed, ["normalized_name"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0054_liveevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='normalized_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(set_normalized_names, migrations.RunPython.noop),
+    ]
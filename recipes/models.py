@@ -1,18 +1,35 @@
 import collections
+import threading
+from contextlib import contextmanager
 from decimal import Decimal
 from random import randint
 
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied
-from django.db import models
-from django.db.models import Q
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.db.models import Count, F, Prefetch, Q, Sum
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from model_utils.models import TimeStampedModel
 from watson import search as watson
 
+from . import generations, live
+from .choices import invalidate as invalidate_choices
+from .fuzzy import get_food_index, get_recipe_index, normalize
+from .fuzzy import invalidate as invalidate_trigram_index
+from .pantry import get_recipe_food_matrix
+from .units import canonicalize
 from .utils import get_image_size
 
+# name of the CacheGeneration row counting the changes of all recipes, see get_recipe_list_version
+CONTENT_VERSION = "content"
+# number of recipes whose versions are incremented with one query
+VERSION_CHUNK_SIZE = 500
+
+# recipes whose versions are incremented at the end of a batched_recipe_cache_versions block
+_batched_versions = threading.local()
+
 
 class Category(models.Model):
     title = models.CharField(max_length=255, unique=True, verbose_name="Name")
@@ -41,10 +58,19 @@ class Category(models.Model):
 
 class Food(models.Model):
     name = models.CharField(max_length=255, unique=True, verbose_name="Lebensmittel")
+    # the name folded by fuzzy.normalize, to find the food of a name variant in the database
+    normalized_name = models.CharField(max_length=255, db_index=True, editable=False, default="")
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"normalized_name"}
+        super().save(*args, **kwargs)
+
 
 class Recipe(TimeStampedModel):
     title = models.CharField(max_length=255, verbose_name="Titel")
@@ -72,11 +98,16 @@ class Recipe(TimeStampedModel):
         verbose_name="zugehörige Rezepte",
     )
     public = models.BooleanField(default=False, verbose_name="für alle sichtbar")
+    # content version used in the keys of the cached fragments, only changed by bump_recipe_cache_version
+    cache_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
     def get_categories(self):
+        # use the categories loaded by prefetch_recipe_cards if available
+        if hasattr(self, "sorted_categories"):
+            return self.sorted_categories
         return self.categories.all().order_by("title")
 
     def get_ingredients(self):
@@ -88,10 +119,26 @@ class Recipe(TimeStampedModel):
     def get_servings(self):
         return self.servings
 
+    def get_all_related_recipes(self):
+        """
+        Returns all recipes related to this recipe, including the recipes related to the related recipes and so on.
+        """
+        return Recipe.objects.filter(closure_ancestors__ancestor=self).order_by("title")
+
+    def get_similar_recipes(self, user):
+        """
+        Returns the precomputed most similar recipes accessible to the given user, most similar first.
+        """
+        recipes = Recipe.objects.filter(similar_to__recipe=self).order_by("-similar_to__score")
+        return filter_recipe_list(user, recipes)
+
     def get_images(self):
         return self.image_of.all().order_by("-is_primary")
 
     def get_primary_image(self):
+        # use the image loaded by prefetch_recipe_cards if available
+        if hasattr(self, "primary_images"):
+            return self.primary_images[0] if self.primary_images else None
         return self.image_of.filter(is_primary=True).first()
 
     def check_view_permissions(self, user):
@@ -108,6 +155,69 @@ class Recipe(TimeStampedModel):
             raise PermissionDenied
 
 
+class RelatedRecipeClosure(models.Model):
+    """
+    Transitive closure of Recipe.related_recipes: contains a row for every recipe 'descendant' that can be reached
+    from the recipe 'ancestor' by following related_recipes over one or more hops.
+    A recipe is never stored as related to itself, even if the links form a cycle.
+    The table is kept up to date by the m2m_changed and delete signal handlers in signals.py.
+    """
+
+    ancestor = models.ForeignKey(
+        Recipe, related_name="closure_descendants", on_delete=models.CASCADE
+    )
+    descendant = models.ForeignKey(
+        Recipe, related_name="closure_ancestors", on_delete=models.CASCADE
+    )
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
+        indexes = [models.Index(fields=["descendant", "ancestor"])]
+
+
+class SimilarRecipe(models.Model):
+    """
+    The most similar recipes of a recipe by ingredients and categories, computed by similarity.update_similar_recipes.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe, related_name="similar_recipes", on_delete=models.CASCADE
+    )
+    similar = models.ForeignKey(
+        Recipe, related_name="similar_to", on_delete=models.CASCADE
+    )
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ("recipe", "similar")
+        indexes = [models.Index(fields=["recipe", "-score"])]
+
+
+class CacheGeneration(models.Model):
+    """
+    Counter incremented whenever the data of the given kind changes, see generations.py.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    generation = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.generation}"
+
+
+class LiveEvent(models.Model):
+    """
+    Live update of a shopping list passed between the worker processes by the database backend of live.py.
+    """
+
+    shopping_list_pk = models.PositiveIntegerField()
+    message = models.TextField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.shopping_list_pk}: {self.message}"
+
+
 class Ingredient(models.Model):
     amount = models.DecimalField(max_digits=6, decimal_places=3, verbose_name="Anzahl")
     unit = models.CharField(max_length=20, blank=True, verbose_name="Einheit")
@@ -116,10 +226,27 @@ class Ingredient(models.Model):
     recipe = models.ForeignKey(
         Recipe, related_name="belongs_to", on_delete=models.CASCADE, null=False
     )
+    # amount and unit converted with the unit registry (see units.py), set on every save
+    canonical_amount = models.DecimalField(max_digits=12, decimal_places=3, default=0)
+    canonical_unit = models.CharField(max_length=20, blank=True, default="")
 
     def __str__(self):
         return self.food.name
 
+    def set_canonical_amount(self):
+        """
+        Sets canonical_amount and canonical_unit from amount and unit.
+        Has to be called for ingredients saved with bulk_create or bulk_update, which bypass save().
+        """
+        self.canonical_amount, self.canonical_unit = canonicalize(self.amount, self.unit)
+
+    def save(self, *args, **kwargs):
+        self.set_canonical_amount()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) | {"canonical_amount", "canonical_unit"}
+        super().save(*args, **kwargs)
+
     def get_amount(self):
         return self.amount
 
@@ -169,34 +296,317 @@ class ShoppingList(models.Model):
     recipes = models.ManyToManyField(
         ShoppingListRecipe, blank=True, verbose_name="ShoppingItems"
     )
+    # set when the recipes on the list changed in a way the stored totals cannot follow with deltas,
+    # the totals are then recomputed on the next view
+    totals_stale = models.BooleanField(default=True)
 
     def __str__(self):
         return f"Einkaufsliste für {self.user.username}: {self.recipes.count()} Rezepte"
 
-    def get_shopping_list_summary(self):
-        # TODO: alle verlinkten Rezepte auch mit einrechnen
-        # for now: verlinkte Rezepte sind nicht einberechnet
-
-        # first: collect all ingredients
-        ingredients = []
-        for recipe in self.recipes.all():
-            ingredients.extend(
-                get_converted_ingredients(recipe.recipe, recipe.servings)
+    def get_expanded_recipes(self, items=None):
+        """
+        Returns a list of (item, [(recipe, factor), ...]) tuples for the items of the list. The recipes of an item
+        are its recipe followed by all directly and indirectly related recipes visible to the owner of the list,
+        each to be scaled by the factor of the item's servings to the servings of its recipe.
+        The related recipes are read from the closure table, so every recipe reachable on several paths or through
+        cycles is included once, and the whole expansion is loaded with two queries.
+        items: Items to expand instead of all items of the list.
+        """
+        if items is None:
+            items = list(self.recipes.select_related("recipe").order_by("pk"))
+        visible = filter_recipe_list(self.user, Recipe.objects.all(), filter_empty=False)
+        related = collections.defaultdict(list)
+        for closure in (
+            RelatedRecipeClosure.objects.filter(
+                ancestor__in=[item.recipe_id for item in items],
+                descendant__in=visible.values("pk"),
+            )
+            .select_related("descendant")
+            .order_by("descendant__title")
+        ):
+            related[closure.ancestor_id].append(closure.descendant)
+
+        expanded = []
+        for item in items:
+            recipe = item.recipe
+            factor = get_ingredients_conversion_factor(recipe, item.servings) if recipe.servings else 1
+            expanded.append((item, [(rec, factor) for rec in [recipe] + related[recipe.pk]]))
+        return expanded
+
+    def compute_totals(self, expanded=None):
+        """
+        Returns a dict mapping (food pk, canonical unit) to (amount, number of ingredients) of all ingredients of
+        the list, including the ingredients of the related recipes.
+        The amounts are summed per recipe, food and canonical unit in the database and only the per-recipe sums
+        are scaled by the factors of the items.
+        expanded: Result of get_expanded_recipes, defaults to all items of the list.
+        """
+        if expanded is None:
+            expanded = self.get_expanded_recipes()
+        factors = collections.defaultdict(list)
+        for _, recipes in expanded:
+            for recipe, factor in recipes:
+                factors[recipe.pk].append(factor)
+
+        totals = collections.defaultdict(lambda: [0, 0])
+        for recipe_pk, food_pk, unit, amount, count in (
+            Ingredient.objects.filter(recipe__in=list(factors))
+            .values("recipe", "food", "canonical_unit")
+            .annotate(amount=Sum("canonical_amount"), count=Count("pk"))
+            .order_by()
+            .values_list("recipe", "food", "canonical_unit", "amount", "count")
+        ):
+            total = totals[(food_pk, unit)]
+            total[0] += amount * sum(factors[recipe_pk])
+            total[1] += count * len(factors[recipe_pk])
+        return {key: tuple(total) for key, total in totals.items()}
+
+    def refresh_totals(self):
+        """
+        Recomputes the stored totals of the list from all its items.
+        """
+        with transaction.atomic():
+            list(ShoppingList.objects.select_for_update().filter(pk=self.pk).values_list("pk"))
+            # the rows are updated in place, so they keep their pks and check-offs
+            stored = {(total.food_id, total.unit): total for total in self.totals.all()}
+            changed, new = [], []
+            for (food_pk, unit), (amount, count) in self.compute_totals().items():
+                total = stored.pop((food_pk, unit), None)
+                if total is None:
+                    new.append(
+                        ShoppingListTotal(
+                            shopping_list=self, food_id=food_pk, unit=unit, amount=amount, num_ingredients=count
+                        )
+                    )
+                else:
+                    total.amount, total.num_ingredients = amount, count
+                    changed.append(total)
+            ShoppingListTotal.objects.bulk_create(new)
+            ShoppingListTotal.objects.bulk_update(changed, ["amount", "num_ingredients"])
+            ShoppingListTotal.objects.filter(pk__in=[total.pk for total in stored.values()]).delete()
+            ShoppingList.objects.filter(pk=self.pk).update(totals_stale=False)
+        self.totals_stale = False
+
+    refresh_totals.alters_data = True
+
+    def apply_totals_delta(self, items, sign):
+        """
+        Adds (sign=1) or subtracts (sign=-1) the ingredients of the given items to the stored totals and returns
+        the set of changed (food pk, unit) keys.
+        Stale totals are left alone (returning None), they are recomputed on the next view anyway.
+        """
+        with transaction.atomic():
+            # locks the list, so concurrent changes of its totals are applied one after another
+            stale = (
+                ShoppingList.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list("totals_stale", flat=True)
+                .first()
             )
+            if stale:
+                return None
+            if not items:
+                return set()
+            delta = self.compute_totals(self.get_expanded_recipes(items))
+            stored = {
+                (total.food_id, total.unit): total
+                for total in self.totals.filter(food__in={food_pk for food_pk, _ in delta})
+            }
+            changed, new, removed = [], [], []
+            for key, (amount, count) in delta.items():
+                # rounded like the stored amounts, so removing an item subtracts exactly what adding it added
+                amount = Decimal(amount).quantize(Decimal("0.001"))
+                total = stored.get(key)
+                if total is None:
+                    if sign > 0:
+                        new.append(
+                            ShoppingListTotal(
+                                shopping_list=self, food_id=key[0], unit=key[1], amount=amount, num_ingredients=count
+                            )
+                        )
+                    continue
+                total.amount += sign * amount
+                total.num_ingredients += sign * count
+                if total.num_ingredients > 0:
+                    changed.append(total)
+                else:
+                    removed.append(total.pk)
+            ShoppingListTotal.objects.bulk_create(new)
+            ShoppingListTotal.objects.bulk_update(changed, ["amount", "num_ingredients"])
+            ShoppingListTotal.objects.filter(pk__in=removed).delete()
+        return set(delta)
+
+    apply_totals_delta.alters_data = True
+
+    def add_item(self, item):
+        """
+        Adds the item to the list and returns the changed keys of the totals (see apply_totals_delta).
+        """
+        return self.add_items([item])
 
-        list_items = collections.defaultdict(int)
+    add_item.alters_data = True
 
-        for ingredient in ingredients:
-            food = ingredient.food.name
-            amount = ingredient.amount
-            unit = ingredient.unit
-            key = (food, unit)
+    def add_items(self, items):
+        """
+        Adds the items to the list with a single delta of the totals and returns its changed keys.
+        """
+        with transaction.atomic():
+            self.recipes.add(*items)
+            return self.apply_totals_delta(items, 1)
 
-            list_items[key] += amount
+    add_items.alters_data = True
 
-        list_items = [(f, u, a) for ((f, u), a) in list_items.items()]
+    def remove_item(self, item):
+        """
+        Removes the item from the list and returns the changed keys of the totals (see apply_totals_delta).
+        """
+        with transaction.atomic():
+            changed = self.apply_totals_delta([item], -1)
+            self.recipes.remove(item)
+            item.delete()
+        return changed
 
-        return sorted(list_items)
+    remove_item.alters_data = True
+
+    def get_shopping_list_summary(self):
+        """
+        Returns the sorted list of (food name, unit, amount) of all ingredients of the list, including the
+        ingredients of the related recipes. Amounts are summed in their canonical units, so e.g. 500 g and 1 kg
+        of flour are listed as 1500 g.
+        The totals are read from the stored totals, which are only recomputed if they are stale.
+        """
+        if self.totals_stale:
+            self.refresh_totals()
+        return list(
+            self.totals.order_by("food__name", "unit").values_list("food__name", "unit", "amount")
+        )
+
+    def get_total_rows(self, keys=None):
+        """
+        Returns the stored totals as dicts with id, food, unit, amount and checked, sorted by food and unit.
+        keys: Only return the totals of these (food pk, unit) keys. Keys no longer on the list are returned with
+        id and amount None.
+        """
+        if keys is None:
+            if self.totals_stale:
+                self.refresh_totals()
+            totals = self.totals.all()
+        else:
+            keys = set(keys)
+            totals = self.totals.filter(food__in={food_pk for food_pk, _ in keys})
+
+        rows = {}
+        for pk, food_pk, name, unit, amount, checked in totals.values_list(
+            "pk", "food", "food__name", "unit", "amount", "checked"
+        ):
+            if keys is None or (food_pk, unit) in keys:
+                rows[(food_pk, unit)] = {"id": pk, "food": name, "unit": unit, "amount": amount, "checked": checked}
+        if keys is not None and len(rows) < len(keys):
+            missing = keys - set(rows)
+            names = dict(Food.objects.filter(pk__in={food_pk for food_pk, _ in missing}).values_list("pk", "name"))
+            for food_pk, unit in missing:
+                rows[(food_pk, unit)] = {
+                    "id": None, "food": names[food_pk], "unit": unit, "amount": None, "checked": False
+                }
+        return sorted(rows.values(), key=lambda row: (row["food"], row["unit"]))
+
+
+class ShoppingListTotal(models.Model):
+    """
+    Total amount of a food in a canonical unit on a shopping list, maintained with deltas when items are added or
+    removed. num_ingredients counts the ingredients summed up, so totals of zero amounts are kept while needed.
+    """
+
+    shopping_list = models.ForeignKey(ShoppingList, related_name="totals", on_delete=models.CASCADE)
+    food = models.ForeignKey(Food, on_delete=models.CASCADE)
+    unit = models.CharField(max_length=20, blank=True)
+    amount = models.DecimalField(max_digits=15, decimal_places=3)
+    num_ingredients = models.IntegerField(default=0)
+    checked = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ("shopping_list", "food", "unit")
+
+
+def mark_shopping_list_totals_stale(recipe_pks):
+    """
+    Marks the totals of all lists containing one of the given recipes, directly or as related recipe, as stale.
+    """
+    recipe_pks = list(recipe_pks)
+    ancestors = RelatedRecipeClosure.objects.filter(descendant__in=recipe_pks).values("ancestor")
+    pks = set(
+        ShoppingList.objects.filter(
+            Q(recipes__recipe__in=recipe_pks) | Q(recipes__recipe__in=ancestors), totals_stale=False
+        ).values_list("pk", flat=True)
+    )
+    ShoppingList.objects.filter(pk__in=pks).update(totals_stale=True)
+    # the open pages of the lists reload their totals
+    for pk in pks:
+        live.publish_on_commit(pk, "refresh", {})
+
+
+class MealPlan(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+
+    def __str__(self):
+        return f"Essensplan für {self.user.username}"
+
+    def get_entries(self, start, end):
+        return (
+            self.entries.filter(date__range=(start, end))
+            .select_related("recipe")
+            .order_by("date", "pk")
+        )
+
+    def get_range_items(self, start, end):
+        """
+        Returns unsaved shopping list items for the entries from start to end (inclusive), one per recipe with the
+        servings of all its entries summed up in one grouped query. So each recipe's ingredients are scaled once,
+        however often it is planned.
+        """
+        servings = dict(
+            self.entries.filter(date__range=(start, end))
+            .values("recipe")
+            .annotate(servings=Sum("servings"))
+            .order_by()
+            .values_list("recipe", "servings")
+        )
+        recipes = Recipe.objects.in_bulk(list(servings))
+        return [
+            ShoppingListRecipe(recipe=recipes[pk], servings=servings[pk])
+            for pk in sorted(servings, key=lambda pk: recipes[pk].title)
+        ]
+
+    def get_range_totals(self, start, end):
+        """
+        Returns the sorted list of (food name, unit, amount) of all ingredients needed from start to end,
+        including the related recipes, like the summary of a shopping list.
+        """
+        items = self.get_range_items(start, end)
+        if not items:
+            return []
+        shopping_list = ShoppingList(user=self.user)
+        totals = shopping_list.compute_totals(shopping_list.get_expanded_recipes(items))
+        names = dict(Food.objects.filter(pk__in={food_pk for food_pk, _ in totals}).values_list("pk", "name"))
+        return sorted((names[food_pk], unit, amount) for (food_pk, unit), (amount, _) in totals.items())
+
+
+class MealPlanEntry(models.Model):
+    meal_plan = models.ForeignKey(MealPlan, related_name="entries", on_delete=models.CASCADE)
+    date = models.DateField(verbose_name="Tag")
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, verbose_name="Rezept")
+    servings = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        validators=[MinValueValidator(Decimal("0.001"))],
+        verbose_name="Portionen",
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["meal_plan", "date"])]
+
+    def __str__(self):
+        return f"{self.date}: {self.recipe.title}"
 
 
 class Idea(models.Model):
@@ -232,10 +642,12 @@ def get_search_results(
     Filter list of recipes according to the search. Only the recipes accessible to the given users will be searched.
     Returns a list of recipes ordered by title.
 
-    search_term: String. Recipe.title, Recipe.instructions, Recipe.notes will be searched for this term
+    search_term: String. Recipe.title, Recipe.instructions, Recipe.notes will be searched for this term.
+                 Recipes with a similar title or containing a food with a similar name are found as well.
     categories: List of Category Objects. Only recipes of these categories will be returned. If empty all categories are searched.
     foods: List of Food Objects. Only recipes containing these foods as ingredients will be returned. If empty all foods are considered.
     excluded_foods: List of Food Objects. Only recipes NOT containing these foods as ingredients will be returned.
+                    Recipes whose (transitively) related recipes contain these foods are excluded as well.
     contains_all: If True, only recipes containing all Food Objects given in 'food' as ingredient will be returned.
                   If False, recipes containing any of the foods will be returned.
     """
@@ -243,14 +655,20 @@ def get_search_results(
     recipes = get_recipe_list(user)
 
     # if a search term is given: use watson to search the recipe titles, instructions and notes for the given term
+    # and add the recipes with a similar title or containing a similar food to tolerate typos and spelling variants
     if search_term:
         results = watson.search(search_term)
         pks = [r.object_id_int for r in results]
+        pks.extend(pk for pk, _ in get_recipe_index().search(search_term, limit=100))
+        food_pks = [pk for pk, _ in get_food_index().search(search_term, limit=20)]
+        if food_pks:
+            ingredients = Ingredient.objects.filter(food__in=food_pks)
+            pks.extend(ingredients.values_list("recipe", flat=True))
         recipes = recipes.filter(pk__in=pks)
 
     # if category objects are given: keep only recipes of these categories
     if categories:
-        recipes = recipes.filter(categories__in=categories)
+        recipes = recipes.filter(categories__in=categories).distinct()
 
     # if food objects are given: filter recipes according to contains_all
     if foods:
@@ -271,20 +689,216 @@ def get_search_results(
         ingredients = Ingredient.objects.filter(food__in=excluded_foods)
         recipe_pks = ingredients.values_list("recipe", flat=True)
         recipes = recipes.exclude(pk__in=recipe_pks)
-        recipes = recipes.exclude(related_recipes__pk__in=recipe_pks)
+        related_pks = RelatedRecipeClosure.objects.filter(descendant__in=recipe_pks)
+        recipes = recipes.exclude(pk__in=related_pks.values("ancestor"))
 
     return recipes.order_by("title")
 
 
+def get_search_facets(recipes):
+    """
+    Count the given search results per category and per food.
+    Returns two dicts mapping the pks of the categories and foods to the number of recipes, each computed in one
+    grouped query. Categories and foods without any recipe in the results are not contained.
+    """
+    result_pks = recipes.order_by().values("pk")
+    category_counts = (
+        Recipe.categories.through.objects.filter(recipe__in=result_pks)
+        .values_list("category")
+        .annotate(num_recipes=Count("recipe", distinct=True))
+        .order_by()
+    )
+    food_counts = (
+        Ingredient.objects.filter(recipe__in=result_pks)
+        .values_list("food")
+        .annotate(num_recipes=Count("recipe", distinct=True))
+        .order_by()
+    )
+    return dict(category_counts), dict(food_counts)
+
+
+def prefetch_recipe_cards(recipes):
+    """
+    Prefetch the primary images and the categories displayed on the recipe cards for all given recipes at once.
+    """
+    return recipes.prefetch_related(
+        Prefetch(
+            "image_of",
+            queryset=RecipeImage.objects.filter(is_primary=True),
+            to_attr="primary_images",
+        ),
+        Prefetch(
+            "categories",
+            queryset=Category.objects.order_by("title"),
+            to_attr="sorted_categories",
+        ),
+    )
+
+
+def get_related_recipe_edges():
+    """
+    Returns a dict mapping the pk of every recipe to the set of pks of its directly related recipes.
+    """
+    edges = collections.defaultdict(set)
+    links = Recipe.related_recipes.through.objects.values_list("from_recipe", "to_recipe")
+    for from_pk, to_pk in links:
+        edges[from_pk].add(to_pk)
+    return edges
+
+
+def get_reachable_recipes(pk, edges):
+    """
+    Returns the set of pks of all recipes reachable from the recipe with the given pk.
+    Recipes that were already visited are not followed again, so cycles in the links terminate.
+    """
+    reachable = set()
+    stack = [pk]
+    while stack:
+        for related in edges.get(stack.pop(), ()):
+            if related != pk and related not in reachable:
+                reachable.add(related)
+                stack.append(related)
+    return reachable
+
+
+def add_related_recipe_closure(from_pks, to_pks):
+    """
+    Extend the closure table after links from the recipes 'from_pks' to the recipes 'to_pks' were added.
+    Every recipe reaching a source recipe now reaches every recipe reachable from a target recipe.
+    Either 'from_pks' or 'to_pks' contains a single recipe, as the links are added via one recipe.
+    """
+    ancestors = set(from_pks)
+    ancestors.update(
+        RelatedRecipeClosure.objects.filter(descendant__in=from_pks).values_list("ancestor", flat=True)
+    )
+    descendants = set(to_pks)
+    descendants.update(
+        RelatedRecipeClosure.objects.filter(ancestor__in=to_pks).values_list("descendant", flat=True)
+    )
+    RelatedRecipeClosure.objects.bulk_create(
+        [
+            RelatedRecipeClosure(ancestor_id=ancestor, descendant_id=descendant)
+            for ancestor in ancestors
+            for descendant in descendants
+            if ancestor != descendant
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def update_related_recipe_closure(recipe_pks):
+    """
+    Recompute the closure rows of the given recipes and of all recipes they are reachable from.
+    Used after links were removed or recipes were deleted, where paths may vanish.
+    """
+    recipe_pks = set(recipe_pks)
+    recipe_pks.update(
+        RelatedRecipeClosure.objects.filter(descendant__in=recipe_pks).values_list("ancestor", flat=True)
+    )
+    recipe_pks = set(Recipe.objects.filter(pk__in=recipe_pks).values_list("pk", flat=True))
+    edges = get_related_recipe_edges()
+
+    RelatedRecipeClosure.objects.filter(ancestor__in=recipe_pks).delete()
+    RelatedRecipeClosure.objects.bulk_create(
+        [
+            RelatedRecipeClosure(ancestor_id=pk, descendant_id=related)
+            for pk in recipe_pks
+            for related in get_reachable_recipes(pk, edges)
+        ]
+    )
+
+
+def get_recipe_cache_version(pk):
+    """
+    Returns the current content version of the recipe with the given pk, used in the keys of its cached fragments.
+    The versions are stored with the recipes and incremented in the transactions changing them, so all processes
+    see the same versions and a version is never older than the data read together with it.
+    """
+    return Recipe.objects.filter(pk=pk).values_list("cache_version", flat=True).first()
+
+
+def get_recipe_list_version():
+    """
+    Returns the content version of all recipes, which changes whenever the version of any recipe changes.
+    """
+    return (
+        CacheGeneration.objects.filter(name=CONTENT_VERSION)
+        .values_list("generation", flat=True)
+        .first()
+        or 0
+    )
+
+
+@contextmanager
+def batched_recipe_cache_versions():
+    """
+    Collect the recipes whose versions are incremented in the block and increment them once at its end, e.g. when a
+    recipe is saved with its images, categories and ingredients. Has to be used within the transaction of the changes.
+    """
+    if getattr(_batched_versions, "recipe_pks", None) is not None:
+        # nested in another block, which increments the versions
+        yield
+        return
+    _batched_versions.recipe_pks = recipe_pks = set()
+    try:
+        yield
+    finally:
+        _batched_versions.recipe_pks = None
+    bump_recipe_cache_version(recipe_pks)
+
+
+def bump_recipe_cache_version(recipe_pks):
+    """
+    Invalidate the cached fragments and pages of the given recipes by incrementing their content versions and the
+    version of all recipes within the current transaction. Without recipes only the listings are invalidated.
+    """
+    batched = getattr(_batched_versions, "recipe_pks", None)
+    if batched is not None:
+        batched.update(recipe_pks)
+        return
+    recipe_pks = list(recipe_pks)
+    for start in range(0, len(recipe_pks), VERSION_CHUNK_SIZE):
+        Recipe.objects.filter(pk__in=recipe_pks[start : start + VERSION_CHUNK_SIZE]).update(
+            cache_version=F("cache_version") + 1
+        )
+    if not CacheGeneration.objects.filter(name=CONTENT_VERSION).update(generation=F("generation") + 1):
+        CacheGeneration.objects.bulk_create(
+            [CacheGeneration(name=CONTENT_VERSION, generation=1)], ignore_conflicts=True
+        )
+
+
 def get_ingredients_conversion_factor(recipe, new_servings):
     return new_servings / recipe.servings
 
 
+def get_ingredients_by_recipe(recipe_pks):
+    """
+    Returns a dict mapping each of the given recipe pks to the list of its ingredients (with their foods),
+    loaded with a single query.
+    """
+    ingredients = {pk: [] for pk in recipe_pks}
+    for ingredient in Ingredient.objects.filter(recipe__in=recipe_pks).select_related("food").order_by("pk"):
+        ingredients[ingredient.recipe_id].append(ingredient)
+    return ingredients
+
+
+def scale_ingredients(ingredients, factor):
+    """
+    Returns unsaved copies of the given ingredients with their amounts multiplied by factor.
+    """
+    scaled = []
+    for ing in ingredients:
+        ingredient = Ingredient(amount=ing.amount * factor, unit=ing.unit, food=ing.food, notes=ing.notes, recipe=None)
+        ingredient.set_canonical_amount()
+        scaled.append(ingredient)
+    return scaled
+
+
 def get_converted_ingredients(recipe, new_servings):
     """
     Convert the amounts of ingredients for the given recipe according to the new number of servings.
     """
-    ingredients = recipe.get_ingredients()
+    ingredients = recipe.get_ingredients().select_related("food")
     new_ingredients = []
     for ing in ingredients:
         conversion_factor = get_ingredients_conversion_factor(recipe, new_servings)
@@ -332,10 +946,88 @@ def get_or_create_shopping_list_for_user(user):
     shopping_list = ShoppingList.objects.filter(user=user)
 
     if len(shopping_list) == 0:
-        return ShoppingList.objects.create(user=user)
+        # the totals of the empty list are up to date
+        return ShoppingList.objects.create(user=user, totals_stale=False)
     else:
         return shopping_list[0]
 
 
+def get_suggestions(user, query, limit=8):
+    """
+    Returns the recipes accessible to the given user and the foods whose names are similar to the given query,
+    best matches first. Used for the typeahead of the search boxes and the ingredient names.
+    """
+    recipe_pks = [pk for pk, _ in get_recipe_index().search(query, limit=limit * 5)]
+    visible = filter_recipe_list(
+        user, Recipe.objects.filter(pk__in=recipe_pks), filter_empty=False
+    )
+    titles = dict(visible.values_list("pk", "title"))
+    recipes = [(pk, titles[pk]) for pk in recipe_pks if pk in titles]
+
+    food_index = get_food_index()
+    food_pks = [pk for pk, _ in food_index.search(query, limit=limit)]
+    names = food_index.get_names(food_pks)
+    foods = [(pk, names[pk]) for pk in food_pks]
+    return recipes[:limit], foods
+
+
+def get_or_create_foods(names):
+    """
+    Returns a dict mapping each of the given food names to the pk of its Food. All missing foods are created at once.
+    Names only differing in case, whitespace or umlaut spelling ("Möhre", "moehre ") refer to the same food.
+    """
+    index = get_food_index()
+    food_pks = {}
+    missing = {}
+    for name in names:
+        pk = index.get_exact(name)
+        if pk is not None:
+            food_pks[name] = pk
+        else:
+            missing.setdefault(normalize(name), []).append(name)
+
+    if missing:
+        new_names = {variants[0].strip(): variants for variants in missing.values()}
+        Food.objects.bulk_create(
+            [Food(name=name, normalized_name=normalize(name)) for name in new_names], ignore_conflicts=True
+        )
+        # bulk_create does not send post_save, so the food index and choices have to be dropped here
+        invalidate_trigram_index("food")
+        invalidate_choices("food")
+        generations.bump("food")
+        for name, pk in Food.objects.filter(name__in=new_names).values_list("name", "pk"):
+            food_pks.update((variant, pk) for variant in new_names[name])
+    return food_pks
+
+
+def get_pantry_matches(user, foods, limit=30):
+    """
+    Rank the recipes accessible to the given user by the fraction of their ingredients contained in the given foods.
+    Returns a list of (recipe, coverage, missing_foods) tuples, best coverage first.
+
+    foods: List of Food pks available in the pantry.
+    """
+    visible_pks = get_recipe_list(user).values_list("pk", flat=True)
+    ranking = get_recipe_food_matrix().rank(foods, visible_pks, limit=limit)
+
+    recipes = Recipe.objects.in_bulk([pk for pk, _, _ in ranking])
+    missing_foods = Food.objects.in_bulk(
+        [pk for _, _, missing in ranking for pk in missing]
+    )
+    return [
+        (
+            recipes[pk],
+            coverage,
+            sorted((missing_foods[f] for f in missing if f in missing_foods), key=str),
+        )
+        for pk, coverage, missing in ranking
+        if pk in recipes
+    ]
+
+
+def get_or_create_meal_plan_for_user(user):
+    return MealPlan.objects.get_or_create(user=user)[0]
+
+
 def get_idea_list(user):
     return Idea.objects.filter(user=user).order_by("title")
\ No newline at end of file
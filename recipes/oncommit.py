@@ -0,0 +1,49 @@
+"""
+Work collected during a transaction and done once after it is committed, e.g. incrementing each changed cache
+generation once instead of once per saved row.
+"""
+import threading
+import weakref
+
+from django.db import transaction
+
+_batches = threading.local()
+
+
+class Batch:
+    """
+    Items collected for a callback in the current transaction of the thread.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.items = set()
+        # the functions registered with on_commit are only referenced by the connection, which drops them when the
+        # transaction is rolled back, so the batch is no longer registered once they are gone
+        self.registered = weakref.WeakSet()
+
+    def run(self):
+        items, self.items = self.items, set()
+        if items:
+            self.callback(items)
+
+
+def collect_on_commit(callback, items):
+    """
+    Add the items to those collected for callback and call callback(items) once with all of them after the current
+    transaction is committed, or immediately outside of transactions. The items collected in a transaction that is
+    rolled back are discarded.
+    """
+    batches = getattr(_batches, "batches", None)
+    if batches is None:
+        batches = _batches.batches = {}
+    batch = batches.get(callback)
+    if batch is None or not batch.registered:
+        batch = batches[callback] = Batch(callback)
+    batch.items.update(items)
+
+    def run():
+        batch.run()
+
+    batch.registered.add(run)
+    transaction.on_commit(run)
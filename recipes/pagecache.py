@@ -0,0 +1,103 @@
+"""
+Full-page cache for anonymous visitors of the public recipe pages.
+
+Cached pages are keyed by path and query string together with a content version read from the database: the
+version of the recipe for its detail page and the version of all recipes for the listings (see
+recipes.models.bump_recipe_cache_version). Changing a recipe increments the versions in the same transaction,
+which makes all cached variants of these pages (pages, sort orders, servings) unreachable at once, in all worker
+processes and also when the version is read from a replica. Only get and set are used, so any cache backend works,
+including file-based and memcached ones.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import parse_http_date_safe
+
+# names of the urls whose pages are cached for anonymous visitors
+CACHED_URL_NAMES = {
+    "recipes-home",
+    "categories",
+    "category-recipes",
+    "recipe-detail",
+    "image-gallery",
+    "image-gallery-json",
+}
+DEFAULT_TIMEOUT = 10 * 60
+
+
+def get_page_cache_key(request, match):
+    """
+    Returns the key of the page of the request, which contains the content version of the recipe for its detail
+    page and the version of all recipes for the other pages.
+    """
+    from .models import get_recipe_cache_version, get_recipe_list_version
+
+    if match.url_name == "recipe-detail":
+        version = f"recipe-{match.kwargs['pk']}-{get_recipe_cache_version(match.kwargs['pk'])}"
+    else:
+        version = f"list-{get_recipe_list_version()}"
+    path = hashlib.md5(request.path.encode()).hexdigest()
+    query = hashlib.md5(request.META.get("QUERY_STRING", "").encode()).hexdigest()
+    return f"page-{version}-{path}-{request.method}-{query}"
+
+
+def get_cacheable_match(request):
+    """
+    Returns the resolved url of the request if its page is cached, None otherwise.
+    """
+    if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+        return None
+    # pending messages are shown once on the next page, which therefore must be rendered
+    if messages.get_messages(request):
+        return None
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    return match if match.url_name in CACHED_URL_NAMES else None
+
+
+class AnonymousPageCacheMiddleware(MiddlewareMixin):
+    """
+    Serve the public recipe pages to anonymous visitors from the cache.
+    Has to be placed after the AuthenticationMiddleware and the MessageMiddleware.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.timeout = getattr(settings, "PAGE_CACHE_TIMEOUT", DEFAULT_TIMEOUT)
+
+    def process_request(self, request):
+        match = get_cacheable_match(request)
+        if match is None:
+            return None
+
+        key = get_page_cache_key(request, match)
+        response = cache.get(key)
+        if response is None:
+            # the rendered page is stored by process_response
+            request._page_cache_key = key
+            return None
+        return get_conditional_response(
+            request,
+            etag=response.get("ETag"),
+            last_modified=parse_http_date_safe(response.get("Last-Modified", "")),
+            response=response,
+        )
+
+    def process_response(self, request, response):
+        key = getattr(request, "_page_cache_key", None)
+        # pages setting cookies (e.g. a CSRF token) must not be shared between visitors
+        if (
+            key is not None
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        ):
+            cache.set(key, response, self.timeout)
+        return response
@@ -0,0 +1,66 @@
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.utils.functional import cached_property
+
+
+class CappedCountPage(Page):
+    """
+    Page which knows whether there is a next page from loading one object more than it shows.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self) - 1 if len(self) else 0
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator that counts at most 'max_count' + 1 objects, so counting huge result sets stays cheap.
+    If there are more objects, the count is only an estimate and displayed as e.g. "1000+". The pages after the
+    estimate can still be reached, whether a page has a successor is found out by loading one object more.
+    """
+
+    max_count = 1000
+
+    @cached_property
+    def count(self):
+        return self.object_list[: self.max_count + 1].count()
+
+    @property
+    def count_is_estimate(self):
+        return self.count > self.max_count
+
+    @property
+    def display_count(self):
+        if self.count_is_estimate:
+            return f"{self.max_count}+"
+        return str(self.count)
+
+    @property
+    def page_range(self):
+        # includes the pages after the estimate known from the last loaded page
+        return range(1, max(self.num_pages, getattr(self, "last_known_page", 0)) + 1)
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # the pages after the estimate are only checked when they are loaded
+            if self.count_is_estimate and int(number) > 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage("Die Seite enthält keine Ergebnisse")
+        has_next = len(object_list) > self.per_page
+        self.last_known_page = number + 1 if has_next else number
+        return CappedCountPage(object_list[: self.per_page], number, self, has_next)
@@ -0,0 +1,81 @@
+"""
+Ranking of recipes by the share of their ingredients available in a pantry.
+
+The foods of all recipes are stored once per process as sparse recipe x food incidence matrix in CSR layout
+(one row of food columns per recipe), so ranking the whole catalog is a few vectorized NumPy operations.
+"""
+import numpy as np
+
+
+class RecipeFoodMatrix:
+    def __init__(self, pairs):
+        """
+        pairs: Iterable of distinct (recipe_pk, food_pk) tuples, ordered by recipe_pk.
+        """
+        recipe_pks = []
+        food_pks = []
+        for recipe_pk, food_pk in pairs:
+            recipe_pks.append(recipe_pk)
+            food_pks.append(food_pk)
+        recipe_pks = np.array(recipe_pks, dtype=np.int64)
+        food_pks = np.array(food_pks, dtype=np.int64)
+
+        # one row per recipe: the food columns of row i are columns[indptr[i]:indptr[i + 1]]
+        row_starts = np.flatnonzero(np.diff(recipe_pks, prepend=-1))
+        self.recipe_pks = recipe_pks[row_starts]
+        self.indptr = np.append(row_starts, len(recipe_pks))
+        self.sizes = np.diff(self.indptr)
+
+        self.food_pks, self.columns = np.unique(food_pks, return_inverse=True)
+
+    def __len__(self):
+        return len(self.recipe_pks)
+
+    def rank(self, pantry_food_pks, recipe_pks, limit=30):
+        """
+        Rank the recipes with the given pks by the fraction of their foods contained in the pantry.
+        Returns a list of (recipe_pk, coverage, missing_food_pks) tuples, best coverage first.
+        Recipes without any food of the pantry are omitted, ties are broken by the number of available foods.
+        """
+        if not len(self):
+            return []
+
+        in_pantry = np.isin(self.food_pks, list(pantry_food_pks))
+        available = np.add.reduceat(in_pantry[self.columns].astype(np.int64), self.indptr[:-1])
+        coverage = available / self.sizes
+
+        candidates = np.isin(self.recipe_pks, list(recipe_pks)) & (available > 0)
+        rows = np.flatnonzero(candidates)
+        rows = rows[np.lexsort((-available[rows], -coverage[rows]))][:limit]
+
+        results = []
+        for row in rows:
+            columns = self.columns[self.indptr[row] : self.indptr[row + 1]]
+            missing = self.food_pks[columns[~in_pantry[columns]]]
+            results.append((int(self.recipe_pks[row]), float(coverage[row]), missing.tolist()))
+        return results
+
+
+_matrix = None
+
+
+def get_recipe_food_matrix():
+    global _matrix
+    if _matrix is None:
+        from .models import Ingredient
+
+        pairs = (
+            Ingredient.objects.values_list("recipe", "food")
+            .distinct()
+            .order_by("recipe", "food")
+        )
+        _matrix = RecipeFoodMatrix(pairs)
+    return _matrix
+
+
+def invalidate():
+    """
+    Drop the matrix, it will be rebuilt on the next ranking.
+    """
+    global _matrix
+    _matrix = None
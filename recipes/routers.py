@@ -0,0 +1,114 @@
+"""
+Routing of the reads to replicas of the database.
+
+The replicas are the aliases of DATABASES listed in the REPLICA_DATABASES setting (["replica"] by default). Each
+request reads from one of them, chosen at random by the PrimaryStickinessMiddleware, so all queries of a page see
+the same replica. Queries reading outside of a transaction go to this replica and everything else goes to the
+primary ("default"). The replicas lag behind the primary, so a visitor who just changed something would not see
+the change on the next page. The PrimaryStickinessMiddleware therefore lets all reads of requests with unsafe
+methods (POST, ...) and of the requests of the same browser in the following PRIMARY_STICKY_SECONDS go to the
+primary as well.
+Cached pages and fragments are keyed on content versions stored with the data (see
+recipes.models.bump_recipe_cache_version), which a replica receives in the same transaction as the changes. A
+page read from a lagging replica is therefore cached under the old version and replaced as soon as the replica
+has caught up.
+
+Without replicas the router does nothing. See baking_softwaredev/settings_replica.py for a local setup with a
+second SQLite file.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+DEFAULT_REPLICA_DATABASES = ["replica"]
+DEFAULT_STICKY_SECONDS = 10
+STICKY_COOKIE_NAME = "primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+# set per request by the middleware, context variables instead of thread-locals, as the async views run in
+# other threads than the middleware (see recipes/asgi.py)
+_read_from_primary = ContextVar("read_from_primary", default=False)
+_replica = ContextVar("replica", default=None)
+
+
+def get_replicas():
+    """
+    Returns the aliases of the replicas.
+    """
+    aliases = getattr(settings, "REPLICA_DATABASES", DEFAULT_REPLICA_DATABASES)
+    return [alias for alias in aliases if alias in settings.DATABASES]
+
+
+def get_replica():
+    """
+    Returns the alias of the replica the current request reads from, outside of requests the first replica.
+    Returns None if there is no replica.
+    """
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    replica = _replica.get()
+    return replica if replica in replicas else replicas[0]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = get_replica()
+        if replica is None:
+            return None
+        # reads in a transaction of the primary have to see its uncommitted writes and locks
+        if _read_from_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        replicas = get_replicas()
+        databases = {DEFAULT_DB_ALIAS, *replicas}
+        if replicas and obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas get the schema from the primary
+        if db in get_replicas():
+            return False
+        return None
+
+
+class PrimaryStickinessMiddleware(MiddlewareMixin):
+    """
+    Choose the replica of the request and read from the primary during requests with unsafe methods and, with a
+    cookie set by them, during the following requests of the same browser until the replicas have caught up.
+    Has to be placed before the SessionMiddleware, e.g. so that a login is not lost by reading the session from
+    the replica.
+    """
+
+    def process_request(self, request):
+        try:
+            primary_until = float(request.COOKIES.get(STICKY_COOKIE_NAME, 0))
+        except ValueError:
+            primary_until = 0
+        _read_from_primary.set(request.method not in SAFE_METHODS or primary_until > time.time())
+        replicas = get_replicas()
+        _replica.set(random.choice(replicas) if replicas else None)
+
+    def process_response(self, request, response):
+        _read_from_primary.set(False)
+        _replica.set(None)
+        if request.method not in SAFE_METHODS and get_replicas():
+            seconds = getattr(settings, "PRIMARY_STICKY_SECONDS", DEFAULT_STICKY_SECONDS)
+            response.set_cookie(
+                STICKY_COOKIE_NAME,
+                str(time.time() + seconds),
+                max_age=seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
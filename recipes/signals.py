@@ -0,0 +1,298 @@
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import choices, fuzzy, generations, pantry, similarity, sqlite
+from .models import (
+    Category,
+    Food,
+    Ingredient,
+    Recipe,
+    RecipeImage,
+    RelatedRecipeClosure,
+    SimilarRecipe,
+    add_related_recipe_closure,
+    bump_recipe_cache_version,
+    mark_shopping_list_totals_stale,
+    update_related_recipe_closure,
+)
+from .similarity import schedule_similar_recipes_update, update_similar_recipes
+
+
+# sent with the argument 'recipe' after the ingredients of a recipe were changed with bulk queries,
+# which do not send post_save or post_delete for the single ingredients
+ingredients_changed = Signal()
+
+# sent with the argument 'recipe_pks' after recipes were created by the bulk import
+recipes_imported = Signal()
+
+GENERATIONS = {
+    Recipe: "recipe",
+    Ingredient: "ingredient",
+    Category: "category",
+    Food: "food",
+    RecipeImage: "recipe_image",
+}
+
+
+connection_created.connect(sqlite.configure_connection)
+
+# the similar recipes changed by a request are recomputed after its response was sent
+request_started.connect(similarity.defer_updates)
+request_finished.connect(similarity.run_deferred_updates)
+
+# the local caches depending on the data of each generation, dropped when another process changed it
+generations.on_change(["food"], lambda: fuzzy.invalidate("food"))
+generations.on_change(["food"], lambda: choices.invalidate("food"))
+generations.on_change(["category"], lambda: choices.invalidate("category"))
+generations.on_change(["recipe"], lambda: fuzzy.invalidate("recipe"))
+generations.on_change(["ingredient"], pantry.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+@receiver(post_save, sender=RecipeImage)
+@receiver(post_delete, sender=RecipeImage)
+def bump_generation(sender, **kwargs):
+    generations.bump(GENERATIONS[sender])
+
+
+@receiver(m2m_changed, sender=Recipe.categories.through)
+def bump_generation_on_category_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        generations.bump("category")
+
+
+@receiver(m2m_changed, sender=Recipe.related_recipes.through)
+def bump_generation_on_link(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        generations.bump("recipe")
+
+
+@receiver(ingredients_changed)
+def bump_generation_on_bulk_change(sender, recipe, **kwargs):
+    generations.bump("ingredient")
+
+
+@receiver(recipes_imported)
+def bump_generations_on_import(sender, recipe_pks, **kwargs):
+    generations.bump(*generations.GENERATION_NAMES)
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def invalidate_food_index(sender, instance, **kwargs):
+    fuzzy.invalidate("food")
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def invalidate_food_choices(sender, instance, **kwargs):
+    choices.invalidate("food")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_choices(sender, instance, **kwargs):
+    choices.invalidate("category")
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_index(sender, instance, **kwargs):
+    fuzzy.invalidate("recipe")
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_recipe_food_matrix(sender, **kwargs):
+    pantry.invalidate()
+
+
+@receiver(ingredients_changed)
+def invalidate_recipe_food_matrix_on_bulk_change(sender, recipe, **kwargs):
+    pantry.invalidate()
+
+
+@receiver(recipes_imported)
+def invalidate_caches_on_import(sender, recipe_pks, **kwargs):
+    fuzzy.invalidate("recipe")
+    pantry.invalidate()
+    bump_recipe_cache_version(recipe_pks)
+
+
+@receiver(recipes_imported)
+def update_similar_recipes_on_import(sender, recipe_pks, **kwargs):
+    if recipe_pks:
+        update_similar_recipes(recipe_pks)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def update_similar_recipes_on_ingredient_change(sender, instance, **kwargs):
+    schedule_similar_recipes_update(instance.recipe_id)
+
+
+@receiver(ingredients_changed)
+def update_similar_recipes_on_bulk_change(sender, recipe, **kwargs):
+    schedule_similar_recipes_update(recipe.pk)
+
+
+@receiver(m2m_changed, sender=Recipe.categories.through)
+def update_similar_recipes_on_category_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            schedule_similar_recipes_update(instance.pk)
+    elif action in ("post_add", "post_remove"):
+        for pk in pk_set:
+            schedule_similar_recipes_update(pk)
+    elif action == "pre_clear":
+        for pk in instance.recipe_set.values_list("pk", flat=True):
+            schedule_similar_recipes_update(pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def update_similar_recipes_on_delete(sender, instance, **kwargs):
+    # the recipes listing the deleted recipe as similar lose a neighbour
+    for pk in SimilarRecipe.objects.filter(similar=instance).values_list("recipe", flat=True):
+        schedule_similar_recipes_update(pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_version(sender, instance, created=False, **kwargs):
+    # nothing can be cached for a new recipe yet, only the listings change
+    bump_recipe_cache_version([] if created else [instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def bump_linking_recipe_versions(sender, instance, created=False, **kwargs):
+    # the detail pages of the recipes linking to the recipe or listing it as similar show its title
+    if not created:
+        bump_recipe_cache_version(
+            list(instance.recipe_set.values_list("pk", flat=True))
+            + list(SimilarRecipe.objects.filter(similar=instance).values_list("recipe", flat=True))
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.related_recipes.through)
+def bump_recipe_version_on_link(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_recipe_cache_version([instance.pk, *(pk_set or [])])
+    elif action == "pre_clear" and reverse:
+        bump_recipe_cache_version(instance.recipe_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=RecipeImage)
+@receiver(post_delete, sender=RecipeImage)
+def bump_recipe_version_on_part_change(sender, instance, **kwargs):
+    if instance.recipe_id is not None:
+        bump_recipe_cache_version([instance.recipe_id])
+
+
+@receiver(ingredients_changed)
+def bump_recipe_version_on_bulk_change(sender, recipe, **kwargs):
+    bump_recipe_cache_version([recipe.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.categories.through)
+def bump_recipe_version_on_category_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            bump_recipe_cache_version([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        bump_recipe_cache_version(pk_set)
+    elif action == "pre_clear":
+        bump_recipe_cache_version(instance.recipe_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Category)
+def bump_recipe_version_on_category_save(sender, instance, created, **kwargs):
+    # a new category is only shown in the list of the categories
+    bump_recipe_cache_version([] if created else instance.recipe_set.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_recipes(sender, instance, **kwargs):
+    # the links to the recipes are deleted without m2m_changed, so the recipes have to be collected before
+    instance._recipe_pks = list(instance.recipe_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def bump_recipe_version_on_category_delete(sender, instance, **kwargs):
+    bump_recipe_cache_version(getattr(instance, "_recipe_pks", []))
+
+
+@receiver(post_save, sender=Food)
+def bump_recipe_version_on_food_rename(sender, instance, created, **kwargs):
+    if not created:
+        bump_recipe_cache_version(
+            Ingredient.objects.filter(food=instance).values_list("recipe", flat=True).distinct()
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.related_recipes.through)
+def update_related_recipe_closure_on_link(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Added links can only create new paths, so the closure is extended directly.
+    Removed links may break paths, so the closure of the recipe and of all recipes reaching it is recomputed.
+    """
+    if action == "post_add" and pk_set:
+        if reverse:
+            add_related_recipe_closure(pk_set, [instance.pk])
+        else:
+            add_related_recipe_closure([instance.pk], pk_set)
+    elif action in ("post_remove", "post_clear"):
+        update_related_recipe_closure([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_related_recipe_ancestors(sender, instance, **kwargs):
+    # the closure rows of the recipe are deleted together with it, so its ancestors have to be collected before
+    instance._closure_ancestors = list(
+        RelatedRecipeClosure.objects.filter(descendant=instance).values_list("ancestor", flat=True)
+    )
+    # the lists including the recipe as a related recipe are no longer found once the closure rows are gone
+    mark_shopping_list_totals_stale(instance._closure_ancestors + [instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def update_related_recipe_closure_on_delete(sender, instance, **kwargs):
+    update_related_recipe_closure(getattr(instance, "_closure_ancestors", []))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def mark_shopping_list_totals_stale_on_ingredient_change(sender, instance, **kwargs):
+    mark_shopping_list_totals_stale([instance.recipe_id])
+
+
+@receiver(ingredients_changed)
+def mark_shopping_list_totals_stale_on_bulk_change(sender, recipe, **kwargs):
+    mark_shopping_list_totals_stale([recipe.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def mark_shopping_list_totals_stale_on_recipe_change(sender, instance, created, **kwargs):
+    # the servings scale the amounts and the visibility decides whether a related recipe is included
+    if not created:
+        mark_shopping_list_totals_stale([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.related_recipes.through)
+def mark_shopping_list_totals_stale_on_link(sender, instance, action, reverse, pk_set, **kwargs):
+    # registered after the closure update, so the lists reaching the recipes through new links are found
+    if action in ("post_add", "post_remove", "post_clear"):
+        mark_shopping_list_totals_stale([instance.pk, *(pk_set or [])])
+    elif action == "pre_clear" and reverse:
+        mark_shopping_list_totals_stale(instance.recipe_set.values_list("pk", flat=True))
@@ -0,0 +1,240 @@
+"""
+Similar recipes based on their ingredients and categories.
+
+Every recipe is described by a TF-IDF weighted vector of its foods and (weighted lower) its categories.
+The vectors are sparse: the similarities of a recipe are summed up from the recipes sharing each of its features
+(an inverted index of the weights with NumPy arrays), so only recipes with a common food or category are ever
+touched. The best neighbours of every recipe are stored in the SimilarRecipe table, so displaying them is a single
+indexed lookup. When single recipes change, only the vectors of their candidate neighbours are loaded.
+"""
+from contextvars import ContextVar
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .oncommit import collect_on_commit
+
+# number of similar recipes stored per recipe
+NUM_SIMILAR_RECIPES = 6
+# weight of a shared category relative to a shared food
+CATEGORY_WEIGHT = 0.5
+
+# recipes whose similar recipes are updated after the response of the current request was sent
+_deferred_recipe_pks = ContextVar("deferred_recipe_pks", default=None)
+
+
+def get_document_frequency(pairs):
+    document_frequency = {}
+    for _, feature in pairs:
+        document_frequency[feature] = document_frequency.get(feature, 0) + 1
+    return document_frequency
+
+
+class RecipeVectors:
+    """
+    Sparse L2-normalized TF-IDF vectors of recipes with at least one food or category.
+    Only features shared by at least two recipes are stored, the others cannot contribute to a similarity but are
+    included in the vector norms.
+    """
+
+    def __init__(self, food_pairs, category_pairs, num_recipes=None, document_frequency=None):
+        """
+        food_pairs, category_pairs: Iterables of distinct (recipe_pk, food_pk) and (recipe_pk, category_pk) tuples.
+        num_recipes, document_frequency: Number of all recipes with a feature and the number of recipes per
+            ("food", pk) or ("category", pk) feature, if the pairs are not those of all recipes.
+        """
+        pairs = [(recipe, ("food", food)) for recipe, food in food_pairs]
+        pairs.extend((recipe, ("category", category)) for recipe, category in category_pairs)
+
+        self.recipe_pks = sorted({recipe for recipe, _ in pairs})
+        self.rows = {pk: row for row, pk in enumerate(self.recipe_pks)}
+        if document_frequency is None:
+            document_frequency = get_document_frequency(pairs)
+        if num_recipes is None:
+            num_recipes = len(self.recipe_pks)
+
+        columns = {}
+        squared_norms = np.zeros(len(self.recipe_pks), dtype=np.float64)
+        rows, cols, weights = [], [], []
+        for recipe, feature in pairs:
+            frequency = document_frequency[feature]
+            weight = np.log((1 + num_recipes) / (1 + frequency)) + 1
+            if feature[0] == "category":
+                weight *= CATEGORY_WEIGHT
+            squared_norms[self.rows[recipe]] += weight**2
+            if frequency > 1:
+                rows.append(self.rows[recipe])
+                cols.append(columns.setdefault(feature, len(columns)))
+                weights.append(weight)
+
+        norms = np.sqrt(squared_norms)
+        norms[norms == 0] = 1
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        weights = np.array(weights, dtype=np.float64) / norms[rows]
+
+        # the features of each recipe (by row) and the recipes of each feature (by column)
+        by_row = np.argsort(rows, kind="stable")
+        self.row_pointers = np.searchsorted(rows[by_row], np.arange(len(self.recipe_pks) + 1))
+        self.row_columns, self.row_weights = cols[by_row], weights[by_row]
+        by_column = np.argsort(cols, kind="stable")
+        self.column_pointers = np.searchsorted(cols[by_column], np.arange(len(columns) + 1))
+        self.column_rows, self.column_weights = rows[by_column], weights[by_column]
+
+    def get_scores(self, row):
+        """
+        Returns the rows of the recipes sharing a feature with the recipe in the given row and their similarities.
+        """
+        start, end = self.row_pointers[row], self.row_pointers[row + 1]
+        postings = [
+            (self.column_pointers[col], self.column_pointers[col + 1], weight)
+            for col, weight in zip(self.row_columns[start:end], self.row_weights[start:end])
+        ]
+        if not postings:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows = np.concatenate([self.column_rows[start:end] for start, end, _ in postings])
+        weights = np.concatenate([self.column_weights[start:end] * weight for start, end, weight in postings])
+        rows, positions = np.unique(rows, return_inverse=True)
+        return rows, np.bincount(positions, weights)
+
+    def nearest_neighbours(self, recipe_pks, k=NUM_SIMILAR_RECIPES):
+        """
+        Yields (recipe_pk, [(similar_pk, score), ...]) with the k most similar recipes for each of the given recipes
+        that has a vector. Recipes without any shared feature are not returned as neighbours.
+        """
+        for pk in recipe_pks:
+            if pk not in self.rows:
+                continue
+            rows, scores = self.get_scores(self.rows[pk])
+            scores[rows == self.rows[pk]] = 0
+            if len(rows) > k:
+                best = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[best], scores[best]
+            neighbours = sorted(
+                ((float(score), self.recipe_pks[row]) for row, score in zip(rows, scores) if score > 0),
+                reverse=True,
+            )
+            yield pk, [(similar, score) for score, similar in neighbours]
+
+
+def get_recipe_vectors(recipe_pks=None):
+    """
+    Returns the RecipeVectors of all recipes or, if recipe_pks are given, of these recipes and all recipes sharing a
+    food or category with them, which are the only candidates for their neighbours.
+    """
+    from .models import Ingredient, Recipe
+
+    Categories = Recipe.categories.through
+    food_pairs = Ingredient.objects.values_list("recipe", "food").distinct().order_by()
+    category_pairs = Categories.objects.values_list("recipe", "category")
+    if recipe_pks is None:
+        return RecipeVectors(food_pairs, category_pairs)
+
+    recipe_pks = list(recipe_pks)
+    candidates = Q(
+        recipe__in=Ingredient.objects.filter(
+            food__in=Ingredient.objects.filter(recipe__in=recipe_pks).values("food")
+        ).values("recipe")
+    ) | Q(
+        recipe__in=Categories.objects.filter(
+            category__in=Categories.objects.filter(recipe__in=recipe_pks).values("category")
+        ).values("recipe")
+    )
+    food_pairs = list(food_pairs.filter(candidates))
+    category_pairs = list(category_pairs.filter(candidates))
+
+    # the weights of the features depend on all recipes, not only on the candidates
+    document_frequency = {}
+    foods = {food for _, food in food_pairs}
+    for food, frequency in (
+        Ingredient.objects.filter(food__in=foods)
+        .values_list("food")
+        .annotate(frequency=Count("recipe", distinct=True))
+        .order_by()
+    ):
+        document_frequency["food", food] = frequency
+    categories = {category for _, category in category_pairs}
+    for category, frequency in (
+        Categories.objects.filter(category__in=categories)
+        .values_list("category")
+        .annotate(frequency=Count("recipe"))
+        .order_by()
+    ):
+        document_frequency["category", category] = frequency
+    num_recipes = (
+        Ingredient.objects.values("recipe").union(Categories.objects.values("recipe")).count()
+    )
+    return RecipeVectors(food_pairs, category_pairs, num_recipes, document_frequency)
+
+
+def update_similar_recipes(recipe_pks=None, k=NUM_SIMILAR_RECIPES):
+    """
+    Recompute and store the similar recipes of the given recipes (of all recipes if None).
+    When single recipes changed, the recipes currently listing them as similar and their new neighbours are
+    recomputed as well, as the changed recipe may enter or leave their lists.
+    Returns the number of recomputed recipes.
+    """
+    from .models import Recipe, SimilarRecipe, bump_recipe_cache_version
+
+    if recipe_pks is None:
+        affected = set(Recipe.objects.values_list("pk", flat=True))
+        neighbours = dict(get_recipe_vectors().nearest_neighbours(affected, k))
+    else:
+        affected = set(recipe_pks)
+        affected.update(
+            SimilarRecipe.objects.filter(similar__in=affected).values_list("recipe", flat=True)
+        )
+        neighbours = dict(get_recipe_vectors(affected).nearest_neighbours(affected, k))
+        # the changed recipes may now be among the best neighbours of their own neighbours
+        followers = {pk for pk in recipe_pks if pk in neighbours}
+        new_rows = {similar for pk in followers for similar, _ in neighbours[pk]} - affected
+        if new_rows:
+            neighbours.update(get_recipe_vectors(new_rows).nearest_neighbours(new_rows, k))
+        affected |= new_rows
+
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe__in=affected).delete()
+        SimilarRecipe.objects.bulk_create(
+            [
+                SimilarRecipe(recipe_id=pk, similar_id=similar, score=score)
+                for pk, similar_recipes in neighbours.items()
+                for similar, score in similar_recipes
+            ]
+        )
+    bump_recipe_cache_version(affected)
+    return len(affected)
+
+
+def _update_similar_recipes(recipe_pks):
+    deferred = _deferred_recipe_pks.get()
+    if deferred is not None:
+        deferred.update(recipe_pks)
+    else:
+        update_similar_recipes(recipe_pks)
+
+
+def schedule_similar_recipes_update(recipe_pk):
+    """
+    Recompute the similar recipes of the given recipe once the current transaction is committed, during a request
+    only after its response was sent. All changes of one transaction (e.g. all ingredients of a recipe form) are
+    combined into a single update.
+    """
+    collect_on_commit(_update_similar_recipes, [recipe_pk])
+
+
+def defer_updates(**kwargs):
+    """
+    Receiver of request_started: the updates of the request are done by run_deferred_updates.
+    """
+    _deferred_recipe_pks.set(set())
+
+
+def run_deferred_updates(**kwargs):
+    """
+    Receiver of request_finished, which is sent after the response was sent to the client.
+    """
+    recipe_pks = _deferred_recipe_pks.get()
+    _deferred_recipe_pks.set(None)
+    if recipe_pks:
+        update_similar_recipes(recipe_pks)
@@ -0,0 +1,35 @@
+"""
+Tuning of the SQLite connections for several worker processes sharing one database file.
+
+WAL lets readers proceed while a writer commits, synchronous=NORMAL is safe with WAL and avoids an fsync per
+commit, and busy_timeout makes a writer wait for the write lock instead of failing with "database is locked".
+The pragmas are applied to every new connection (see configure_connection) and can be overridden with the
+SQLITE_PRAGMAS setting.
+"""
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    # negative values are KiB, i.e. 64 MB page cache per connection
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    # milliseconds
+    "busy_timeout": 20000,
+}
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    Receiver of connection_created applying the pragmas to new SQLite connections.
+    """
+    from django.conf import settings
+
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, getattr(settings, "SQLITE_PRAGMAS", DEFAULT_PRAGMAS))
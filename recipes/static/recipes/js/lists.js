@@ -0,0 +1,150 @@
+// Changing the shopping list and the ideas list without reloading the page.
+// The views answer with JSON for ?format=json, containing only the removed entry and the changed totals.
+// Changes made on other devices are pushed as server-sent events with the same deltas (see recipes/live.py).
+// Without this script (or if a request fails) the links and forms reload the page as before.
+function jsonUrl(url) {
+    const jsonUrl = new URL(url, window.location)
+    jsonUrl.searchParams.set('format', 'json')
+    return jsonUrl.toString()
+}
+
+function showMessage(text) {
+    const alert = document.createElement('div')
+    alert.className = 'alert alert-info alert-dismissible'
+    alert.setAttribute('role', 'alert')
+    alert.innerHTML = '<button type="button" class="close" data-dismiss="alert" aria-label="Close">'
+        + '<span aria-hidden="true">&times;</span></button>'
+    alert.appendChild(document.createTextNode(text))
+    const main = document.querySelector('main')
+    main.insertBefore(alert, main.firstChild)
+}
+
+function setChecked(item, checked) {
+    item.classList.toggle('text-muted', checked)
+    item.querySelector('form').elements.checked.value = checked ? '0' : '1'
+    item.querySelector('i').className = checked ? 'far fa-check-square' : 'far fa-square'
+    item.querySelector('form').nextElementSibling.classList.toggle('text-strike', checked)
+}
+
+function totalItem(total) {
+    const template = document.getElementById('shopping-list-total-template')
+    const item = template.content.querySelector('li').cloneNode(true)
+    item.dataset.food = total.food
+    item.dataset.unit = total.unit
+    const form = item.querySelector('form')
+    form.action = form.action.replace(/\/0\/check$/, `/${total.id}/check`)
+    item.querySelector('.food').textContent = total.food
+    item.querySelector('.amount').textContent = total.amount
+    item.querySelector('.unit').textContent = total.unit
+    setChecked(item, total.checked)
+    return item
+}
+
+function findTotal(list, total) {
+    return Array.from(list.children).find(
+        (item) => item.dataset.food === total.food && item.dataset.unit === total.unit
+    )
+}
+
+function updateTotals(data) {
+    const list = document.getElementById('shopping-list-totals')
+    if (data.replace) {
+        list.innerHTML = ''
+    }
+    for (const total of data.totals) {
+        const item = findTotal(list, total)
+        if (total.amount === null) {
+            if (item) {
+                item.remove()
+            }
+        } else if (item) {
+            item.querySelector('.amount').textContent = total.amount
+        } else {
+            // keep the list sorted by food and unit
+            const next = Array.from(list.children).find(
+                (other) => other.dataset.food > total.food
+                    || (other.dataset.food === total.food && other.dataset.unit > total.unit)
+            )
+            list.insertBefore(totalItem(total), next || null)
+        }
+    }
+}
+
+function removeItem(data) {
+    document.querySelectorAll(`[data-item="${data.removed}"]`).forEach((element) => element.remove())
+    updateTotals(data)
+}
+
+function clearShoppingList() {
+    document.querySelectorAll('[data-item]').forEach((element) => element.remove())
+    document.getElementById('shopping-list-totals').innerHTML = ''
+}
+
+$(document).on('submit', '.shopping-list-remove', (event) => {
+    const form = event.target
+    event.preventDefault()
+    $.post(jsonUrl(form.action), $(form).serialize(), (data) => {
+        removeItem(data)
+        showMessage(data.message)
+    }).fail(() => form.submit())
+})
+
+$(document).on('submit', '.shopping-list-check', (event) => {
+    const form = event.target
+    event.preventDefault()
+    $.post(jsonUrl(form.action), $(form).serialize(), (data) => {
+        setChecked(form.parentElement, data.checked)
+    }).fail(() => form.submit())
+})
+
+$(document).on('click', '#delete-shopping-list', (event) => {
+    const link = event.currentTarget
+    event.preventDefault()
+    $.getJSON(jsonUrl(link.href), (data) => {
+        clearShoppingList()
+        showMessage(data.message)
+    }).fail(() => { window.location = link.href })
+})
+
+$(document).on('click', '.idea-delete', (event) => {
+    const link = event.currentTarget
+    event.preventDefault()
+    $.getJSON(jsonUrl(link.href), (data) => {
+        document.querySelectorAll(`[data-idea="${data.removed}"]`).forEach((element) => element.remove())
+    }).fail(() => { window.location = link.href })
+})
+
+$(() => {
+    const list = document.getElementById('shopping-list-totals')
+    if (!list || !list.dataset.events || !window.EventSource) {
+        return
+    }
+    // the events endpoint needs an ASGI server, with WSGI the connection fails once and is not retried
+    const events = new EventSource(list.dataset.events)
+    events.addEventListener('add', (event) => {
+        const data = JSON.parse(event.data)
+        if (!document.querySelector(`[data-item="${data.item}"]`)) {
+            const item = document.createElement('li')
+            item.dataset.item = data.item
+            const link = document.createElement('a')
+            link.className = 'recipe-detail-link'
+            link.href = data.recipe.url
+            link.textContent = data.recipe.title
+            item.appendChild(link)
+            document.getElementById('shopping-list-recipes').appendChild(item)
+        }
+        updateTotals(data)
+    })
+    events.addEventListener('remove', (event) => removeItem(JSON.parse(event.data)))
+    events.addEventListener('check', (event) => {
+        const data = JSON.parse(event.data)
+        const form = list.querySelector(`form[action$="/${data.id}/check"]`)
+        if (form) {
+            setChecked(form.parentElement, data.checked)
+        }
+    })
+    events.addEventListener('delete', clearShoppingList)
+    events.addEventListener('refresh', () => {
+        $.getJSON(jsonUrl(window.location), updateTotals)
+    })
+})
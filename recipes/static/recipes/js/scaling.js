@@ -0,0 +1,80 @@
+// Scaling of the ingredient amounts to other numbers of servings without reloading the page.
+// The amounts are embedded as fractions [numerator, denominator] and printed with the rules of prettyprint_amount.
+// Without this script (or for invalid input) the servings form is submitted and the server converts the amounts.
+function gcd(a, b) {
+    while (b) {
+        [a, b] = [b, a % b]
+    }
+    return Math.abs(a)
+}
+
+function fraction(numerator, denominator) {
+    const divisor = gcd(numerator, denominator) || 1
+    return [numerator / divisor, denominator / divisor]
+}
+
+function multiply([n1, d1], [n2, d2]) {
+    // cancel crosswise first to keep the numbers small
+    const a = gcd(n1, d2) || 1
+    const b = gcd(n2, d1) || 1
+    return fraction((n1 / a) * (n2 / b), (d1 / b) * (d2 / a))
+}
+
+function parseFraction(text) {
+    const match = /^\s*(\d*)(?:[.,](\d+))?\s*$/.exec(text)
+    if (!match || !(match[1] || match[2])) {
+        return null
+    }
+    const decimals = match[2] || ''
+    return fraction(Number(match[1] + decimals), 10 ** decimals.length)
+}
+
+function prettyprintAmount([numerator, denominator]) {
+    if (denominator === 1) {
+        return String(numerator)
+    }
+    if (numerator < denominator && denominator <= 10) {
+        return `${numerator}/${denominator}`
+    }
+    return String(Math.round((numerator / denominator) * 1000) / 1000)
+}
+
+function prettyprintIngredient(ing, amount) {
+    const notes = ing.notes ? `(${ing.notes})` : ''
+    return `${prettyprintAmount(amount)} ${ing.unit} ${ing.food} ${notes}`
+}
+
+$(() => {
+    const payload = document.getElementById('ingredient-data')
+    const form = document.getElementById('servings-form')
+    if (!payload || !form) {
+        return
+    }
+    const data = JSON.parse(payload.textContent)
+    if (!data.servings || !data.servings[0]) {
+        return
+    }
+
+    $(form).on('submit', (event) => {
+        const servings = parseFraction(form.elements.number_servings.value)
+        if (!servings || !servings[0]) {
+            return
+        }
+        event.preventDefault()
+
+        const factor = multiply(servings, [data.servings[1], data.servings[0]])
+        const list = document.getElementById('ingredient-list')
+        list.innerHTML = ''
+        for (const ing of data.ingredients) {
+            const item = document.createElement('li')
+            item.textContent = prettyprintIngredient(ing, multiply(ing.amount, factor))
+            list.appendChild(item)
+        }
+
+        const value = form.elements.number_servings.value.trim()
+        $('#numServings').val(value)
+        const url = new URL(window.location)
+        url.searchParams.set('number_servings', value)
+        history.replaceState(null, '', url)
+    })
+})
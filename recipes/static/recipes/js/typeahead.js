@@ -0,0 +1,38 @@
+// Typeahead for the search boxes and the ingredient names.
+// The suggestions are computed on the server with typo-tolerant matching and shown as datalist of the input.
+const typeaheadUrl = document.currentScript.dataset.url
+
+function typeaheadList(kind) {
+    let list = document.getElementById(`typeahead-${kind}`)
+    if (!list) {
+        list = document.createElement('datalist')
+        list.id = `typeahead-${kind}`
+        document.body.appendChild(list)
+    }
+    return list
+}
+
+let typeaheadTimeout = null
+$(document).on('input', '.typeahead-search, .typeahead-food', (event) => {
+    const input = event.target
+    const kind = input.classList.contains('typeahead-food') ? 'food' : 'search'
+    input.setAttribute('list', `typeahead-${kind}`)
+    clearTimeout(typeaheadTimeout)
+    if (input.value.trim().length < 2) {
+        return
+    }
+    typeaheadTimeout = setTimeout(() => {
+        $.getJSON(typeaheadUrl, { q: input.value }, (data) => {
+            const names = kind === 'food'
+                ? data.foods.map((food) => food.name)
+                : data.recipes.map((recipe) => recipe.title).concat(data.foods.map((food) => food.name))
+            const list = typeaheadList(kind)
+            list.innerHTML = ''
+            for (const name of names) {
+                const option = document.createElement('option')
+                option.value = name
+                list.appendChild(option)
+            }
+        })
+    }, 150)
+})
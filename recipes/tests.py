@@ -1,11 +1,88 @@
+import asyncio
+import io
+import json
+import os
+import re
+import tempfile
+import time
 import unittest
+import zipfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-from django.contrib.auth.models import User
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.test import Client, TestCase
+from django.core.paginator import EmptyPage
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient,
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 
-from .forms import IngredientForm, IngredientFormSet
-from .models import Category, Food, Ingredient, Recipe
+from . import fuzzy, generations, live, routers, similarity, views
+from .asgi import StaticFilesMiddleware, iterate_in_sync_thread
+from .exporter import get_recipe_records
+from .forms import IngredientForm, IngredientFormSet, RecipeForm
+from .importer import RecipeArchive, RecipeImporter
+from .models import (
+    CacheGeneration,
+    Category,
+    Food,
+    Ingredient,
+    LiveEvent,
+    MealPlan,
+    MealPlanEntry,
+    Recipe,
+    RecipeImage,
+    ShoppingListRecipe,
+    SimilarRecipe,
+    bump_recipe_cache_version,
+    get_or_create_foods,
+    get_or_create_shopping_list_for_user,
+    get_pantry_matches,
+    get_suggestions,
+)
+from .paginator import CappedCountPaginator
+from .similarity import get_recipe_vectors, update_similar_recipes
+from .views import prettyprint_amount
+
+
+def create_recipe(title, ingredients, author=None, servings=1, public=False):
+    """
+    Create a recipe with the given ingredients: foods, which are added once each, or (amount, unit, food name)
+    tuples, whose foods are created if they do not exist yet.
+    """
+    recipe = Recipe.objects.create(
+        title=title,
+        author=author,
+        public=public,
+        introduction="Intro",
+        directions="Backen",
+        servings=servings,
+    )
+    for ingredient in ingredients:
+        if isinstance(ingredient, Food):
+            Ingredient.objects.create(amount=1, food=ingredient, recipe=recipe)
+        else:
+            amount, unit, food = ingredient
+            Ingredient.objects.create(
+                amount=amount,
+                unit=unit,
+                food=Food.objects.get_or_create(name=food)[0],
+                recipe=recipe,
+            )
+    return recipe
 
 
 class TestRecipeModel(TestCase):
@@ -62,6 +139,1076 @@ class TestRecipeModel(TestCase):
             other_user_private_res.check_view_permissions(auth_user)
 
 
+class TestFuzzyMatching(TestCase):
+    def test_normalize_folds_umlauts_and_whitespace(self):
+        self.assertEqual(fuzzy.normalize(" Grieß  Möhre "), "griess moehre")
+        self.assertEqual(fuzzy.normalize("Crème"), "creme")
+
+    def test_search_tolerates_typos_and_variants(self):
+        index = fuzzy.TrigramIndex(
+            [(1, "Mehl"), (2, "Weizenmehl"), (3, "Zucker"), (4, "Schokoladenkuchen")]
+        )
+        self.assertEqual(index.search("Mehl")[0][0], 1)
+        self.assertIn(2, [pk for pk, _ in index.search("mehl ")])
+        self.assertEqual(index.search("Schokoladenkuchn")[0][0], 4)
+        self.assertEqual(index.search("Salz"), [])
+        self.assertEqual(index.get_exact(" mehl"), 1)
+
+    def test_ingredient_form_reuses_food_variants(self):
+        food = Food.objects.create(name="Möhre")
+        recipe = Recipe.objects.create(title="Karottenkuchen")
+        form = IngredientForm(
+            {"amount": "2", "unit": "", "food_name": "moehre ", "notes": ""},
+            instance=Ingredient(recipe=recipe),
+        )
+        self.assertTrue(form.is_valid())
+        ingredient = form.save(commit=True)
+        self.assertEqual(ingredient.food, food)
+        self.assertEqual(Food.objects.count(), 1)
+
+    @override_settings(FUZZY_SEARCH_BACKEND="database")
+    def test_database_index_finds_food_variants(self):
+        carrot = Food.objects.create(name="Möhre")
+        foods = get_or_create_foods(["Moehre", "möhre ", "Zucker"])
+        self.assertEqual(foods["Moehre"], carrot.pk)
+        self.assertEqual(foods["möhre "], carrot.pk)
+        self.assertEqual(Food.objects.count(), 2)
+        self.assertEqual(Food.objects.get(pk=foods["Zucker"]).normalized_name, "zucker")
+        self.assertEqual(fuzzy.get_food_index().get_names([carrot.pk]), {carrot.pk: "Möhre"})
+
+
+class TestRelatedRecipeClosure(TestCase):
+    def setUp(self):
+        self.cake = Recipe.objects.create(title="Torte")
+        self.frosting = Recipe.objects.create(title="Glasur")
+        self.syrup = Recipe.objects.create(title="Sirup")
+
+    def related_titles(self, recipe):
+        return [rec.title for rec in recipe.get_all_related_recipes()]
+
+    def test_closure_follows_multiple_hops(self):
+        self.cake.related_recipes.add(self.frosting)
+        self.frosting.related_recipes.add(self.syrup)
+        self.assertEqual(self.related_titles(self.cake), ["Glasur", "Sirup"])
+        self.assertEqual(self.related_titles(self.frosting), ["Sirup"])
+
+    def test_closure_terminates_on_cycles(self):
+        self.cake.related_recipes.add(self.frosting)
+        self.frosting.related_recipes.add(self.syrup)
+        self.syrup.related_recipes.add(self.cake)
+        self.assertEqual(self.related_titles(self.cake), ["Glasur", "Sirup"])
+        self.assertEqual(self.related_titles(self.syrup), ["Glasur", "Torte"])
+
+    def test_closure_is_updated_on_removal_and_deletion(self):
+        self.cake.related_recipes.add(self.frosting)
+        self.frosting.related_recipes.add(self.syrup)
+        self.frosting.related_recipes.remove(self.syrup)
+        self.assertEqual(self.related_titles(self.cake), ["Glasur"])
+
+        self.frosting.related_recipes.add(self.syrup)
+        self.frosting.delete()
+        self.assertEqual(self.related_titles(self.cake), [])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "needs PostgreSQL with pg_trgm")
+@override_settings(FUZZY_SEARCH_BACKEND="database")
+class TestDatabaseTrigramIndex(TestCase):
+    def test_search_uses_pg_trgm(self):
+        flour = Food.objects.create(name="Weizenmehl")
+        Food.objects.create(name="Zucker")
+        index = fuzzy.get_food_index()
+        self.assertIsInstance(index, fuzzy.DatabaseTrigramIndex)
+        self.assertEqual([pk for pk, _ in index.search("Weizenmel")], [flour.pk])
+        self.assertEqual(index.get_exact("weizenmehl "), flour.pk)
+
+    def test_suggestions_are_found_in_the_database(self):
+        flour = Food.objects.create(name="Weizenmehl")
+        bread = Recipe.objects.create(title="Weizenmehlbrot", public=True)
+        Recipe.objects.create(title="Weizenmehlkuchen", public=False)
+        recipes, foods = get_suggestions(AnonymousUser(), "Weizenmehl")
+        self.assertEqual(recipes, [(bread.pk, "Weizenmehlbrot")])
+        self.assertEqual(foods, [(flour.pk, "Weizenmehl")])
+
+
+class TestPantryMatching(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("baker", "baker@test.com", "bakerPW")
+        self.flour = Food.objects.create(name="Mehl")
+        self.sugar = Food.objects.create(name="Zucker")
+        self.eggs = Food.objects.create(name="Eier")
+
+        self.sponge = create_recipe("Biskuit", [self.flour, self.sugar, self.eggs], self.user, public=True)
+        self.meringue = create_recipe("Baiser", [self.sugar, self.eggs], self.user, public=True)
+        self.private = create_recipe("Geheim", [self.sugar], self.user)
+
+    def test_recipes_are_ranked_by_coverage(self):
+        matches = get_pantry_matches(AnonymousUser(), [self.sugar.pk, self.eggs.pk])
+        self.assertEqual(
+            [(recipe.title, round(coverage, 2), missing) for recipe, coverage, missing in matches],
+            [("Baiser", 1.0, []), ("Biskuit", 0.67, [self.flour])],
+        )
+
+    def test_private_recipes_are_only_ranked_for_their_author(self):
+        matches = get_pantry_matches(self.user, [self.sugar.pk])
+        self.assertIn(self.private, [recipe for recipe, _, _ in matches])
+
+    def test_ranking_reflects_changed_ingredients(self):
+        get_pantry_matches(AnonymousUser(), [self.flour.pk])
+        Ingredient.objects.filter(recipe=self.sponge, food=self.flour).delete()
+        self.assertEqual(get_pantry_matches(AnonymousUser(), [self.flour.pk]), [])
+
+    def test_search_forms_use_cached_choices(self):
+        self.client.get("/advancedsearch/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/advancedsearch/?f={self.flour.pk}")
+        self.assertFalse([q for q in queries if 'FROM "recipes_food"' in q["sql"]])
+        self.assertContains(response, f'<option value="{self.flour.pk}" selected>Mehl (1)</option>')
+
+        butter = Food.objects.create(name="Butter")
+        self.assertContains(self.client.get("/advancedsearch/"), f'value="{butter.pk}">Butter (0)')
+        self.assertContains(self.client.get(f"/pantry?f={butter.pk}&f={self.sugar.pk}"), "Baiser")
+
+
+class TestSimilarRecipes(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("baker", "baker@test.com", "bakerPW")
+        foods = {name: Food.objects.create(name=name) for name in ["Mehl", "Zucker", "Eier", "Quark", "Hefe"]}
+        self.cheesecake = create_recipe("Käsekuchen", [foods["Quark"], foods["Eier"], foods["Zucker"]], self.user)
+        self.quark_cake = create_recipe("Quarkkuchen", [foods["Quark"], foods["Eier"], foods["Mehl"]], self.user)
+        self.bread = create_recipe("Brot", [foods["Mehl"], foods["Hefe"]], self.user)
+        self.yeast = foods["Hefe"]
+
+    def test_most_similar_recipe_comes_first(self):
+        update_similar_recipes()
+        self.assertEqual(
+            list(self.cheesecake.get_similar_recipes(self.user)), [self.quark_cake]
+        )
+        self.assertEqual(
+            list(self.quark_cake.get_similar_recipes(self.user)), [self.cheesecake, self.bread]
+        )
+
+    def test_changed_ingredients_update_the_affected_recipes(self):
+        update_similar_recipes()
+        self.assertEqual(list(self.bread.get_similar_recipes(self.user)), [self.quark_cake])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(amount=1, food=self.yeast, recipe=self.cheesecake)
+        self.assertEqual(
+            set(self.bread.get_similar_recipes(self.user)), {self.cheesecake, self.quark_cake}
+        )
+
+    def test_updates_of_requests_are_deferred_until_the_response_was_sent(self):
+        with mock.patch.object(similarity, "update_similar_recipes") as update:
+            similarity.defer_updates()
+            with self.captureOnCommitCallbacks(execute=True):
+                Ingredient.objects.create(amount=1, food=self.yeast, recipe=self.cheesecake)
+            update.assert_not_called()
+            similarity.run_deferred_updates()
+        update.assert_called_once()
+        self.assertIn(self.cheesecake.pk, update.call_args.args[0])
+
+    def test_only_candidates_are_loaded_for_changed_recipes(self):
+        create_recipe("Suppe", [Food.objects.create(name="Karotte")], self.user)
+        # the bread only shares the flour with the quark cake
+        vectors = get_recipe_vectors([self.bread.pk])
+        self.assertEqual(vectors.recipe_pks, sorted([self.quark_cake.pk, self.bread.pk]))
+
+        # the weights of the candidates are those of the whole catalog
+        update_similar_recipes()
+        full = list(SimilarRecipe.objects.order_by("recipe", "similar").values_list("recipe", "similar", "score"))
+        update_similar_recipes([self.bread.pk])
+        incremental = SimilarRecipe.objects.order_by("recipe", "similar").values_list("recipe", "similar", "score")
+        self.assertEqual(len(incremental), len(full))
+        for (recipe, similar, score), expected in zip(incremental, full):
+            self.assertEqual((recipe, similar), expected[:2])
+            self.assertAlmostEqual(score, expected[2], places=5)
+
+
+class TestSimilarRecipesOnRollback(TransactionTestCase):
+    """
+    The transactions of a TestCase are never committed, so the commit callbacks are tested with real transactions.
+    """
+
+    def test_changes_of_rolled_back_transactions_are_dropped(self):
+        flour = Food.objects.create(name="Mehl")
+        bread = Recipe.objects.create(title="Brot")
+        cake = Recipe.objects.create(title="Kuchen")
+        with mock.patch.object(similarity, "update_similar_recipes") as update:
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    Ingredient.objects.create(amount=1, food=flour, recipe=cake)
+                    raise DatabaseError
+            update.assert_not_called()
+            Ingredient.objects.create(amount=1, food=flour, recipe=bread)
+        update.assert_called_once_with({bread.pk})
+
+
+class TestRecipeEditorSave(TestCase):
+    def setUp(self):
+        User.objects.create_user("baker", "baker@test.com", "bakerPW")
+        self.client.login(username="baker", password="bakerPW")
+        self.flour = Food.objects.create(name="Mehl")
+
+    def recipe_form_data(self, num_ingredients):
+        data = {
+            "title": "Großes Rezept",
+            "servings": "4",
+            "introduction": "Intro",
+            "directions": "Backen",
+            "image_of-TOTAL_FORMS": "0",
+            "image_of-INITIAL_FORMS": "0",
+            "belongs_to-TOTAL_FORMS": str(num_ingredients),
+            "belongs_to-INITIAL_FORMS": "0",
+        }
+        for i in range(num_ingredients):
+            data[f"belongs_to-{i}-amount"] = str(i + 1)
+            data[f"belongs_to-{i}-unit"] = "g"
+            data[f"belongs_to-{i}-food_name"] = "mehl " if i == 0 else f"Zutat {i}"
+        return data
+
+    def test_large_recipe_is_saved_with_few_queries(self):
+        def count_version_bumps(queries):
+            return len([q for q in queries if q["sql"].startswith("UPDATE") and "cache_version" in q["sql"]])
+
+        # including the updates done after the commit, e.g. of the similar recipes
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/recipe/new", self.recipe_form_data(25))
+        self.assertEqual(response.status_code, 302)
+        self.assertLessEqual(len(queries), 31)
+        # once for the saved recipe and once for the recipes with changed similar recipes
+        self.assertEqual(count_version_bumps(queries), 2)
+
+        recipe = Recipe.objects.get(title="Großes Rezept")
+        self.assertEqual(recipe.get_ingredients().count(), 25)
+        self.assertEqual(recipe.get_ingredients().filter(food=self.flour).count(), 1)
+        self.assertEqual(Food.objects.count(), 25)
+
+        data = self.recipe_form_data(25)
+        data["title"] = "Neues Rezept"
+        data["belongs_to-INITIAL_FORMS"] = "25"
+        for i, pk in enumerate(recipe.get_ingredients().order_by("pk").values_list("pk", flat=True)):
+            data[f"belongs_to-{i}-id"] = str(pk)
+        data["belongs_to-3-amount"] = "99"
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f"/recipe/{recipe.pk}/update", data)
+        self.assertEqual(response.status_code, 302)
+        self.assertLessEqual(len(queries), 32)
+        self.assertEqual(count_version_bumps(queries), 2)
+        self.assertEqual(recipe.get_ingredients().get(amount=99).food.name, "Zutat 3")
+
+    def test_formset_can_be_saved_without_commit(self):
+        recipe = Recipe.objects.create(title="Kuchen")
+        data = self.recipe_form_data(2)
+        formset = IngredientFormSet(
+            {key: value for key, value in data.items() if key.startswith("belongs_to")}, instance=recipe
+        )
+        self.assertTrue(formset.is_valid())
+        ingredients = formset.save(commit=False)
+        self.assertFalse(recipe.get_ingredients().exists())
+        Ingredient.objects.bulk_create(ingredients)
+        formset.save_m2m()
+        self.assertEqual(recipe.get_ingredients().count(), 2)
+
+    def test_ingredient_form_creates_new_foods_without_lookups_by_null(self):
+        recipe = Recipe.objects.create(title="Kuchen")
+        form = IngredientForm(
+            {"amount": "2", "unit": "", "food_name": "Zimt", "notes": ""}, instance=Ingredient(recipe=recipe)
+        )
+        self.assertTrue(form.is_valid())
+        with CaptureQueriesContext(connection) as queries:
+            ingredient = form.save(commit=True)
+        self.assertEqual(ingredient.food.name, "Zimt")
+        self.assertFalse([q for q in queries if "IS NULL" in q["sql"]])
+
+    def test_edit_keeps_a_version_incremented_concurrently(self):
+        recipe = Recipe.objects.create(title="Kuchen", author=User.objects.get(username="baker"))
+        is_valid = RecipeForm.is_valid
+
+        def bump_while_editing(form):
+            # another request changes the recipe after it was loaded by the edit
+            bump_recipe_cache_version([recipe.pk])
+            return is_valid(form)
+
+        data = self.recipe_form_data(1)
+        with mock.patch.object(RecipeForm, "is_valid", autospec=True, side_effect=bump_while_editing):
+            response = self.client.post(f"/recipe/{recipe.pk}/update", data)
+        self.assertEqual(response.status_code, 302)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Großes Rezept")
+        self.assertEqual(recipe.cache_version, 2)
+
+    def test_failed_save_leaves_no_recipe(self):
+        with mock.patch.object(
+            Ingredient.objects, "bulk_create", side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                self.client.post("/recipe/new", self.recipe_form_data(3))
+        self.assertFalse(Recipe.objects.exists())
+
+
+class TestCappedCountPaginator(TestCase):
+    def setUp(self):
+        Recipe.objects.bulk_create([Recipe(title=f"Rezept {i}") for i in range(40)])
+        self.paginator = CappedCountPaginator(Recipe.objects.order_by("pk"), 3)
+        self.paginator.max_count = 10
+
+    def test_pages_after_the_estimate_can_be_reached(self):
+        self.assertEqual(self.paginator.display_count, "10+")
+        page = self.paginator.get_page(10)
+        self.assertEqual([recipe.title for recipe in page], ["Rezept 27", "Rezept 28", "Rezept 29"])
+        self.assertTrue(page.has_next())
+        self.assertEqual(page.next_page_number(), 11)
+        self.assertIn(11, self.paginator.page_range)
+
+        last = self.paginator.get_page(14)
+        self.assertEqual([recipe.title for recipe in last], ["Rezept 39"])
+        self.assertFalse(last.has_next())
+        self.assertEqual((last.start_index(), last.end_index()), (40, 40))
+        with self.assertRaises(EmptyPage):
+            self.paginator.page(15)
+
+    def test_page_is_loaded_with_one_query(self):
+        self.paginator.count
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.paginator.page(2).has_next())
+        self.assertEqual(len(queries), 1)
+
+
+class TestRecipeImport(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.media_root = media_root.name
+        self.baker = User.objects.create_user("baker", "baker@test.com", "bakerPW")
+        Food.objects.create(name="Quark")
+        Category.objects.create(title="Kuchen")
+
+    def create_archive(self):
+        records = [
+            {
+                "title": f"Kuchen {i}",
+                "author": "baker",
+                "public": True,
+                "categories": ["Kuchen", "Import"],
+                "ingredients": [
+                    {"amount": "500", "unit": "g", "food": "quark"},
+                    {"amount": "1/2", "unit": "TL", "food": "Salz", "notes": "fein"},
+                ],
+                "images": [{"path": "images/kuchen.jpg", "is_primary": True}],
+            }
+            for i in range(5)
+        ]
+        markdown = "\n".join(
+            [
+                "# Brot",
+                "servings: 2",
+                "categories: Brot",
+                "",
+                "Ein einfaches Brot.",
+                "",
+                "## Zutaten",
+                "- 500 g Mehl (Type 550)",
+                "- 2 Eier",
+                "",
+                "## Zubereitung",
+                "Backen.",
+                "![Brot](images/kuchen.jpg)",
+            ]
+        )
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("recipes.ndjson", "\n".join(json.dumps(r) for r in records))
+            archive.writestr("brot.md", markdown)
+            archive.writestr("images/kuchen.jpg", b"jpeg")
+        buffer.seek(0)
+        return buffer
+
+    def test_import_archive(self):
+        importer = RecipeImporter(RecipeArchive(self.create_archive()), batch_size=2)
+        self.assertEqual(importer.run(), 6)
+
+        self.assertEqual(Recipe.objects.filter(author=self.baker, public=True).count(), 5)
+        self.assertEqual(Food.objects.filter(name__iexact="quark").count(), 1)
+        self.assertEqual(Category.objects.get(title="Kuchen").recipe_set.count(), 5)
+
+        salt = Ingredient.objects.filter(food__name="Salz").first()
+        self.assertEqual((salt.amount, salt.unit, salt.notes), (0.5, "TL", "fein"))
+
+        bread = Recipe.objects.get(title="Brot")
+        self.assertIsNone(bread.author)
+        self.assertEqual(bread.introduction, "Ein einfaches Brot.")
+        self.assertEqual(bread.directions, "Backen.")
+        self.assertEqual(
+            sorted(bread.get_ingredients().values_list("amount", "unit", "food__name", "notes")),
+            [(2, "", "Eier", ""), (500, "g", "Mehl", "Type 550")],
+        )
+
+        # the same image is stored only once
+        self.assertEqual(RecipeImage.objects.count(), 6)
+        self.assertEqual(len(set(RecipeImage.objects.values_list("image", flat=True))), 1)
+
+    def test_invalid_records_are_reported_and_skipped(self):
+        records = [
+            {"title": "Zu viel", "ingredients": [{"amount": "2000", "unit": "g", "food": "Mehl"}]},
+            {"title": "Zu viele Portionen", "servings": "1000"},
+            {"title": "Keine Zahl", "ingredients": [{"amount": "NaN", "food": "Mehl"}]},
+            {
+                "title": "Gerundet",
+                "ingredients": [{"amount": "1/3", "food": "M" * 300}],
+                "categories": ["K" * 300],
+            },
+        ]
+        archive = io.BytesIO("\n".join(json.dumps(r) for r in records).encode())
+        importer = RecipeImporter(RecipeArchive(archive, name="recipes.ndjson"))
+        self.assertEqual(importer.run(), 1)
+        self.assertEqual(
+            importer.errors, ["Menge zu groß: 2000", "Menge zu groß: 1000", "Ungültige Menge: NaN"]
+        )
+        ingredient = Ingredient.objects.get(recipe__title="Gerundet")
+        self.assertEqual(ingredient.amount, Decimal("0.333"))
+        self.assertEqual(ingredient.food.name, "M" * 255)
+        self.assertTrue(Category.objects.filter(title="K" * 255).exists())
+
+    def test_images_with_the_same_content_are_stored_once(self):
+        record = {
+            "title": "Kuchen",
+            "images": [{"path": "kuchen.jpg"}, {"path": "bilder/kopie.jpg"}],
+        }
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("recipes.ndjson", json.dumps(record))
+            archive.writestr("kuchen.jpg", b"jpeg")
+            archive.writestr("bilder/kopie.jpg", b"jpeg")
+        buffer.seek(0)
+        RecipeImporter(RecipeArchive(buffer)).run()
+        self.assertEqual(RecipeImage.objects.count(), 2)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, "recipe_pics"))), 1)
+
+    def test_images_outside_of_the_directory_are_rejected(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.mkdir(os.path.join(root, "rezepte"))
+            secret = os.path.join(root, "geheim.jpg")
+            with open(secret, "wb") as f:
+                f.write(b"jpeg")
+            path = os.path.join(root, "rezepte", "kuchen.json")
+            with open(path, "w") as f:
+                json.dump({"title": "Kuchen", "images": [{"path": "../geheim.jpg"}, {"path": secret}]}, f)
+            importer = RecipeImporter(RecipeArchive(path))
+            self.assertEqual(importer.run(), 1)
+        self.assertEqual(
+            importer.errors, ["Ungültiger Bildpfad ../geheim.jpg", f"Ungültiger Bildpfad {secret}"]
+        )
+        self.assertFalse(RecipeImage.objects.exists())
+
+    def test_images_of_failed_batches_are_deleted(self):
+        with mock.patch.object(RecipeImage.objects, "bulk_create", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                RecipeImporter(RecipeArchive(self.create_archive())).run()
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "recipe_pics")), [])
+
+    def test_pks_of_deleted_recipes_are_not_reused(self):
+        deleted_pk = Recipe.objects.create(title="Gelöscht").pk
+        Recipe.objects.filter(pk=deleted_pk).delete()
+        RecipeImporter(RecipeArchive(self.create_archive())).run()
+        self.assertGreater(Recipe.objects.order_by("pk").first().pk, deleted_pk)
+        self.assertEqual(Ingredient.objects.filter(recipe__title="Kuchen 0").count(), 2)
+
+    def test_export_can_be_imported(self):
+        RecipeImporter(RecipeArchive(self.create_archive())).run()
+        Recipe.objects.filter(title="Brot").update(author=self.baker, secret_notes="Geheim")
+        self.client.login(username="baker", password="bakerPW")
+
+        response = self.client.get("/export")
+        self.assertTrue(response.streaming)
+        archive = io.BytesIO(b"".join(response.streaming_content))
+        with zipfile.ZipFile(archive) as exported:
+            self.assertEqual(len(exported.namelist()), 2)
+
+        Recipe.objects.all().delete()
+        self.assertEqual(RecipeImporter(RecipeArchive(archive)).run(), 6)
+        bread = Recipe.objects.get(title="Brot")
+        self.assertEqual(bread.secret_notes, "Geheim")
+        self.assertEqual(bread.get_ingredients().get(food__name="Mehl").amount, 500)
+        self.assertEqual(RecipeImage.objects.filter(recipe=bread).count(), 1)
+
+        other = User.objects.create_user("other", "other@test.com", "otherPW")
+        self.client.force_login(other)
+        lines = b"".join(self.client.get("/export?format=ndjson").streaming_content).splitlines()
+        # only the public recipes of the other user are exported, without secret notes
+        self.assertEqual([json.loads(line)["secret_notes"] for line in lines], [""] * 5)
+
+    def test_export_holds_no_transaction_between_chunks(self):
+        RecipeImporter(RecipeArchive(self.create_archive())).run()
+        depth = len(connection.savepoint_ids)
+        records = get_recipe_records(Recipe.objects.all(), chunk_size=2)
+        titles = [next(records)["title"]]
+        self.assertEqual(len(connection.savepoint_ids), depth)
+        titles += [record["title"] for record in records]
+        self.assertEqual(titles, list(Recipe.objects.order_by("pk").values_list("title", flat=True)))
+
+
+# the generations are polled in separate tests, so they do not add queries here
+@override_settings(CACHE_GENERATION_POLL_INTERVAL=60)
+class TestRecipeDetailCache(TestCase):
+    def setUp(self):
+        # the versions start at 0 again in every test, so fragments of earlier tests must not be found
+        cache.clear()
+        author = User.objects.create_user("baker", "baker@test.com", "bakerPW")
+        self.recipe = Recipe.objects.create(
+            title="Käsekuchen",
+            author=author,
+            public=True,
+            servings=4,
+            introduction="Cremig",
+            directions="Backen",
+        )
+        self.quark = Food.objects.create(name="Quark")
+        self.ingredient = Ingredient.objects.create(
+            amount=500, unit="g", food=self.quark, recipe=self.recipe
+        )
+        self.recipe.categories.add(Category.objects.create(title="Kuchen"))
+
+    def test_fragments_are_cached_until_the_recipe_changes(self):
+        url = f"/recipe/{self.recipe.pk}"
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url)
+        self.assertLess(len(second), len(first))
+        self.assertContains(response, "500 g Quark")
+
+        self.ingredient.amount = 250
+        self.ingredient.save()
+        self.assertContains(self.client.get(url), "250 g Quark")
+
+        self.quark.name = "Magerquark"
+        self.quark.save()
+        self.assertContains(self.client.get(url), "250 g Magerquark")
+
+        Category.objects.get(title="Kuchen").delete()
+        self.assertNotContains(self.client.get(url), "Kuchen</a>")
+
+        # the amounts for other servings are cached separately
+        self.assertContains(self.client.get(url + "?number_servings=8"), "500 g Magerquark")
+
+    def test_conditional_get(self):
+        for url in [f"/recipe/{self.recipe.pk}", "/", "/categories/Kuchen"]:
+            response = self.client.get(url)
+            self.assertTrue(response.has_header("Last-Modified"))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+            self.assertLessEqual(len(queries), 2)
+
+        etag = self.client.get(f"/recipe/{self.recipe.pk}")["ETag"]
+        self.ingredient.amount = 250
+        self.ingredient.save()
+        response = self.client.get(f"/recipe/{self.recipe.pk}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # the pages of logged in users contain the CSRF token of their session, so they are always rendered
+        self.client.login(username="baker", password="bakerPW")
+        response = self.client.get(f"/recipe/{self.recipe.pk}", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+        self.client.logout()
+
+        # the validators of pages without visible recipes cannot be guessed to skip the permission checks
+        private = Recipe.objects.create(title="Geheimrezept", public=False)
+        response = self.client.get(f"/recipe/{private.pk}", HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get("/recipe/12345", HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous_pages_are_cached(self):
+        url = f"/recipe/{self.recipe.pk}"
+        for page in [url, "/", "/categories/Kuchen", "/gallery"]:
+            response = self.client.get(page)
+            self.assertFalse(response.cookies)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(page)
+            # only the content version of the page is read
+            self.assertEqual(len(queries), 1, page)
+
+        self.ingredient.amount = 250
+        self.ingredient.save()
+        self.assertContains(self.client.get(url), "250 g Quark")
+        self.assertContains(self.client.get("/categories/Kuchen"), "Käsekuchen")
+
+        category = Category.objects.get(title="Kuchen")
+        category.title = "Torten"
+        category.save()
+        self.assertEqual(self.client.get("/categories/Kuchen").status_code, 404)
+        self.assertNotContains(self.client.get("/categories"), "Brot")
+        Category.objects.create(title="Brot")
+        self.assertContains(self.client.get("/categories"), "Brot")
+
+        self.client.login(username="baker", password="bakerPW")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertGreater(len(queries), 0)
+
+    def test_ingredient_payload_is_embedded(self):
+        response = self.client.get(f"/recipe/{self.recipe.pk}?number_servings=8")
+        self.assertContains(response, "1000 g Quark")
+        data = json.loads(re.search(
+            r'<script id="ingredient-data" type="application/json">(.*?)</script>',
+            response.content.decode(),
+        ).group(1))
+        self.assertEqual(
+            data,
+            {
+                "servings": [4, 1],
+                "ingredients": [{"amount": [500, 1], "unit": "g", "food": "Quark", "notes": ""}],
+            },
+        )
+
+    def test_search_facets_are_cached_until_a_recipe_changes(self):
+        request = RequestFactory().get("/advancedsearch/", {"q": "kuchen"})
+        request.user = AnonymousUser()
+        facets = views.get_cached_search_facets(request, Recipe.objects.all())
+        self.assertEqual(facets[1], {self.quark.pk: 1})
+
+        sugar = Food.objects.create(name="Zucker")
+        Ingredient.objects.create(amount=50, unit="g", food=sugar, recipe=self.recipe)
+        facets = views.get_cached_search_facets(request, Recipe.objects.all())
+        self.assertEqual(facets[1], {self.quark.pk: 1, sugar.pk: 1})
+
+    def test_prettyprint_amount(self):
+        self.assertEqual(prettyprint_amount(Decimal("2.000")), "2")
+        self.assertEqual(prettyprint_amount(Decimal("0.100")), "1/10")
+        self.assertEqual(prettyprint_amount(Decimal("1.500")), "1.5")
+        self.assertEqual(prettyprint_amount(Decimal("2.0004")), "2")
+
+
+class TestSqliteConnection(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute("PRAGMA temp_store")
+            # MEMORY
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class TestCacheGenerations(TestCase):
+    def test_local_caches_are_dropped_after_changes_of_other_processes(self):
+        generations.poll(force=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            Food.objects.create(name="Mehl")
+        self.assertEqual(generations.poll(force=True), ["food"])
+
+        fuzzy.get_food_index()
+        self.assertEqual(generations.poll(force=True), [])
+        self.assertIn("food", fuzzy._indexes)
+
+        # another process changes a food
+        CacheGeneration.objects.filter(name="food").update(generation=F("generation") + 1)
+        self.assertEqual(generations.poll(force=True), ["food"])
+        self.assertNotIn("food", fuzzy._indexes)
+
+    def test_generations_of_rolled_back_transactions_are_not_bumped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    Food.objects.create(name="Mehl")
+                    raise DatabaseError
+            Category.objects.create(title="Kuchen")
+        self.assertEqual(
+            dict(
+                CacheGeneration.objects.filter(name__in=generations.GENERATION_NAMES).values_list(
+                    "name", "generation"
+                )
+            ),
+            {"category": 1},
+        )
+
+    def test_generations_are_bumped_once_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(title="Brot")
+            for name in ["Mehl", "Wasser"]:
+                Ingredient.objects.create(
+                    amount=1, food=Food.objects.create(name=name), recipe=recipe
+                )
+        self.assertEqual(
+            dict(
+                CacheGeneration.objects.filter(name__in=generations.GENERATION_NAMES).values_list(
+                    "name", "generation"
+                )
+            ),
+            {"recipe": 1, "food": 1, "ingredient": 1},
+        )
+
+
+class TestShoppingList(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("baker", "baker@test.com", "bakerPW")
+        other = User.objects.create_user("other", "other@test.com", "otherPW")
+        self.cake = create_recipe("Torte", [(100, "g", "Mehl")], self.user, servings=4)
+        self.cream = create_recipe("Creme", [(50, "g", "Zucker")], self.user, servings=2)
+        self.topping = create_recipe("Belag", [(10, "g", "Zucker")], self.user)
+        self.secret = create_recipe("Geheim", [(1, "", "Gold")], other)
+        self.cake.related_recipes.add(self.cream, self.secret)
+        self.cream.related_recipes.add(self.topping)
+        # cycle back to the cake
+        self.topping.related_recipes.add(self.cake)
+
+    def test_related_recipes_are_included_and_scaled(self):
+        self.client.login(username="baker", password="bakerPW")
+        self.client.post(f"/recipe/{self.cake.pk}/addtocart", {"numServings": "8"})
+        shopping_list = get_or_create_shopping_list_for_user(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = shopping_list.get_shopping_list_summary()
+        self.assertEqual(summary, [("Mehl", "g", 200), ("Zucker", "g", 120)])
+        # the owner of the list, its items, the closure rows and the ingredients
+        self.assertLessEqual(len(queries), 4)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/shoppinglist")
+        # the page shows the stored totals and links to the scaled recipes instead of loading their ingredients
+        self.assertFalse([query for query in queries if "recipes_ingredient" in query["sql"]])
+        self.assertContains(response, f'href="/recipe/{self.topping.pk}?number_servings=2"')
+        self.assertContains(response, "Zucker")
+        self.assertNotContains(response, "Gold")
+        self.assertNotContains(response, "Geheim")
+
+    def test_units_are_summed_in_canonical_units(self):
+        create_recipe(
+            "Kuchen", [("0.5", "kg", "Mehl"), (2, "Esslöffel", "Öl"), (1, "EL", "Öl")], self.user, servings=4
+        )
+        ingredient = Ingredient.objects.get(food__name="Mehl", unit="kg")
+        self.assertEqual((ingredient.canonical_amount, ingredient.canonical_unit), (500, "g"))
+
+        self.client.login(username="baker", password="bakerPW")
+        kuchen = Recipe.objects.get(title="Kuchen")
+        self.client.post(f"/recipe/{kuchen.pk}/addtocart", {"numServings": "4"})
+        self.client.post(f"/recipe/{self.topping.pk}/addtocart", {"numServings": "1"})
+        summary = get_or_create_shopping_list_for_user(self.user).get_shopping_list_summary()
+        # the topping includes the cake and the cream through the cycle
+        self.assertEqual(summary, [("Mehl", "g", 600), ("Zucker", "g", 60), ("Öl", "EL", 3)])
+
+    def test_totals_are_maintained_with_deltas(self):
+        self.client.login(username="baker", password="bakerPW")
+        self.client.post(f"/recipe/{self.cake.pk}/addtocart", {"numServings": "3"})
+        self.client.post(f"/recipe/{self.cream.pk}/addtocart", {"numServings": "1"})
+        shopping_list = get_or_create_shopping_list_for_user(self.user)
+        self.assertFalse(shopping_list.totals_stale)
+        with CaptureQueriesContext(connection) as queries:
+            summary = shopping_list.get_shopping_list_summary()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(summary, [("Mehl", "g", 125), ("Zucker", "g", 75)])
+
+        item = shopping_list.recipes.get(recipe=self.cake)
+        self.client.get(f"/shoppinglist/{item.pk}/remove")
+        self.assertEqual(shopping_list.get_shopping_list_summary(), [("Mehl", "g", 50), ("Zucker", "g", 30)])
+
+        # changed ingredients are picked up on the next view
+        Ingredient.objects.filter(recipe=self.topping).get().delete()
+        shopping_list.refresh_from_db()
+        self.assertTrue(shopping_list.totals_stale)
+        self.assertEqual(shopping_list.get_shopping_list_summary(), [("Mehl", "g", 50), ("Zucker", "g", 25)])
+
+    def test_deleting_a_related_recipe_marks_the_list_stale(self):
+        self.client.login(username="baker", password="bakerPW")
+        self.client.post(f"/recipe/{self.cake.pk}/addtocart", {"numServings": "4"})
+        shopping_list = get_or_create_shopping_list_for_user(self.user)
+        self.assertFalse(shopping_list.totals_stale)
+
+        self.topping.delete()
+        shopping_list.refresh_from_db()
+        self.assertTrue(shopping_list.totals_stale)
+        self.assertEqual(shopping_list.get_shopping_list_summary(), [("Mehl", "g", 100), ("Zucker", "g", 50)])
+
+    def test_remove_item_returns_changed_totals_as_json(self):
+        self.client.login(username="baker", password="bakerPW")
+        self.client.post(f"/recipe/{self.cake.pk}/addtocart", {"numServings": "4"})
+        self.client.post(f"/recipe/{self.topping.pk}/addtocart", {"numServings": "1"})
+        shopping_list = get_or_create_shopping_list_for_user(self.user)
+        item = shopping_list.recipes.get(recipe=self.topping)
+
+        response = self.client.post(f"/shoppinglist/{item.pk}/remove?format=json")
+        data = response.json()
+        self.assertEqual(data["removed"], item.pk)
+        self.assertFalse(data["replace"])
+        self.assertEqual(
+            [(total["food"], total["unit"], total["amount"]) for total in data["totals"]],
+            [("Mehl", "g", "100"), ("Zucker", "g", "60")],
+        )
+        # the fallback for requests without JavaScript still redirects
+        other = shopping_list.recipes.get()
+        self.assertRedirects(self.client.post(f"/shoppinglist/{other.pk}/remove"), "/shoppinglist")
+
+    # checks off a total while a client is connected to the events of the list
+    def check_off_while_connected(self):
+        self.client.login(username="baker", password="bakerPW")
+        self.client.post(f"/recipe/{self.cream.pk}/addtocart", {"numServings": "2"})
+        shopping_list = get_or_create_shopping_list_for_user(self.user)
+        total = shopping_list.totals.get(food__name="Zucker")
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.session.session_key}".encode()
+
+        def check_off():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f"/shoppinglist/totals/{total.pk}/check", {"checked": "1"})
+
+        async def stream():
+            sent = []
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+                if message.get("body") == b": connected\n\n":
+                    await sync_to_async(check_off)()
+                elif len(sent) == 3:
+                    disconnected.set()
+
+            scope = {"type": "http", "path": live.EVENTS_PATH, "headers": [(b"cookie", cookie)]}
+            await live.LiveShoppingListApp(None)(scope, receive, send)
+            return sent
+
+        return total, shopping_list.pk, async_to_sync(stream)()
+
+    def test_changes_are_pushed_to_connected_clients(self):
+        total, shopping_list_pk, sent = self.check_off_while_connected()
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(
+            sent[2]["body"], f'event: check\ndata: {{"id": {total.pk}, "checked": true}}\n\n'.encode()
+        )
+        self.assertFalse(live.has_subscribers(shopping_list_pk))
+        total.refresh_from_db()
+        self.assertTrue(total.checked)
+
+    @override_settings(LIVE_EVENTS_BACKEND="database", LIVE_EVENTS_POLL_INTERVAL=0.01)
+    def test_changes_are_passed_between_processes_by_the_database(self):
+        total, shopping_list_pk, sent = self.check_off_while_connected()
+        self.assertEqual(
+            sent[2]["body"], f'event: check\ndata: {{"id": {total.pk}, "checked": true}}\n\n'.encode()
+        )
+        self.assertEqual(LiveEvent.objects.get().shopping_list_pk, shopping_list_pk)
+
+
+class TestMealPlan(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("baker", "baker@test.com", "bakerPW")
+        self.cake = Recipe.objects.create(title="Torte", servings=4, author=self.user)
+        self.cream = Recipe.objects.create(title="Creme", servings=2, author=self.user)
+        self.cake.related_recipes.add(self.cream)
+        for recipe, amount, unit, food in [
+            (self.cake, "0.2", "kg", "Mehl"),
+            (self.cream, 100, "ml", "Sahne"),
+            (self.cream, 1, "EL", "Zucker"),
+        ]:
+            Ingredient.objects.create(
+                amount=amount, unit=unit, food=Food.objects.get_or_create(name=food)[0], recipe=recipe
+            )
+        self.client.login(username="baker", password="bakerPW")
+
+    def plan(self, day, recipe, servings):
+        return self.client.post(
+            "/mealplan?start=2026-10-12&end=2026-10-18",
+            {"date": day, "recipe": recipe.pk, "servings": servings},
+        )
+
+    def test_range_is_aggregated_into_shopping_list(self):
+        self.assertRedirects(self.plan("2026-10-12", self.cake, 4), "/mealplan?start=2026-10-12&end=2026-10-18")
+        self.plan("2026-10-14", self.cake, 2)
+        self.plan("2026-10-15", self.cream, 2)
+        self.plan("2026-10-20", self.cream, 2)
+        meal_plan = MealPlan.objects.get(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            items = meal_plan.get_range_items(date(2026, 10, 12), date(2026, 10, 18))
+        # grouped servings and the recipes
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([(item.recipe, item.servings) for item in items], [(self.cream, 2), (self.cake, 6)])
+        # the cake includes the cream scaled to its 6 of 4 servings
+        expected = [("Mehl", "g", 300), ("Sahne", "ml", 250), ("Zucker", "EL", Decimal("2.5"))]
+        self.assertEqual(meal_plan.get_range_totals(date(2026, 10, 12), date(2026, 10, 18)), expected)
+
+        response = self.client.post("/mealplan/shoppinglist", {"start": "2026-10-12", "end": "2026-10-18"})
+        self.assertRedirects(response, "/shoppinglist")
+        self.assertEqual(get_or_create_shopping_list_for_user(self.user).get_shopping_list_summary(), expected)
+
+        self.plan("2026-10-16", self.cake, 100)
+        response = self.client.get("/mealplan?start=2026-10-12&end=2026-10-18")
+        self.assertContains(response, f'href="/recipe/{self.cake.pk}"', count=3)
+        self.assertContains(response, "(100 Portionen)")
+
+    def test_servings_are_validated(self):
+        for servings in [0, -1]:
+            response = self.plan("2026-10-12", self.cake, servings)
+            self.assertEqual(response.status_code, 200)
+        self.assertFalse(MealPlanEntry.objects.exists())
+
+        for day in ["2026-10-12", "2026-10-13"]:
+            self.plan(day, self.cake, 600)
+        response = self.client.post(
+            "/mealplan/shoppinglist", {"start": "2026-10-12", "end": "2026-10-18"}, follow=True
+        )
+        self.assertRedirects(response, "/mealplan?start=2026-10-12&end=2026-10-18")
+        self.assertContains(response, "Zu viele Portionen von Torte")
+        self.assertFalse(ShoppingListRecipe.objects.exists())
+
+    def test_range_is_bounded(self):
+        for query in [
+            "start=0001-01-01&end=0001-01-02",
+            "start=9999-12-30&end=9999-12-31",
+            "start=2026-01-01&end=2026-12-31",
+        ]:
+            response = self.client.get(f"/mealplan?{query}")
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "alert-danger")
+            # the current week is shown instead
+            self.assertEqual(len(response.context["days"]), 7)
+        response = self.client.get("/mealplan?start=2026-10-01&end=2026-10-31")
+        self.assertEqual(len(response.context["days"]), 31)
+
+
+class TestAsgiViews(TransactionTestCase):
+    """
+    The read-only views handle ASGI requests in the thread pool, with connections of their own, so the data has
+    to be committed.
+    """
+
+    # the reads go to the replica with the settings of baking_softwaredev/settings_replica.py
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user("baker", "baker@test.com", "bakerPW")
+        self.recipe = Recipe.objects.create(
+            title="Zitronenkuchen",
+            author=author,
+            public=True,
+            servings=12,
+            introduction="Saftig",
+            directions="Backen",
+        )
+        self.recipe.categories.add(Category.objects.create(title="Kuchen"))
+        RecipeImage.objects.create(recipe=self.recipe, is_primary=True)
+
+    def test_read_views_are_coroutine_functions(self):
+        for view in (views.recipe_overview, views.recipe_detail, views.advanced_search, views.image_gallery_json):
+            self.assertTrue(asyncio.iscoroutinefunction(view))
+
+    def test_static_files_middleware_is_async_in_async_chains(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(asyncio.iscoroutinefunction(StaticFilesMiddleware(get_response)))
+        self.assertFalse(asyncio.iscoroutinefunction(StaticFilesMiddleware(lambda request: HttpResponse())))
+
+    def test_async_requests(self):
+        client = AsyncClient()
+
+        async def get(*urls):
+            return await asyncio.gather(*(client.get(url) for url in urls))
+
+        overview, detail, search, gallery = async_to_sync(get)(
+            "/", f"/recipe/{self.recipe.pk}", "/advancedsearch/?q=Zitrone", "/gallery/json"
+        )
+        for response in (overview, detail, search):
+            self.assertContains(response, "Zitronenkuchen")
+        self.assertEqual(
+            gallery.json()["categories"][0]["images"][0]["recipe_url"], f"/recipe/{self.recipe.pk}"
+        )
+        # served by the page cache
+        (cached,) = async_to_sync(get)(f"/recipe/{self.recipe.pk}")
+        self.assertContains(cached, "Zitronenkuchen")
+
+    def test_export_is_streamed_under_asgi(self):
+        from baking_softwaredev.asgi import application
+
+        client = Client()
+        client.login(username="baker", password="bakerPW")
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/export",
+            "query_string": b"format=ndjson",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"cookie", f"sessionid={client.cookies['sessionid'].value}".encode()),
+            ],
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(application)(scope, receive, send)
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        self.assertEqual([json.loads(line)["title"] for line in body.splitlines()], ["Zitronenkuchen"])
+
+        async_client = AsyncClient()
+        async_client.login(username="baker", password="bakerPW")
+
+        async def export():
+            response = await async_client.get("/export")
+            return b"".join([chunk async for chunk in iterate_in_sync_thread(response.streaming_content)])
+
+        with zipfile.ZipFile(io.BytesIO(async_to_sync(export)())) as exported:
+            self.assertIn("Zitronenkuchen", exported.read("recipes.ndjson").decode())
+
+
+class TestReplicaRouter(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(routers, "get_replicas", return_value=["replica", "replica2"])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_outside_of_transactions_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Recipe), "replica")
+        self.assertEqual(self.router.db_for_write(Recipe), "default")
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Recipe), "default")
+        self.assertFalse(self.router.allow_migrate("replica", "recipes"))
+        self.assertFalse(self.router.allow_migrate("replica2", "recipes"))
+
+    def test_requests_read_from_one_replica(self):
+        def get_response(request):
+            response = HttpResponse()
+            response.databases = {self.router.db_for_read(model) for model in [Recipe, Food, Ingredient]}
+            return response
+
+        middleware = routers.PrimaryStickinessMiddleware(get_response)
+        databases = [middleware(RequestFactory().get("/")).databases for _ in range(50)]
+        self.assertTrue(all(len(request_databases) == 1 for request_databases in databases))
+        self.assertEqual(set.union(*databases), {"replica", "replica2"})
+
+    def test_reads_stick_to_primary_after_post(self):
+        def get_response(request):
+            response = HttpResponse()
+            response.database = self.router.db_for_read(Recipe)
+            return response
+
+        middleware = routers.PrimaryStickinessMiddleware(get_response)
+        factory = RequestFactory()
+        self.assertIn(middleware(factory.get("/")).database, ["replica", "replica2"])
+
+        response = middleware(factory.post("/recipe/new"))
+        self.assertEqual(response.database, "default")
+        factory.cookies[routers.STICKY_COOKIE_NAME] = response.cookies[routers.STICKY_COOKIE_NAME].value
+        self.assertEqual(middleware(factory.get("/")).database, "default")
+
+        factory.cookies[routers.STICKY_COOKIE_NAME] = str(time.time() - 1)
+        self.assertIn(middleware(factory.get("/")).database, ["replica", "replica2"])
+
+
 """class Test(TestCase):
     def setUp(self):
         self.client = Client()
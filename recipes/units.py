@@ -0,0 +1,58 @@
+"""
+Registry of the units used in the ingredients with their canonical units and conversion factors.
+
+Units are matched after folding (case, umlauts, punctuation, see fuzzy.normalize), so "EL", "el", "Esslöffel"
+and "Eßlöffel" are the same unit. Masses are converted to g and volumes to ml; spoons, pinches and the like keep
+a canonical spelling of their own, as converting them to volumes would not be helpful for shopping.
+Unknown units are kept as written.
+"""
+from decimal import Decimal
+
+from .fuzzy import normalize
+
+# canonical unit -> {alias: factor to the canonical unit}
+UNITS = {
+    "g": {"g": 1, "gr": 1, "gramm": 1, "gram": 1, "kg": 1000, "kilo": 1000, "kilogramm": 1000, "mg": "0.001"},
+    "ml": {
+        "ml": 1,
+        "milliliter": 1,
+        "cl": 10,
+        "zentiliter": 10,
+        "dl": 100,
+        "deziliter": 100,
+        "l": 1000,
+        "liter": 1000,
+    },
+    "EL": {"el": 1, "essloeffel": 1, "essl": 1, "tbsp": 1},
+    "TL": {"tl": 1, "teeloeffel": 1, "teel": 1, "tsp": 1},
+    "Msp.": {"msp": 1, "messerspitze": 1, "messerspitzen": 1},
+    "Prise": {"prise": 1, "prisen": 1, "pr": 1},
+    "Pck.": {"pck": 1, "pckg": 1, "pkt": 1, "paeckchen": 1, "packung": 1, "packungen": 1},
+    "Stück": {"stueck": 1, "stk": 1, "st": 1},
+    "Becher": {"becher": 1},
+    "Dose": {"dose": 1, "dosen": 1},
+    "Bund": {"bund": 1},
+    "Tasse": {"tasse": 1, "tassen": 1},
+    "Blatt": {"blatt": 1, "blaetter": 1},
+}
+
+ALIASES = {
+    alias: (canonical, Decimal(str(factor)))
+    for canonical, aliases in UNITS.items()
+    for alias, factor in aliases.items()
+}
+
+
+def get_canonical_unit(unit):
+    """
+    Returns (canonical unit, factor) of the given unit. Unknown units are returned stripped with factor 1.
+    """
+    return ALIASES.get(normalize(unit), (unit.strip(), Decimal(1)))
+
+
+def canonicalize(amount, unit):
+    """
+    Returns the amount and unit converted to the canonical unit, e.g. (Decimal("0.5"), "kg") -> (500, "g").
+    """
+    canonical_unit, factor = get_canonical_unit(unit)
+    return Decimal(amount) * factor, canonical_unit
@@ -6,11 +6,14 @@ from .views import RecipeDeleteView, CategoryCreateView
 urlpatterns = [
     path("", views.recipe_overview, name="recipes-home"),
     path("advancedsearch/", views.advanced_search, name="advanced-search"),
+    path("advancedsearch/suggest", views.search_suggestions, name="search-suggestions"),
+    path("pantry", views.pantry_matches, name="pantry"),
     path("recipe/new", views.create_recipe, name="recipe-create"),
     path("recipe/<int:pk>", views.recipe_detail, name="recipe-detail"),
     path("recipe/<int:pk>/update", views.update_recipe, name="recipe-update"),
     path("recipe/<int:pk>/delete", RecipeDeleteView.as_view(), name="recipe-delete"),
     path("recipe/<int:pk>/addtocart", views.add_recipe_to_shopping_list, name="recipe-add-to-cart"),
+    path("export", views.export_recipes, name="recipe-export"),
     path("recipes/<str:username>", views.recipes_for_user, name="user-recipes"),
     path("categories", views.categories_overview, name="categories"),
     path(
@@ -24,10 +27,16 @@ urlpatterns = [
     ),
     path("categories/<str:title>", views.category_recipe_view, name="category-recipes"),
     path("gallery", views.image_gallery, name="image-gallery"),
+    path("gallery/json", views.image_gallery_json, name="image-gallery-json"),
     # Shopping List
     path("shoppinglist", views.display_shopping_list, name="shopping-list"),
     path("shoppinglist/delete", views.delete_shopping_list, name="delete-shopping-list"),
     path("shoppinglist/<int:pk>/remove", views.remove_ingredients_from_shopping_list, name="remove-item-from-shopping-list"),
+    path("shoppinglist/totals/<int:pk>/check", views.check_shopping_list_total, name="check-shopping-list-total"),
+    # Meal Plan
+    path("mealplan", views.display_meal_plan, name="meal-plan"),
+    path("mealplan/<int:pk>/remove", views.remove_meal_plan_entry, name="remove-meal-plan-entry"),
+    path("mealplan/shoppinglist", views.add_meal_plan_to_shopping_list, name="meal-plan-to-shopping-list"),
     # Ideas List
     path("ideas", views.display_ideas_list, name="ideas-list"),
     path("ideas/new", views.add_idea, name="add-idea"),
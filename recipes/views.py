@@ -1,23 +1,39 @@
+import collections
+import hashlib
+from datetime import date, timedelta
 from decimal import Decimal
 from fractions import Fraction
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Max
 from django.db.models.functions import Lower
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
 from django.views.generic import CreateView, DeleteView
 from django_addanother.views import CreatePopupMixin
 
+from . import live
+from .asgi import async_read_view
+from .exporter import export_ndjson, export_zip, get_recipe_records
 from .forms import (
+    MEAL_PLAN_STEP,
     CategoryForm,
     CategoryFilterForm,
     ExcludeFoodForm,
     FoodFilterForm,
     ImageFormSet,
     IngredientFormSet,
+    MealPlanEntryForm,
+    MealPlanRangeForm,
+    PantryForm,
     RecipeForm,
     RecipeSelectForm,
     IdeaForm
@@ -27,12 +43,73 @@ from .models import (
     Recipe,
     ShoppingListRecipe,
     Idea,
+    batched_recipe_cache_versions,
+    filter_recipe_list,
     get_converted_ingredients,
+    get_or_create_meal_plan_for_user,
     get_or_create_shopping_list_for_user,
+    get_pantry_matches,
     get_recipe_list,
+    get_recipe_list_version,
     get_idea_list,
+    get_search_facets,
     get_search_results,
+    get_suggestions,
+    prefetch_recipe_cards,
 )
+from .paginator import CappedCountPaginator
+
+# seconds the category and food counts of a search are cached
+SEARCH_FACETS_TIMEOUT = 5 * 60
+# seconds the rendered ingredients, images and categories of a recipe are cached,
+# changes invalidate them earlier by bumping the version of the recipe
+RECIPE_FRAGMENTS_TIMEOUT = 24 * 60 * 60
+
+################################
+# Conditional GET
+################################
+def get_page_validators(request, recipes, version):
+    """
+    Returns the ETag and Last-Modified of a page showing the given recipes to the requesting user.
+    Both are computed with a single aggregate query and stored on the request, as the condition decorator asks
+    for them separately. Pages with pending messages are rendered without validators, as the messages are only
+    shown once, and so are the pages of logged in users, as their forms contain the CSRF token of the session.
+    Pages without visible recipes (of unknown, deleted or private recipes) have no validators either, so the view
+    answers them with 404 or 403 instead of 304.
+    """
+    if not hasattr(request, "_page_validators"):
+        request._page_validators = (None, None)
+        if not request.user.is_authenticated and not messages.get_messages(request):
+            stats = recipes.order_by().aggregate(
+                last_modified=Max("modified"), count=Count("pk"), cache_version=Max("cache_version")
+            )
+            if stats["count"]:
+                key = f"{stats['last_modified']}|{stats['count']}|{stats['cache_version']}|{version}"
+                request._page_validators = (
+                    hashlib.md5(key.encode()).hexdigest(),
+                    stats["last_modified"],
+                )
+    return request._page_validators
+
+
+def recipe_page_condition(get_recipes, get_version=lambda request, **kwargs: get_recipe_list_version()):
+    """
+    Decorator sending ETag and Last-Modified headers for a page of the recipes returned by
+    get_recipes(request, **kwargs) and answering matching conditional requests with 304 without rendering.
+    """
+
+    def etag(request, **kwargs):
+        return get_page_validators(
+            request, get_recipes(request, **kwargs), get_version(request, **kwargs)
+        )[0]
+
+    def last_modified(request, **kwargs):
+        return get_page_validators(
+            request, get_recipes(request, **kwargs), get_version(request, **kwargs)
+        )[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
 
 ################################
 # Category views
@@ -95,6 +172,11 @@ class CategoryCreateView(CreatePopupMixin, LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
+@recipe_page_condition(
+    lambda request, title: filter_recipe_list(
+        request.user, Recipe.objects.filter(categories__title=title)
+    )
+)
 def category_recipe_view(request, title):
     cat = get_object_or_404(Category, title=title)
     recipe_list = cat.get_recipes(request.user)
@@ -104,7 +186,7 @@ def category_recipe_view(request, title):
     if sortBy == "Name":
         recipe_list = recipe_list.order_by(Lower("title"))
 
-    paginator = Paginator(recipe_list, 15)
+    paginator = Paginator(prefetch_recipe_cards(recipe_list), 15)
     recipes = paginator.get_page(page)
     return render(
         request,
@@ -126,10 +208,10 @@ def prettyprint_amount(amount):
 
     # check if number is a neat fraction
     if frac.numerator < frac.denominator and frac.denominator <= 10:
-        return str(frac).rstrip("0")
+        return str(frac)
 
     # if the number is weirder, round it to a three decimal float
-    return str(round(amount, 3)).rstrip("0")
+    return str(round(amount, 3)).rstrip("0").rstrip(".")
 
 
 def prettyprint_ingredient(ing):
@@ -141,11 +223,37 @@ def prettyprint_ingredient(ing):
     return f"{prettyprint_amount(ing.get_amount())} {ing.get_unit()} {ing.get_food_name()} {notes}"
 
 
+def get_ingredient_data(recipe):
+    """
+    Returns the servings and ingredients of the recipe for scaling in the browser,
+    amounts are given as [numerator, denominator] of the exact fraction.
+    """
+
+    def as_fraction(amount):
+        frac = Fraction(amount or 0)
+        return [frac.numerator, frac.denominator]
+
+    return {
+        "servings": as_fraction(recipe.get_servings()),
+        "ingredients": [
+            {
+                "amount": as_fraction(ing.amount),
+                "unit": ing.unit,
+                "food": ing.food.name,
+                "notes": ing.notes,
+            }
+            for ing in recipe.get_ingredients().select_related("food")
+        ],
+    }
+
+
 def prettyprint_servings(servings):
     serv = servings if (servings != int(servings)) else int(servings)
     return str(serv)
 
 
+@async_read_view
+@recipe_page_condition(lambda request: get_recipe_list(request.user))
 def recipe_overview(request):
     page = request.GET.get("page")
     sortBy = request.GET.get("sortBy")
@@ -154,7 +262,7 @@ def recipe_overview(request):
     if sortBy == "Name":
         recipe_list = recipe_list.order_by(Lower("title"))
 
-    paginator = Paginator(recipe_list, 15)
+    paginator = Paginator(prefetch_recipe_cards(recipe_list), 15)
     recipes = paginator.get_page(page)
     return render(
         request,
@@ -163,6 +271,14 @@ def recipe_overview(request):
     )
 
 
+@async_read_view
+@recipe_page_condition(
+    lambda request, pk: filter_recipe_list(
+        request.user, Recipe.objects.filter(pk=pk), filter_empty=False
+    ),
+    # the validators include the content version of the recipe
+    lambda request, pk: None,
+)
 def recipe_detail(request, pk):
     recipe = get_object_or_404(Recipe, pk=pk)
     recipe.check_view_permissions(request.user)
@@ -170,19 +286,36 @@ def recipe_detail(request, pk):
     # if the number of servings was manually requested: recalculate the amounts of the ingredients accordingly
     if request.GET.get("number_servings"):
         servings = Decimal(request.GET.get("number_servings"))
-        ingredients = [
-            prettyprint_ingredient(ing)
-            for ing in get_converted_ingredients(recipe, servings)
-        ]
+
+        def get_ingredients():
+            return [
+                prettyprint_ingredient(ing)
+                for ing in get_converted_ingredients(recipe, servings)
+            ]
+
     # otherwise print the original ingredients
     else:
-        ingredients = [prettyprint_ingredient(ing) for ing in recipe.get_ingredients()]
         servings = prettyprint_servings(recipe.get_servings())
 
+        def get_ingredients():
+            return [
+                prettyprint_ingredient(ing)
+                for ing in recipe.get_ingredients().select_related("food")
+            ]
+
     return render(
         request,
         "recipes/recipe_detail.html",
-        {"recipe": recipe, "ingredients": ingredients, "servings": servings},
+        {
+            "recipe": recipe,
+            # the template only calls get_ingredients and get_ingredient_data if the fragments are not cached
+            "ingredients": get_ingredients,
+            "ingredient_data": lambda: get_ingredient_data(recipe),
+            "servings": servings,
+            "similar_recipes": recipe.get_similar_recipes(request.user),
+            "recipe_version": recipe.cache_version,
+            "fragment_timeout": RECIPE_FRAGMENTS_TIMEOUT,
+        },
     )
 
 
@@ -203,7 +336,17 @@ def add_recipe_to_shopping_list(request, pk):
 
     user_shopping_list = get_or_create_shopping_list_for_user(user)
 
-    user_shopping_list.recipes.add(listItem)
+    changed = user_shopping_list.add_item(listItem)
+    if live.has_subscribers(user_shopping_list.pk):
+        live.publish_on_commit(
+            user_shopping_list.pk,
+            "add",
+            {
+                "item": listItem.pk,
+                "recipe": {"title": recipe.title, "url": recipe.get_absolute_url()},
+                **get_totals_payload(user_shopping_list, changed),
+            },
+        )
 
     messages.add_message(
         request,
@@ -214,42 +357,53 @@ def add_recipe_to_shopping_list(request, pk):
     return redirect(reverse("recipe-detail", args=[pk]) + f"?number_servings={servings}")
 
 
-@login_required
-def display_shopping_list(request):
-    shopping_list = get_or_create_shopping_list_for_user(request.user)
-
-    recipes_and_ingredients = []
-    all_related_recipes = []
-
-    for recipeItem in shopping_list.recipes.all():
-        recipe = recipeItem.recipe
-        servings = recipeItem.servings
+def get_totals_payload(shopping_list, changed):
+    """
+    Returns the totals changed by apply_totals_delta for JSON responses and live updates.
+    If the totals were stale, all of them are recomputed and returned with replace set.
+    """
+    if changed is None:
+        rows, replace = shopping_list.get_total_rows(), True
+    else:
+        rows, replace = shopping_list.get_total_rows(changed), False
+    for row in rows:
+        if row["amount"] is not None:
+            row["amount"] = prettyprint_amount(row["amount"])
+    return {"replace": replace, "totals": rows}
 
-        ingredients = [
-            prettyprint_ingredient(ing)
-            for ing in get_converted_ingredients(recipe, servings)
-        ]
 
-        recipes_and_ingredients.append((recipeItem, recipe, ingredients))
+def get_scaled_servings(recipe, factor):
+    if not recipe.servings:
+        return None
+    return prettyprint_servings((recipe.servings * Decimal(factor)).quantize(Decimal("0.001")))
 
-        # TODO: related recipes
-        # for now: verlinkte Rezepte sind nicht einberechnet sondern werden nur als Hinweis angezeigt
-        related_recipes = recipe.related_recipes.all()
-        if related_recipes:
-            for related in related_recipes:
-                all_related_recipes.append((related, recipe))
 
-    all_ingredients = shopping_list.get_shopping_list_summary()
+@login_required
+def display_shopping_list(request):
+    shopping_list = get_or_create_shopping_list_for_user(request.user)
 
-    # pretty print all the amounts
-    all_ingredients = [
-        (f, u, prettyprint_amount(a)) for (f, u, a) in all_ingredients
-    ]
+    # used by the page to catch up after a live update asked for it
+    if request.GET.get("format") == "json":
+        return JsonResponse(get_totals_payload(shopping_list, None))
+
+    # the recipes on the list and all their related recipes with the servings they are included with, their
+    # ingredients are only summed in the stored totals and shown scaled on the recipe pages
+    shopping_items = []
+    for item, recipes in shopping_list.get_expanded_recipes():
+        (recipe, _), related = recipes[0], recipes[1:]
+        shopping_items.append(
+            (
+                item,
+                recipe,
+                prettyprint_servings(item.servings) if recipe.servings else None,
+                [(rec, get_scaled_servings(rec, factor)) for rec, factor in related],
+            )
+        )
 
     context = {
-        "recipes_and_ingredients": recipes_and_ingredients,
-        "all_ingredients": all_ingredients,
-        "related_recipes": all_related_recipes,
+        "shopping_items": shopping_items,
+        "all_ingredients": get_totals_payload(shopping_list, None)["totals"],
+        "events_url": live.EVENTS_PATH,
     }
 
     return render(request, "recipes/shopping_list.html", context)
@@ -262,12 +416,18 @@ def delete_shopping_list(request):
     if not shopping_list:
         return redirect("shopping-list")
 
-    for recipe in shopping_list.recipes.all():
-        recipe.delete()
+    with transaction.atomic():
+        live.publish_on_commit(shopping_list.pk, "delete", {})
+        for recipe in shopping_list.recipes.all():
+            recipe.delete()
+        # the stored totals are deleted together with the list
+        shopping_list.delete()
 
-    shopping_list.delete()
+    message = "Deine Einkaufsliste wurde gelöscht."
+    if request.GET.get("format") == "json":
+        return JsonResponse({"message": message})
 
-    messages.add_message(request, level=messages.INFO, message="Deine Einkaufsliste wurde gelöscht.")
+    messages.add_message(request, level=messages.INFO, message=message)
 
     return redirect("shopping-list")
 
@@ -275,12 +435,137 @@ def delete_shopping_list(request):
 @login_required
 def remove_ingredients_from_shopping_list(request, pk):
     shopping_list = get_or_create_shopping_list_for_user(request.user)
-    shopping_list_item = get_object_or_404(ShoppingListRecipe, pk=pk)
+    shopping_list_item = get_object_or_404(shopping_list.recipes.select_related("recipe"), pk=pk)
     recipe_name = shopping_list_item.recipe.title
-    shopping_list.recipes.remove(shopping_list_item)
-    shopping_list_item.delete()
+    removed = shopping_list_item.pk
+    changed = shopping_list.remove_item(shopping_list_item)
+    message = f"Rezept {recipe_name} von der Einkaufsliste entfernt."
+
+    wants_json = request.GET.get("format") == "json"
+    if wants_json or live.has_subscribers(shopping_list.pk):
+        data = {"removed": removed, **get_totals_payload(shopping_list, changed)}
+        live.publish_on_commit(shopping_list.pk, "remove", data)
+        if wants_json:
+            return JsonResponse({"message": message, **data})
+
+    messages.add_message(request, level=messages.INFO, message=message)
+    return redirect("shopping-list")
+
 
-    messages.add_message(request, level=messages.INFO, message=f"Rezept {recipe_name} von der Einkaufsliste entfernt.")
+@login_required
+def check_shopping_list_total(request, pk):
+    """
+    Checks off (or unchecks with checked=0) a total of the shopping list.
+    """
+    shopping_list = get_or_create_shopping_list_for_user(request.user)
+    total = get_object_or_404(shopping_list.totals.all(), pk=pk)
+    if request.method == "POST":
+        total.checked = request.POST.get("checked", "1") == "1"
+        total.save(update_fields=["checked"])
+        live.publish_on_commit(shopping_list.pk, "check", {"id": total.pk, "checked": total.checked})
+
+    if request.GET.get("format") == "json":
+        return JsonResponse({"id": total.pk, "checked": total.checked})
+    return redirect("shopping-list")
+
+
+def get_meal_plan_range(data):
+    """
+    Returns the (start, end) dates of the meal plan range given in data, defaulting to the current week.
+    """
+    form = MealPlanRangeForm(data)
+    if form.is_valid():
+        return form.cleaned_data["start"], form.cleaned_data["end"]
+    start = date.today() - timedelta(days=date.today().weekday())
+    return start, start + timedelta(days=6)
+
+
+@login_required
+def display_meal_plan(request):
+    meal_plan = get_or_create_meal_plan_for_user(request.user)
+    start, end = get_meal_plan_range(request.GET)
+    query = urlencode({"start": start, "end": end})
+    range_form = MealPlanRangeForm(request.GET) if "start" in request.GET else None
+    if range_form is None or range_form.is_valid():
+        range_form = MealPlanRangeForm(initial={"start": start, "end": end})
+
+    if request.method == "POST":
+        form = MealPlanEntryForm(request.user, request.POST)
+        if form.is_valid():
+            form.instance.meal_plan = meal_plan
+            form.save()
+            return redirect(reverse("meal-plan") + f"?{query}")
+    else:
+        form = MealPlanEntryForm(request.user, initial={"date": start})
+
+    entries = collections.defaultdict(list)
+    for entry in meal_plan.get_entries(start, end):
+        entries[entry.date].append((entry, prettyprint_amount(entry.servings)))
+    days = [
+        (day, entries[day])
+        for day in (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+    ]
+    totals = [(f, u, prettyprint_amount(a)) for f, u, a in meal_plan.get_range_totals(start, end)]
+
+    context = {
+        "form": form,
+        "range_form": range_form,
+        "days": days,
+        "totals": totals,
+        "start": start,
+        "end": end,
+        "query": query,
+        "previous_query": urlencode({"start": start - MEAL_PLAN_STEP, "end": end - MEAL_PLAN_STEP}),
+        "next_query": urlencode({"start": start + MEAL_PLAN_STEP, "end": end + MEAL_PLAN_STEP}),
+    }
+    return render(request, "recipes/meal_plan.html", context)
+
+
+@login_required
+def remove_meal_plan_entry(request, pk):
+    meal_plan = get_or_create_meal_plan_for_user(request.user)
+    entry = get_object_or_404(meal_plan.entries.all(), pk=pk)
+    if request.method == "POST":
+        entry.delete()
+    start, end = get_meal_plan_range(request.GET)
+    return redirect(reverse("meal-plan") + "?" + urlencode({"start": start, "end": end}))
+
+
+@login_required
+def add_meal_plan_to_shopping_list(request):
+    """
+    Adds the recipes planned in the given range to the shopping list, one item per recipe with the summed servings.
+    """
+    if request.method != "POST":
+        return redirect("meal-plan")
+    meal_plan = get_or_create_meal_plan_for_user(request.user)
+    start, end = get_meal_plan_range(request.POST)
+    items = meal_plan.get_range_items(start, end)
+    # the summed servings have to fit into the servings of a shopping list item
+    field = ShoppingListRecipe._meta.get_field("servings")
+    max_servings = 10 ** (field.max_digits - field.decimal_places)
+    too_many = [item.recipe.title for item in items if item.servings >= max_servings]
+    if too_many:
+        messages.add_message(
+            request,
+            level=messages.ERROR,
+            message=f"Zu viele Portionen von {', '.join(too_many)} im Zeitraum: Von einem Rezept können weniger als "
+            f"{max_servings} Portionen zur Einkaufsliste hinzugefügt werden.",
+        )
+        return redirect(reverse("meal-plan") + "?" + urlencode({"start": start, "end": end}))
+    if items:
+        shopping_list = get_or_create_shopping_list_for_user(request.user)
+        with transaction.atomic():
+            for item in items:
+                item.save()
+            shopping_list.add_items(items)
+        live.publish_on_commit(shopping_list.pk, "refresh", {})
+
+    messages.add_message(
+        request,
+        level=messages.SUCCESS,
+        message=f"Zutaten für {len(items)} Rezepte vom {start:%d.%m.} bis {end:%d.%m.%Y} zu Einkaufsliste hinzugefügt.",
+    )
     return redirect("shopping-list")
 
 
@@ -329,8 +614,11 @@ def delete_idea(request, pk):
     idea = Idea.objects.get(pk=pk)
     if not request.user == idea.user:
         raise PermissionDenied
+    removed = idea.pk
     idea.delete()
 
+    if request.GET.get("format") == "json":
+        return JsonResponse({"removed": removed})
     return redirect("ideas-list")
 
 
@@ -386,14 +674,29 @@ def process_recipe_form(request, recipe=None):
                 "ingredients": ingredients_formset,
             },
         )
-    recipe_form.instance.author = request.user
-    recipe_obj = recipe_form.save()
-
-    image_formset.instance = recipe_obj
-    image_formset.save()
-
-    ingredients_formset.instance = recipe_obj
-    ingredients_formset.save()
+    # save the recipe, its images and its ingredients completely or not at all,
+    # the versions of the changed recipes are incremented once for all of them
+    with transaction.atomic(), batched_recipe_cache_versions():
+        recipe_form.instance.author = request.user
+        recipe_obj = recipe_form.save(commit=False)
+        if recipe is None:
+            recipe_obj.save()
+        else:
+            # only write the edited columns, the content version may have been incremented since the recipe was loaded
+            recipe_obj.save(
+                update_fields=[
+                    field.name
+                    for field in Recipe._meta.concrete_fields
+                    if field.name in recipe_form.fields or field.name == "author"
+                ]
+            )
+        recipe_form.save_m2m()
+
+        image_formset.instance = recipe_obj
+        image_formset.save()
+
+        ingredients_formset.instance = recipe_obj
+        ingredients_formset.save()
 
     return redirect(recipe_obj)
 
@@ -422,9 +725,63 @@ def recipes_for_user(request, username):
     )
 
 
+@login_required
+def export_recipes(request):
+    """
+    Stream all recipes accessible to the user (optionally only those of the given author) as ZIP archive with images
+    or, with format=ndjson, as NDJSON file. Secret notes are only exported for the user's own recipes.
+    """
+    recipes = filter_recipe_list(request.user, Recipe.objects.all(), filter_empty=False)
+    if request.GET.get("user"):
+        recipes = recipes.filter(author__username=request.GET["user"])
+
+    def is_own_recipe(recipe):
+        return recipe.author_id == request.user.pk
+
+    if request.GET.get("format") == "ndjson":
+        response = StreamingHttpResponse(
+            export_ndjson(get_recipe_records(recipes, is_own_recipe)),
+            content_type="application/x-ndjson",
+        )
+        response["Content-Disposition"] = 'attachment; filename="rezepte.ndjson"'
+    else:
+        response = StreamingHttpResponse(
+            export_zip(recipes, is_own_recipe), content_type="application/zip"
+        )
+        response["Content-Disposition"] = 'attachment; filename="rezepte.zip"'
+    return response
+
+
 ################################
 # Advanced search
 ################################
+def get_cached_search_facets(request, results):
+    """
+    Returns the number of search results per category and per food.
+    The counts are cached for the search parameters (without the page), the visibility of the user and the
+    content version of all recipes, so paging through the results and returning to a search reuses them until a
+    recipe changes.
+    """
+    query = request.GET.copy()
+    query.pop("page", None)
+    user = request.user
+    if user.is_superuser:
+        visibility = "all"
+    elif user.is_authenticated:
+        visibility = f"user-{user.pk}"
+    else:
+        visibility = "public"
+    search = f"{visibility}:{sorted(query.lists())}"
+    key = f"search-facets:{get_recipe_list_version()}:{hashlib.md5(search.encode()).hexdigest()}"
+
+    facets = cache.get(key)
+    if facets is None:
+        facets = get_search_facets(results)
+        cache.set(key, facets, SEARCH_FACETS_TIMEOUT)
+    return facets
+
+
+@async_read_view
 def advanced_search(request):
     category_form = CategoryFilterForm(request.GET)
     food_form = FoodFilterForm(request.GET)
@@ -439,13 +796,26 @@ def advanced_search(request):
         _and,
     )
 
+    category_counts, food_counts = get_cached_search_facets(request, results)
+    category_form.set_facet_counts(category_counts)
+    food_form.set_facet_counts(food_counts)
+
+    # only the recipes of the requested page are loaded, the number of results is only counted up to a limit
+    paginator = CappedCountPaginator(prefetch_recipe_cards(results), 15)
+    page = paginator.get_page(request.GET.get("page"))
+
+    # keep the search parameters in the pagination links
+    query = request.GET.copy()
+    query.pop("page", None)
+
     return render(
         request,
         "recipes/advanced_search.html",
         {
             "search_term": request.GET.get("q"),
-            "search_results": results,
-            "num_results": len(results),
+            "search_results": page,
+            "num_results": paginator.display_count,
+            "query": query.urlencode(),
             "category_form": category_form,
             "food_form": food_form,
             "exclude_food_form": exclude_food_form,
@@ -453,12 +823,94 @@ def advanced_search(request):
     )
 
 
+def search_suggestions(request):
+    """
+    Typeahead for the search boxes and the ingredient names: returns the recipes and foods similar to the query as JSON.
+    """
+    query = request.GET.get("q", "")
+    recipes, foods = get_suggestions(request.user, query)
+    return JsonResponse(
+        {
+            "recipes": [
+                {"title": title, "url": reverse("recipe-detail", args=[pk])}
+                for pk, title in recipes
+            ],
+            "foods": [{"id": pk, "name": name} for pk, name in foods],
+        }
+    )
+
+
+def pantry_matches(request):
+    """
+    Recipes that can be baked with the foods in the pantry, ranked by the fraction of ingredients already available.
+    Returns JSON if requested with ?format=json.
+    """
+    form = PantryForm(request.GET)
+    matches = []
+    if form.is_valid() and form.cleaned_data["f"]:
+        matches = get_pantry_matches(request.user, form.cleaned_data["f"])
+
+    if request.GET.get("format") == "json":
+        return JsonResponse(
+            {
+                "recipes": [
+                    {
+                        "title": recipe.title,
+                        "url": recipe.get_absolute_url(),
+                        "coverage": coverage,
+                        "missing": [food.name for food in missing],
+                    }
+                    for recipe, coverage, missing in matches
+                ]
+            }
+        )
+
+    matches = [
+        (recipe, round(coverage * 100), missing) for recipe, coverage, missing in matches
+    ]
+    return render(
+        request, "recipes/pantry.html", {"form": form, "matches": matches}
+    )
+
+
 #######
 # Image Gallery
-def image_gallery(request):
+def get_gallery(user):
     categories = Category.objects.all().order_by("title")
-    cats_and_images = [(c, c.get_primary_images(request.user)) for c in categories]
-    print(cats_and_images)
+    return [(c, c.get_primary_images(user)) for c in categories]
+
+
+@async_read_view
+def image_gallery(request):
     return render(
-        request, "recipes/image_gallery.html", {"cats_and_images": cats_and_images}
+        request, "recipes/image_gallery.html", {"cats_and_images": get_gallery(request.user)}
+    )
+
+
+@async_read_view
+def image_gallery_json(request):
+    """
+    The primary images of the recipes per category as JSON.
+    """
+    return JsonResponse(
+        {
+            "categories": [
+                {
+                    "title": category.title,
+                    "url": reverse("category-recipes", args=[category.title]),
+                    "images": [
+                        {
+                            "url": image.get_url(),
+                            "width": image.get_width(),
+                            "height": image.get_height(),
+                            "recipe": image.recipe.title,
+                            "recipe_url": reverse("recipe-detail", args=[image.recipe_id]),
+                        }
+                        for image in images
+                    ],
+                }
+                for category, images in get_gallery(request.user)
+                if images
+            ]
+        }
     )